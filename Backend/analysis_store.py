@@ -0,0 +1,321 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from elastic.elastic_helper import (
+    PROMPT_VERSIONS, analyze_contract_risks, generate_submission_checklist, query_eligibility_criteria,
+    query_project_requirements, query_rfp_metadata, retrieve_analysis_documents
+)
+from metrics import record_cache
+from utils.rfp_fields import RFP_FIELDS_VERSION, RFP_INFO_FIELDS, rfp_status
+
+ANALYSIS_DB_PATH = os.getenv("ANALYSIS_DB_PATH", os.path.join("cache", "analyses.sqlite3"))
+# Run all analyses as the last ingestion stage, so opening an RFP is a lookup
+PRECOMPUTE_ANALYSES = os.getenv("PRECOMPUTE_ANALYSES", "true").lower() == "true"
+
+
+class AnalysisStore:
+    """Analysis results per document, keyed by (doc_id, index, analysis, prompt version).
+
+    SQLite with a connection per operation, like the job and LLM caches, so
+    every uvicorn worker reads the same results and they survive restarts.
+    Bumping a prompt version in PROMPT_VERSIONS makes older results invisible.
+    Results are kept per index because prompts quote the company facts of
+    that index: tenants uploading the same RFP get their own analyses.
+    The rule-extracted RFP fields of each document are kept alongside.
+    """
+
+    def __init__(self, path=ANALYSIS_DB_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Results stored before they were kept per index cannot be attributed
+            # to one; they are dropped and computed again on demand
+            if not self._has_key_column(conn, "analyses"):
+                conn.execute("DROP TABLE IF EXISTS analyses")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS analyses ("
+                " doc_id TEXT NOT NULL,"
+                " index_name TEXT NOT NULL,"
+                " analysis TEXT NOT NULL,"
+                " prompt_version INTEGER NOT NULL,"
+                " result TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " PRIMARY KEY (doc_id, index_name, analysis, prompt_version))"
+            )
+            if not self._has_key_column(conn, "documents"):
+                self._rekey_documents(conn)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                " doc_id TEXT NOT NULL,"
+                " filename TEXT,"
+                " index_name TEXT NOT NULL,"
+                " ingested_at REAL NOT NULL,"
+                " PRIMARY KEY (doc_id, index_name))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rfp_fields ("
+                " doc_id TEXT PRIMARY KEY,"
+                " version INTEGER NOT NULL,"
+                " fields TEXT NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+
+    @staticmethod
+    def _has_key_column(conn, table):
+        # True when the table does not exist yet or has index_name in its primary key
+        columns = {row[1]: row[5] for row in conn.execute(f"PRAGMA table_info({table})")}
+        return not columns or columns.get("index_name", 0) > 0
+
+    @staticmethod
+    def _rekey_documents(conn):
+        # Documents used to be keyed by doc_id alone, with a nullable index_name
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(documents)")]
+        index_column = "COALESCE(index_name, '')" if "index_name" in columns else "''"
+        conn.execute("ALTER TABLE documents RENAME TO documents_old")
+        conn.execute(
+            "CREATE TABLE documents ("
+            " doc_id TEXT NOT NULL,"
+            " filename TEXT,"
+            " index_name TEXT NOT NULL,"
+            " ingested_at REAL NOT NULL,"
+            " PRIMARY KEY (doc_id, index_name))"
+        )
+        conn.execute(
+            f"INSERT INTO documents SELECT doc_id, filename, {index_column}, ingested_at FROM documents_old"
+        )
+        conn.execute("DROP TABLE documents_old")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, doc_id, index_name, analysis, prompt_version):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT result FROM analyses"
+                " WHERE doc_id = ? AND index_name = ? AND analysis = ? AND prompt_version = ?",
+                (doc_id, index_name or "", analysis, prompt_version)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, doc_id, index_name, analysis, prompt_version, result):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO analyses (doc_id, index_name, analysis, prompt_version, result, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    doc_id, index_name or "", analysis, prompt_version,
+                    json.dumps(result, ensure_ascii=False), time.time()
+                )
+            )
+
+    def delete(self, doc_id, index_name=None):
+        """Forget a document (in one index, if given). Its rule-extracted fields
+        go once no index holds the document any more."""
+        with self._connect() as conn:
+            if index_name is None:
+                conn.execute("DELETE FROM analyses WHERE doc_id = ?", (doc_id,))
+                conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
+            else:
+                conn.execute("DELETE FROM analyses WHERE doc_id = ? AND index_name = ?", (doc_id, index_name))
+                conn.execute("DELETE FROM documents WHERE doc_id = ? AND index_name = ?", (doc_id, index_name))
+            conn.execute(
+                "DELETE FROM rfp_fields WHERE doc_id = ?"
+                " AND NOT EXISTS (SELECT 1 FROM documents WHERE doc_id = ?)",
+                (doc_id, doc_id)
+            )
+
+    def clear_index(self, index_name):
+        """Forget every document of an index, with its results; rule-extracted
+        fields go for documents no other index holds."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM analyses WHERE index_name = ?", (index_name,))
+            conn.execute("DELETE FROM documents WHERE index_name = ?", (index_name,))
+            conn.execute(
+                "DELETE FROM rfp_fields WHERE NOT EXISTS (SELECT 1 FROM documents WHERE documents.doc_id = rfp_fields.doc_id)"
+            )
+
+    def clear_analyses(self, index_name=None):
+        """Drop stored results of every document (of one index, if given); documents stay recorded."""
+        with self._connect() as conn:
+            if index_name:
+                conn.execute("DELETE FROM analyses WHERE index_name = ?", (index_name,))
+            else:
+                conn.execute("DELETE FROM analyses")
+
+    def get_fields(self, doc_id, version=RFP_FIELDS_VERSION):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT fields FROM rfp_fields WHERE doc_id = ? AND version = ?", (doc_id, version)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_fields(self, doc_id, extracted):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO rfp_fields (doc_id, version, fields, created_at) VALUES (?, ?, ?, ?)",
+                (doc_id, extracted["version"], json.dumps(extracted, ensure_ascii=False), time.time())
+            )
+
+    def record_document(self, doc_id, filename, index_name=None):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO documents (doc_id, filename, index_name, ingested_at) VALUES (?, ?, ?, ?)",
+                (doc_id, filename, index_name or "", time.time())
+            )
+
+    def latest_document(self, index_name=None):
+        """doc_id of the most recently ingested RFP (of one index, if given), or None."""
+        with self._connect() as conn:
+            if index_name:
+                row = conn.execute(
+                    "SELECT doc_id FROM documents WHERE index_name = ? ORDER BY ingested_at DESC LIMIT 1",
+                    (index_name,)
+                ).fetchone()
+            else:
+                row = conn.execute("SELECT doc_id FROM documents ORDER BY ingested_at DESC LIMIT 1").fetchone()
+        return row[0] if row else None
+
+    def has_document(self, doc_id, index_name):
+        """Whether the document was ingested into this index."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT 1 FROM documents WHERE doc_id = ? AND index_name = ?", (doc_id, index_name or "")
+            ).fetchone()
+        return row is not None
+
+
+analysis_store = AnalysisStore()
+
+
+def _unresolved_fields(extracted):
+    # Status follows from a due date the rules found
+    resolved = extracted["fields"] if extracted else {}
+    return [
+        name for name in RFP_INFO_FIELDS
+        if name not in resolved and not (name == "status" and "dueDate" in resolved)
+    ]
+
+
+async def query_rfp_info(mode=None, weights=None, use_cache=True, top_docs=None, doc_id=None, index=None):
+    """RFP metadata from the fields extracted at ingestion, the LLM asked only for the rest.
+
+    The flat fields are what the frontend reads; "provenance" says per field
+    whether it came from the rules (with page and evidence) or the LLM, and
+    "identifiers" holds every date, amount, NAICS code, ... the rules found.
+    If the LLM fails, the rule-resolved fields are returned with the error,
+    so the result is not stored and the LLM is retried on the next request.
+    """
+    extracted = await asyncio.to_thread(analysis_store.get_fields, doc_id) if doc_id else None
+    resolved = extracted["fields"] if extracted else {}
+    missing = _unresolved_fields(extracted)
+    generated = {}
+    if missing:
+        generated = await query_rfp_metadata(mode, weights, use_cache, top_docs, doc_id, index, fields=missing)
+        if not isinstance(generated, dict):
+            generated = {"error": "RFP metadata was not a JSON object."}
+        if "error" in generated and not resolved:
+            return generated
+
+    result, provenance = {}, {}
+    for name in RFP_INFO_FIELDS:
+        if name in resolved:
+            field = resolved[name]
+            result[name] = field["value"]
+            provenance[name] = {"source": "rules", "page": field["page"], "evidence": field["evidence"]}
+        elif name == "status" and "dueDate" in resolved:
+            result[name] = rfp_status(resolved["dueDate"]["value"])
+            provenance[name] = {"source": "rules", "derived_from": "dueDate"}
+        else:
+            result[name] = generated.get(name, "")
+            provenance[name] = {"source": "llm"}
+    result["provenance"] = provenance
+    result["identifiers"] = extracted["identifiers"] if extracted else {}
+    if "error" in generated:
+        result["error"] = generated["error"]
+    return result
+
+
+def _current_status(result):
+    # A status derived from the due date is recomputed, so stored results do not go stale
+    if result.get("provenance", {}).get("status", {}).get("derived_from") == "dueDate":
+        result["status"] = rfp_status(result["dueDate"])
+    return result
+
+
+ANALYSIS_SECTIONS = {
+    "eligibility": query_eligibility_criteria,
+    "requirements": query_project_requirements,
+    "contract_risks": analyze_contract_risks,
+    "submission_checklist": generate_submission_checklist,
+    "rfp_info": query_rfp_info
+}
+
+
+async def _compute(name, doc_id, top_docs, refresh, index=None):
+    # A failing section reports its own error instead of failing the whole analysis
+    try:
+        result = await ANALYSIS_SECTIONS[name](use_cache=not refresh, top_docs=top_docs, doc_id=doc_id, index=index)
+    except Exception as e:
+        print(f"❌ Error in {name} analysis: {e}")
+        return {"error": f"Failed to generate {name} analysis."}
+
+    # Only complete answers are kept; errors are retried on the next request
+    if doc_id and not (isinstance(result, dict) and "error" in result):
+        await asyncio.to_thread(analysis_store.set, doc_id, index, name, PROMPT_VERSIONS[name], result)
+    return result
+
+
+async def analysis_tasks(doc_id, names=None, refresh=False, index=None):
+    """Return one task per analysis resolving to (name, result).
+
+    Stored results are served as they are; the rest share one retrieval round
+    trip (filtered to doc_id) and run their LLM extractions concurrently.
+    RFP info skips retrieval when its fields were all extracted at ingestion.
+    doc_id None analyses the whole index and stores nothing.
+    """
+    names = list(names or ANALYSIS_SECTIONS)
+    stored = {}
+    if doc_id and not refresh:
+        for name in names:
+            result = await asyncio.to_thread(analysis_store.get, doc_id, index, name, PROMPT_VERSIONS[name])
+            record_cache("analysis", result is not None)
+            if result is not None:
+                stored[name] = result
+
+    if "rfp_info" in stored:
+        stored["rfp_info"] = _current_status(stored["rfp_info"])
+
+    missing = [name for name in names if name not in stored]
+    retrieve = missing
+    if "rfp_info" in missing and doc_id:
+        # No retrieval for RFP info when the rules resolved every field
+        if not _unresolved_fields(await asyncio.to_thread(analysis_store.get_fields, doc_id)):
+            retrieve = [name for name in missing if name != "rfp_info"]
+    documents = await retrieve_analysis_documents(retrieve, doc_id, index) if retrieve else {}
+
+    async def section(name):
+        if name in stored:
+            return name, stored[name]
+        return name, await _compute(name, doc_id, documents.get(name), refresh, index)
+
+    return [asyncio.create_task(section(name)) for name in names]
+
+
+async def get_analysis(doc_id, name, refresh=False, index=None):
+    (task,) = await analysis_tasks(doc_id, [name], refresh, index)
+    return (await task)[1]
+
+
+# Ingestion stage: compute (and store) every analysis not stored yet
+async def precompute_analyses(doc_id, index=None):
+    return dict(await asyncio.gather(*await analysis_tasks(doc_id, index=index)))
@@ -1,19 +1,149 @@
-from fastapi import UploadFile, File, FastAPI,HTTPException
-from elastic.elastic_helper import generate_rag_response, index_document, query_eligibility_criteria, query_project_requirements, analyze_contract_risks, generate_submission_checklist, query_rfp_metadata
+import time
+STARTED = time.perf_counter()
+
+from contextlib import asynccontextmanager
+from fastapi import UploadFile, File, FastAPI,HTTPException, Depends, Header, Form
+from elastic.elastic_helper import close_retriever, create_index, delete_index, document_exists, ensure_index, index_for_tenant, TENANT_INDEX_ROUTING, VECTOR_BACKEND, warm_up_embeddings, generate_rag_response, stream_rag_response
+from analysis_store import analysis_store, analysis_tasks, get_analysis
 from pathlib import Path
+import asyncio
+import json
 import shutil
 import os
-from elasticsearch import Elasticsearch
-from PyPDF2 import PdfReader
-from fastapi.responses import JSONResponse
-
-
-es = Elasticsearch(
-    "http://localhost:9200",
-    basic_auth=("elastic", os.getenv("ELASTIC_PASSWORD"))
-)
-
-app = FastAPI()
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from ingestion import INGESTION_HANDLERS, ensure_company_profile, ingest_company_document, remove_document, write_file
+from job_queue import JobStore, JobWorkerPool
+from llm_gateway import gateway_stats
+from metrics import server_timing, span, start_request_trace, summarize_spans
+from s3_utils import S3_ENABLED
+from utils.uploads import save_upload
+from utils.executors import embedding_executor, extraction_executor
+
+# Seconds between attempts to reach the vector store while it is still starting
+STARTUP_RETRY_SECONDS = float(os.getenv("STARTUP_RETRY_SECONDS", 2.0))
+# Requests slower than this log their per-stage breakdown
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", 5.0))
+
+job_store = JobStore()
+ingestion_workers = None
+
+# The configured vector store (VECTOR_BACKEND), as named in readiness and errors
+VECTOR_STORE = {"elasticsearch": "Elasticsearch", "numpy": "NumPy vector store"}.get(VECTOR_BACKEND, VECTOR_BACKEND)
+
+# Components the app needs before it serves traffic, and how long each took
+readiness = {VECTOR_BACKEND: False, "embedding_model": False}
+startup_timings = {"imports": round(time.perf_counter() - STARTED, 3)}
+
+# Endpoints that work without the vector store
+ALWAYS_AVAILABLE = ("/healthz", "/readyz", "/metrics", "/api/jobs", "/api/llm")
+
+
+def _mark_ready(component, started):
+    readiness[component] = True
+    startup_timings[component] = round(time.perf_counter() - started, 3)
+    print(f"✅ {component} ready in {startup_timings[component]}s")
+    if all(readiness.values()):
+        startup_timings["total"] = round(time.perf_counter() - STARTED, 3)
+        print(f"🚀 Ready in {startup_timings['total']}s: {startup_timings}")
+
+
+async def _connect_vector_store():
+    # Retry until the vector store answers instead of crashing the process;
+    # ingestion workers only start once the index and the company facts exist
+    started = time.perf_counter()
+    while True:
+        try:
+            await ensure_index("rfp_documentsv2")
+            await ensure_company_profile()
+            break
+        except Exception as e:
+            print(f"⏳ {VECTOR_STORE} not reachable yet ({e}), retrying in {STARTUP_RETRY_SECONDS}s")
+            await asyncio.sleep(STARTUP_RETRY_SECONDS)
+    ingestion_workers.start()
+    _mark_ready(VECTOR_BACKEND, started)
+
+
+async def _load_embedding_model():
+    started = time.perf_counter()
+    await asyncio.get_running_loop().run_in_executor(embedding_executor, warm_up_embeddings)
+    _mark_ready("embedding_model", started)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global ingestion_workers
+    ingestion_workers = JobWorkerPool(job_store, INGESTION_HANDLERS)
+    # Slow resources come up in the background; the app answers /healthz right away
+    startup_tasks = [
+        asyncio.create_task(_connect_vector_store()),
+        asyncio.create_task(_load_embedding_model())
+    ]
+    print(f"🟢 Serving after {round(time.perf_counter() - STARTED, 3)}s (imports {startup_timings['imports']}s)")
+    yield
+    for task in startup_tasks:
+        task.cancel()
+    await asyncio.gather(*startup_tasks, return_exceptions=True)
+    await ingestion_workers.stop()
+    await close_retriever()
+    extraction_executor.shutdown(wait=False, cancel_futures=True)
+    embedding_executor.shutdown(wait=False, cancel_futures=True)
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.middleware("http")
+async def require_vector_store(request, call_next):
+    # Fail fast with 503 instead of hanging on a cluster that isn't up yet
+    if not readiness[VECTOR_BACKEND] and not request.url.path.startswith(ALWAYS_AVAILABLE):
+        return JSONResponse(
+            status_code=503,
+            content={"detail": f"{VECTOR_STORE} is not ready yet"},
+            headers={"Retry-After": str(int(STARTUP_RETRY_SECONDS) or 1)}
+        )
+    return await call_next(request)
+
+
+# Per-stage timings of each request: a Server-Timing header (visible in the
+# browser's network tab) and one log line for slow requests
+@app.middleware("http")
+async def record_timings(request, call_next):
+    if request.url.path.startswith("/metrics"):
+        return await call_next(request)
+    spans = start_request_trace()
+    started = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - started
+    totals = summarize_spans(spans)
+    if totals:
+        response.headers["Server-Timing"] = server_timing(totals)
+    if elapsed >= SLOW_REQUEST_SECONDS:
+        stages = {stage: round(seconds, 3) for stage, seconds in totals.items()}
+        print(f"🐢 {request.method} {request.url.path} took {elapsed:.3f}s {json.dumps(stages)}")
+    return response
+
+
+# Liveness: the process is up and the event loop responds
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+
+# Readiness: every startup component is available
+@app.get("/readyz")
+async def readyz():
+    ready = all(readiness.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"ready": ready, "components": readiness, "startup_seconds": startup_timings}
+    )
+
+
+# Prometheus scrape endpoint, served at /metrics itself (a mounted app redirects to /metrics/)
+@app.get("/metrics")
+async def prometheus_metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 UPLOAD_DIR = "uploads"
 TEXT_DIR = "texts"
@@ -22,30 +152,72 @@ TEXT_DIR = "texts"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(TEXT_DIR, exist_ok=True)
 
+
+# Index of the calling tenant (X-Tenant-ID header) when TENANT_INDEX_ROUTING is on,
+# the shared index otherwise
+def tenant_index(x_tenant_id: str = Header(None)):
+    try:
+        return index_for_tenant(x_tenant_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @app.post("/api/upload")
-async def upload_pdf(file: UploadFile = File(...)):
-    print("uploading new version of file")
+async def upload_pdf(file: UploadFile = File(...), replaces: str = Form(None), index: str = Depends(tenant_index)):
     filename = file.filename
-    file_location = os.path.join(UPLOAD_DIR, filename)
+    # A new version names the doc_id it replaces; uploads are never matched by filename
+    if replaces and not await asyncio.to_thread(analysis_store.has_document, replaces, index):
+        raise HTTPException(status_code=404, detail=f"Document to replace not found: {replaces}")
+
+    # Streamed to disk in fixed-size chunks, hashed on the way, and stored under
+    # the hash: a queued job always reads the content its doc_id was taken from
+    doc_id, size, file_location = await save_upload(file, UPLOAD_DIR, ".pdf")
+
+    # Identical content is already indexed (or being indexed): nothing to do
+    await ensure_index(index)
+    await ensure_company_profile(index)
+    if await document_exists(doc_id, index):
+        await asyncio.to_thread(analysis_store.record_document, doc_id, filename, index)
+        if replaces and replaces != doc_id:
+            await remove_document(replaces, index)
+        return {"message": f"ℹ️ Already indexed: {filename}", "doc_id": doc_id, "status": "duplicate"}
+    active_job = await asyncio.to_thread(job_store.find_active, "ingest_rfp", "doc_id", doc_id)
+    if active_job and active_job["payload"]["index_name"] == index:
+        return {"message": f"ℹ️ Already queued: {filename}", "doc_id": doc_id, "job_id": active_job["id"], "status": active_job["status"]}
+
+    # Extraction, chunking, embedding and indexing run in the background
+    job_id = await ingestion_workers.submit("ingest_rfp", {
+        "doc_id": doc_id,
+        "filename": filename,
+        "file_location": file_location,
+        "text_path": os.path.join(TEXT_DIR, f"{doc_id}.txt"),
+        "index_name": index,
+        "replaces": replaces,
+        "store_s3": S3_ENABLED
+    })
 
-    # Save uploaded file
-    with open(file_location, "wb") as f:
-        content = await file.read()
-        f.write(content)
+    return {"message": f"✅ Uploaded, queued for indexing: {filename}", "doc_id": doc_id, "size": size, "job_id": job_id, "status": "queued"}
 
-    # Extract text from PDF
-    reader = PdfReader(file_location)
-    full_text = "\n".join([page.extract_text() or "" for page in reader.pages])
 
-    # Save text
-    text_path = os.path.join(TEXT_DIR, filename.replace(".pdf", ".txt"))
-    with open(text_path, "w", encoding="utf-8") as f:
-        f.write(full_text)
+# Per-model LLM latency, queue depth, retries and coalesced calls
+@app.get("/api/llm/stats")
+async def llm_stats():
+    return gateway_stats()
 
-    # Index into Elasticsearch
-    index_document(index_name="rfp_documentsv2", text=full_text, filename=filename)
 
-    return {"message": f"✅ Uploaded and indexed: {filename}"}
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await asyncio.to_thread(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {
+        "id": job["id"],
+        "status": job["status"],
+        "stages": job["stages"],
+        "result": job["result"],
+        "error": job["error"],
+        "attempts": job["attempts"]
+    }
 
 
 
@@ -53,8 +225,9 @@ COMPANY_DATA_DIR = "company_data"
 os.makedirs(COMPANY_DATA_DIR, exist_ok=True)
 
 
+# Company documents become facts in the company index that prompts are matched against
 @app.post("/api/upload-company-data")
-async def upload_company_data(file: UploadFile = File(...)):
+async def upload_company_data(file: UploadFile = File(...), index: str = Depends(tenant_index)):
     if file.content_type not in [
         "application/pdf",
         "application/msword",
@@ -66,88 +239,114 @@ async def upload_company_data(file: UploadFile = File(...)):
     
     # Save original uploaded file
     with open(original_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+        await asyncio.to_thread(shutil.copyfileobj, file.file, buffer)
 
-    # Extract text (only if it's a PDF, for now)
-    extracted_text = ""
-    if file.content_type == "application/pdf":
-        try:
-            reader = PdfReader(original_path)
-            for page in reader.pages:
-                extracted_text += page.extract_text() or ""
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Failed to extract PDF text: {str(e)}")
-    else:
-        extracted_text = "Text extraction for Word documents is not yet implemented."
+    try:
+        result = await ingest_company_document(original_path, file.filename, index)
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=f"Failed to extract company data: {str(e)}")
 
     # Save extracted text to a .txt file
     txt_filename = f"{os.path.splitext(file.filename)[0]}.txt"
     txt_path = os.path.join(COMPANY_DATA_DIR, txt_filename)
 
-    with open(txt_path, "w", encoding="utf-8") as txt_file:
-        txt_file.write(extracted_text)
+    with span("text_write"):
+        await asyncio.to_thread(write_file, txt_path, result["text"])
 
     return {
         "filename": file.filename,
-        "message": "Company data uploaded and text extracted successfully",
-        "text_file": txt_filename
+        "message": "Company data uploaded and indexed successfully",
+        "text_file": txt_filename,
+        "facts": result["facts"]
     }
 
+# Questions are answered from one RFP: doc_id, or the latest uploaded one
 @app.get("/rag")
-def rag_query(q: str):
-    answer = generate_rag_response(q)
+async def rag_query(q: str, doc_id: str = None, index: str = Depends(tenant_index)):
+    answer = await generate_rag_response(q, doc_id=await _resolve_doc_id(doc_id, index), index=index)
     return {"answer": answer}
 
+
+@app.get("/rag/stream")
+async def rag_query_stream(q: str, doc_id: str = None, index: str = Depends(tenant_index)):
+    doc_id = await _resolve_doc_id(doc_id, index)
+
+    # Server-Sent Events: metadata first, then tokens as Gemini produces them
+    async def events():
+        async for event, data in stream_rag_response(q, doc_id=doc_id, index=index):
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.delete("/api/clear-index")
-def clear_index():
+async def clear_index(index: str = Depends(tenant_index)):
     print("delete older version here")
-    es.indices.delete(index="rfp_documentsv2", ignore_unavailable=True)
-    es.indices.create(index="rfp_documentsv2", body={
-        "mappings": {
-            "properties": {
-                "content": {"type": "text"},
-                "filename": {"type": "keyword"},
-                "timestamp": {"type": "date"}
-            }
-        }
-    })
+    await delete_index(index)
+    await create_index(index)
+    # Recorded documents and their analyses went with the chunks
+    await asyncio.to_thread(analysis_store.clear_index, index)
     return {"message": "Index cleared"}
 
 
 
 
 
-from fastapi.responses import JSONResponse
+# Analyses of one RFP (doc_id from /api/upload; defaults to the latest ingested
+# one) come from the analysis store; refresh=true recomputes and stores again
+async def _resolve_doc_id(doc_id, index):
+    if not doc_id:
+        return await asyncio.to_thread(analysis_store.latest_document, index if TENANT_INDEX_ROUTING else None)
+    # A tenant only sees documents of its own index
+    if TENANT_INDEX_ROUTING:
+        known = await asyncio.to_thread(analysis_store.has_document, doc_id, index)
+        if not known and not await document_exists(doc_id, index):
+            raise HTTPException(status_code=404, detail="Document not found")
+    return doc_id
 
-aggregated_data = {}
 
 @app.get("/api/eligibility")
-def get_eligibility():
-    response = query_eligibility_criteria()
-    aggregated_data["eligibility"] = response
+async def get_eligibility(doc_id: str = None, refresh: bool = False, index: str = Depends(tenant_index)):
+    response = await get_analysis(await _resolve_doc_id(doc_id, index), "eligibility", refresh, index)
     return {"criteria": response}
 
 @app.get("/api/requirements")
-def get_requirements():
-    response = query_project_requirements()
-    aggregated_data["requirements"] = response
+async def get_requirements(doc_id: str = None, refresh: bool = False, index: str = Depends(tenant_index)):
+    response = await get_analysis(await _resolve_doc_id(doc_id, index), "requirements", refresh, index)
     return {"requirements": response}
 
 @app.get("/api/contract-risks")
-def get_contract_risks():
-    response = analyze_contract_risks()
-    aggregated_data["contract_risks"] = response
+async def get_contract_risks(doc_id: str = None, refresh: bool = False, index: str = Depends(tenant_index)):
+    response = await get_analysis(await _resolve_doc_id(doc_id, index), "contract_risks", refresh, index)
     return {"risks": response}
 
 @app.get("/api/submission-checklist")
-def get_submission_checklist():
-    checklist = generate_submission_checklist()
-    aggregated_data["submission_checklist"] = checklist
-    # return JSONResponse(content=aggregated_data)
-
+async def get_submission_checklist(doc_id: str = None, refresh: bool = False, index: str = Depends(tenant_index)):
+    checklist = await get_analysis(await _resolve_doc_id(doc_id, index), "submission_checklist", refresh, index)
     return JSONResponse(content={"checklist": checklist})
 
 
 @app.get("/api/rfp-info")
-def read_rfp_info():
-    return query_rfp_metadata()
\ No newline at end of file
+async def read_rfp_info(doc_id: str = None, refresh: bool = False, index: str = Depends(tenant_index)):
+    return await get_analysis(await _resolve_doc_id(doc_id, index), "rfp_info", refresh, index)
+
+
+@app.get("/api/analysis")
+async def get_full_analysis(doc_id: str = None, refresh: bool = False, stream: bool = False,
+                            index: str = Depends(tenant_index)):
+    # Stored sections are returned as is; the rest share one retrieval and run concurrently
+    tasks = await analysis_tasks(await _resolve_doc_id(doc_id, index), refresh=refresh, index=index)
+
+    if not stream:
+        return JSONResponse(content=dict(await asyncio.gather(*tasks)))
+
+    async def section_events():
+        # One NDJSON line per section, in completion order
+        for task in asyncio.as_completed(tasks):
+            name, result = await task
+            yield json.dumps({"section": name, "result": result}) + "\n"
+
+    return StreamingResponse(section_events(), media_type="application/x-ndjson")
@@ -0,0 +1,305 @@
+"""In-process stand-ins for Elasticsearch and Gemini used by the benchmarks.
+
+FakeElasticsearch implements the subset of the AsyncElasticsearch API the
+backend uses (index admin, count, bulk, search/scroll, msearch with kNN and
+match queries, delete_by_query) over Python dicts, with exact cosine kNN and a
+simple BM25. Every call can be delayed by `latency` seconds to stand in for
+the network. install_fakes() points elastic_helper and the LLM gateway at them.
+"""
+import asyncio
+import json
+import math
+import re
+from collections import Counter
+import numpy as np
+
+_WORD = re.compile(r"\w+")
+
+
+class _Response:
+    # async_bulk reads resp.body; everything else indexes the dict directly
+    def __init__(self, body):
+        self.body = body
+
+    def __getitem__(self, key):
+        return self.body[key]
+
+    def get(self, key, default=None):
+        return self.body.get(key, default)
+
+
+class _Serializer:
+    def dumps(self, data):
+        return json.dumps(data).encode("utf-8")
+
+
+class _Transport:
+    class serializers:
+        @staticmethod
+        def get_serializer(mimetype):
+            return _Serializer()
+
+
+class _Index:
+    def __init__(self, mapping):
+        self.mapping = mapping
+        self.docs = {}
+        self._matrix = None
+
+    def vectors(self):
+        # (ids, unit vectors) of every document with an embedding, rebuilt after writes
+        if self._matrix is None:
+            ids = [doc_id for doc_id, doc in self.docs.items() if doc.get("embedding") is not None]
+            if not ids:
+                # Nothing embedded yet: kNN returns no hits, like Elasticsearch
+                self._matrix = ([], np.zeros((0, 0), np.float32))
+                return self._matrix
+            matrix = np.array([self.docs[doc_id]["embedding"] for doc_id in ids], dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            self._matrix = (ids, matrix / np.maximum(norms, 1e-12))
+        return self._matrix
+
+
+class _Indices:
+    def __init__(self, client):
+        self._client = client
+
+    async def exists(self, index):
+        await self._client._delay()
+        return index in self._client.indices_data
+
+    async def create(self, index, body=None, **kwargs):
+        await self._client._delay()
+        self._client.indices_data[index] = _Index(body or {})
+        return {"acknowledged": True}
+
+    async def delete(self, index, ignore_unavailable=False, **kwargs):
+        await self._client._delay()
+        if index not in self._client.indices_data and not ignore_unavailable:
+            raise KeyError(index)
+        self._client.indices_data.pop(index, None)
+        return {"acknowledged": True}
+
+    async def refresh(self, index=None, **kwargs):
+        await self._client._delay()
+        return {}
+
+
+def _matches(doc, query):
+    if not query or "match_all" in query:
+        return True
+    if "term" in query:
+        field, value = next(iter(query["term"].items()))
+        value = value["value"] if isinstance(value, dict) else value
+        return doc.get(field) == value
+    if "terms" in query:
+        field, values = next(iter(query["terms"].items()))
+        return doc.get(field) in values
+    if "match" in query:
+        field, text = next(iter(query["match"].items()))
+        words = set(_WORD.findall(str(doc.get(field, "")).lower()))
+        return any(word in words for word in _WORD.findall(text.lower()))
+    if "bool" in query:
+        clauses = query["bool"]
+
+        def as_list(key):
+            value = clauses.get(key) or []
+            return value if isinstance(value, list) else [value]
+
+        return (
+            all(_matches(doc, q) for q in as_list("filter") + as_list("must"))
+            and not any(_matches(doc, q) for q in as_list("must_not"))
+        )
+    raise ValueError(f"Unsupported query: {query}")
+
+
+def _filter_source(doc, source):
+    if source is None or source is True:
+        return dict(doc)
+    if isinstance(source, dict):
+        excludes = set(source.get("excludes", []))
+        return {key: value for key, value in doc.items() if key not in excludes}
+    return {key: doc[key] for key in source if key in doc}
+
+
+class FakeElasticsearch:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.indices_data = {}
+        self.indices = _Indices(self)
+        self.transport = _Transport()
+        self.calls = Counter()
+
+    async def _delay(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def options(self, **kwargs):
+        return self
+
+    async def close(self):
+        pass
+
+    async def ping(self):
+        return True
+
+    def _index(self, name):
+        if name not in self.indices_data:
+            raise KeyError(f"no such index [{name}]")
+        return self.indices_data[name]
+
+    async def count(self, index, query=None, **kwargs):
+        self.calls["count"] += 1
+        await self._delay()
+        docs = self._index(index).docs.values()
+        return _Response({"count": sum(1 for doc in docs if _matches(doc, query))})
+
+    async def bulk(self, operations, **kwargs):
+        self.calls["bulk"] += 1
+        await self._delay()
+        lines = [json.loads(line) if isinstance(line, (bytes, str)) else line for line in operations]
+        items = []
+        position = 0
+        while position < len(lines):
+            action, meta = next(iter(lines[position].items()))
+            index = self.indices_data.setdefault(meta["_index"], _Index({}))
+            doc_id = meta.get("_id") or str(len(index.docs))
+            if action == "delete":
+                index.docs.pop(doc_id, None)
+                position += 1
+            else:
+                index.docs[doc_id] = lines[position + 1]
+                position += 2
+            index._matrix = None
+            items.append({action: {"_index": meta["_index"], "_id": doc_id, "status": 201}})
+        return _Response({"errors": False, "items": items})
+
+    async def delete_by_query(self, index, query, **kwargs):
+        self.calls["delete_by_query"] += 1
+        await self._delay()
+        target = self._index(index)
+        doomed = [doc_id for doc_id, doc in target.docs.items() if _matches(doc, query)]
+        for doc_id in doomed:
+            del target.docs[doc_id]
+        target._matrix = None
+        return _Response({"deleted": len(doomed)})
+
+    def _knn(self, target, knn):
+        ids, matrix = target.vectors()
+        if not ids:
+            return []
+        query = np.asarray(knn["query_vector"], dtype=np.float32)
+        query = query / max(np.linalg.norm(query), 1e-12)
+        scores = matrix @ query
+        filters = knn.get("filter") or []
+        hits = []
+        for position in np.argsort(-scores):
+            doc = target.docs[ids[position]]
+            if all(_matches(doc, f) for f in filters):
+                # cosine similarity is reported as (1 + cos) / 2
+                hits.append((ids[position], float((1 + scores[position]) / 2)))
+                if len(hits) >= knn["k"]:
+                    break
+        return hits
+
+    def _bm25(self, target, query, k1=1.2, b=0.75):
+        match_text = None
+        clauses = [query]
+        while clauses:
+            clause = clauses.pop()
+            if "match" in clause:
+                match_text = next(iter(clause["match"].values()))
+            elif "bool" in clause:
+                clauses.extend(clause["bool"].get("must") or [])
+        docs = [(doc_id, doc) for doc_id, doc in target.docs.items() if _matches(doc, query)]
+        if match_text is None:
+            return [(doc_id, 1.0) for doc_id, _ in docs]
+
+        terms = set(_WORD.findall(match_text.lower()))
+        tokenized = {doc_id: Counter(_WORD.findall(doc.get("text", "").lower())) for doc_id, doc in target.docs.items()}
+        average_length = sum(sum(c.values()) for c in tokenized.values()) / max(len(tokenized), 1)
+        document_frequency = {t: sum(1 for c in tokenized.values() if t in c) for t in terms}
+        hits = []
+        for doc_id, _ in docs:
+            counts = tokenized[doc_id]
+            length = sum(counts.values())
+            score = 0.0
+            for term in terms:
+                tf = counts.get(term, 0)
+                if tf:
+                    idf = math.log(1 + (len(tokenized) - document_frequency[term] + 0.5) / (document_frequency[term] + 0.5))
+                    score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / average_length))
+            hits.append((doc_id, score))
+        return sorted(hits, key=lambda hit: -hit[1])
+
+    def _search(self, index, body):
+        target = self._index(index)
+        size = body.get("size", 10)
+        if "knn" in body:
+            scored = self._knn(target, body["knn"])
+        else:
+            scored = self._bm25(target, body.get("query") or {"match_all": {}})
+        hits = [
+            {"_index": index, "_id": doc_id, "_score": score, "_source": _filter_source(target.docs[doc_id], body.get("_source"))}
+            for doc_id, score in scored[:size]
+        ]
+        return {"hits": {"total": {"value": len(scored)}, "hits": hits}, "_shards": {"total": 1, "successful": 1, "skipped": 0}}
+
+    async def search(self, index, body=None, size=None, scroll=None, **kwargs):
+        self.calls["search"] += 1
+        await self._delay()
+        body = dict(body or {})
+        for key in ("query", "knn", "_source"):
+            if key in kwargs:
+                body[key] = kwargs[key]
+        if scroll:
+            # One page holding every hit; the following scroll() call ends the scan
+            body["size"] = len(self._index(index).docs)
+            response = self._search(index, body)
+            response["_scroll_id"] = "fake-scroll"
+            return _Response(response)
+        if size is not None:
+            body["size"] = size
+        return _Response(self._search(index, body))
+
+    async def scroll(self, scroll_id, **kwargs):
+        await self._delay()
+        return _Response({"_scroll_id": None, "hits": {"hits": []}, "_shards": {"total": 1, "successful": 1, "skipped": 0}})
+
+    async def clear_scroll(self, scroll_id=None, **kwargs):
+        return _Response({})
+
+    async def msearch(self, searches, **kwargs):
+        self.calls["msearch"] += 1
+        await self._delay()
+        responses = []
+        for header, body in zip(searches[0::2], searches[1::2]):
+            try:
+                responses.append(self._search(header["index"], body))
+            except Exception as e:
+                responses.append({"error": {"type": type(e).__name__, "reason": str(e)}, "status": 404})
+        return _Response({"responses": responses})
+
+
+def install_fakes(es_latency=0.0, llm_latency=0.2, responder=None, requests_per_minute=None):
+    """Point the backend at a FakeElasticsearch and the deterministic fake LLM.
+
+    requests_per_minute replaces the gateway's rate limit (the fake has no quota).
+    Returns (fake Elasticsearch, LLM gateway).
+    """
+    import llm_gateway
+    from elastic import elastic_helper
+
+    es = FakeElasticsearch(latency=es_latency)
+    elastic_helper._es = es
+    elastic_helper._retriever = elastic_helper.ElasticsearchRetriever()
+    elastic_helper._ensured_indices.clear()
+
+    llm_gateway.LLM_PROVIDER = "fake"
+    llm_gateway._gateways.clear()
+    gateway = llm_gateway.get_gateway()
+    gateway.provider.latency = llm_latency
+    gateway.provider.responder = responder
+    if requests_per_minute:
+        gateway.bucket = llm_gateway.TokenBucket(requests_per_minute / 60, gateway.bucket.capacity)
+    return es, gateway
@@ -0,0 +1,277 @@
+"""Open-loop load / soak generator for the FastAPI app, in one process.
+
+    python -m benchmarks.load --rates 2 5 10 --duration 30
+    python -m benchmarks.load --mix upload=1 rag=3 analysis=6 --rates 4 --duration 1800   # soak
+
+Runs the real `app` (lifespan, job workers, executors) behind httpx's ASGI
+transport, with FakeElasticsearch and the fake LLM standing in for the
+network (--es-latency / --llm-latency inject their latency). Requests arrive
+as a Poisson process at each rate in turn; every step reports per-endpoint
+p50/p95/p99 latency, throughput and error rate, plus event-loop lag and the
+peak RSS of the process, as JSON. Uploads send the sample PDF with a unique
+trailer so each one is a new document that goes through full ingestion.
+
+The load generator shares the event loop with the app, like any in-process
+client; extraction worker processes are not included in the RSS figure.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import uuid
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ANALYSIS_PATHS = ("/api/eligibility", "/api/requirements", "/api/contract-risks", "/api/submission-checklist", "/api/rfp-info")
+RAG_QUESTIONS = (
+    "What insurance coverage is required?",
+    "When are proposals due?",
+    "Which licenses must the bidder hold?",
+    "What is the contract term?",
+    "How should the proposal be formatted?"
+)
+
+
+def _current_rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # ru_maxrss is in kilobytes on Linux (peak, not current)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Monitor:
+    """Samples event-loop lag (how late a timer fires) and process RSS."""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.lags = []
+        self.peak_rss = 0
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, loop.time() - expected))
+            self.peak_rss = max(self.peak_rss, _current_rss_bytes())
+
+    def start(self):
+        self.lags = []
+        self.peak_rss = _current_rss_bytes()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+
+
+def parse_mix(items):
+    mix = {}
+    for item in items:
+        name, _, weight = item.partition("=")
+        if name not in ("upload", "rag", "analysis"):
+            raise SystemExit(f"Unknown traffic kind: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class LoadGenerator:
+    def __init__(self, client, pdf_bytes, mix, timeout, max_in_flight, refresh_ratio):
+        self.client = client
+        self.pdf_bytes = pdf_bytes
+        self.kinds = list(mix)
+        self.weights = [mix[kind] for kind in self.kinds]
+        self.timeout = timeout
+        self.max_in_flight = max_in_flight
+        self.refresh_ratio = refresh_ratio
+        self.in_flight = set()
+
+    def _request(self, kind):
+        if kind == "upload":
+            content = self.pdf_bytes + f"\n% load {uuid.uuid4().hex}\n".encode()
+            files = {"file": (f"load-{uuid.uuid4().hex[:8]}.pdf", content, "application/pdf")}
+            return "POST /api/upload", self.client.post("/api/upload", files=files)
+        if kind == "rag":
+            return "GET /rag", self.client.get("/rag", params={"q": random.choice(RAG_QUESTIONS)})
+        path = random.choice(ANALYSIS_PATHS)
+        params = {"refresh": "true"} if random.random() < self.refresh_ratio else {}
+        return f"GET {path}", self.client.get(path, params=params)
+
+    async def _send(self, kind, results):
+        name, request = self._request(kind)
+        started = time.perf_counter()
+        try:
+            response = await asyncio.wait_for(request, self.timeout)
+            status = response.status_code
+        except asyncio.TimeoutError:
+            status = "timeout"
+        except Exception as e:
+            status = type(e).__name__
+        elapsed = time.perf_counter() - started
+
+        endpoint = results.setdefault(name, {"latencies": [], "statuses": {}})
+        endpoint["latencies"].append(elapsed)
+        endpoint["statuses"][str(status)] = endpoint["statuses"].get(str(status), 0) + 1
+
+    async def step(self, rate, duration):
+        """Send Poisson arrivals at `rate` per second for `duration` seconds, then drain."""
+        results = {}
+        dropped = 0
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        next_arrival = started
+        while True:
+            next_arrival += random.expovariate(rate)
+            if next_arrival - started >= duration:
+                break
+            await asyncio.sleep(max(0.0, next_arrival - loop.time()))
+            if len(self.in_flight) >= self.max_in_flight:
+                dropped += 1
+                continue
+            kind = random.choices(self.kinds, self.weights)[0]
+            task = asyncio.create_task(self._send(kind, results))
+            self.in_flight.add(task)
+            task.add_done_callback(self.in_flight.discard)
+
+        if self.in_flight:
+            await asyncio.wait(list(self.in_flight))
+        return results, dropped, loop.time() - started
+
+
+def _report_step(rate, results, dropped, elapsed, monitor):
+    from benchmarks.reporting import summarize
+
+    endpoints = {}
+    total = 0
+    for name, endpoint in sorted(results.items()):
+        requests = len(endpoint["latencies"])
+        errors = sum(count for status, count in endpoint["statuses"].items() if not (status.isdigit() and int(status) < 400))
+        total += requests
+        endpoints[name] = {
+            "requests": requests,
+            "throughput_rps": round(requests / elapsed, 2),
+            "error_rate": round(errors / requests, 4) if requests else 0.0,
+            "statuses": endpoint["statuses"],
+            "latency": summarize(endpoint["latencies"])
+        }
+    return {
+        "target_rate_rps": rate,
+        "seconds": round(elapsed, 2),
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 2),
+        "dropped_at_max_in_flight": dropped,
+        "endpoints": endpoints,
+        "event_loop_lag": summarize(monitor.lags),
+        "peak_rss_mb": round(monitor.peak_rss / 2 ** 20, 1)
+    }
+
+
+async def _wait_for(client, path, done, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        response = await client.get(path)
+        if done(response):
+            return response
+        await asyncio.sleep(0.2)
+    raise SystemExit(f"Timed out waiting for {path}")
+
+
+async def run(args, pdf_bytes):
+    import httpx
+    from benchmarks.fakes import install_fakes
+    import app as backend
+
+    install_fakes(args.es_latency, args.llm_latency, requests_per_minute=args.llm_rpm)
+    transport = httpx.ASGITransport(app=backend.app)
+    async with backend.app.router.lifespan_context(backend.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://load") as client:
+            await _wait_for(client, "/readyz", lambda r: r.status_code == 200, 120)
+
+            # One indexed and analysed RFP, so /rag and the analysis GETs have data
+            seed = await client.post("/api/upload", files={"file": ("seed.pdf", pdf_bytes, "application/pdf")})
+            job_id = seed.json().get("job_id")
+            if job_id:
+                await _wait_for(client, f"/api/jobs/{job_id}", lambda r: r.json()["status"] in ("done", "failed"), 600)
+
+            generator = LoadGenerator(
+                client, pdf_bytes, parse_mix(args.mix), args.timeout, args.max_in_flight, args.refresh_ratio
+            )
+            monitor = Monitor()
+            steps = []
+            for rate in args.rates:
+                monitor.start()
+                results, dropped, elapsed = await generator.step(rate, args.duration)
+                await monitor.stop()
+                steps.append(_report_step(rate, results, dropped, elapsed, monitor))
+                print(f"📈 {rate} req/s: {steps[-1]['throughput_rps']} req/s served, "
+                      f"loop lag p99 {steps[-1]['event_loop_lag'].get('p99_ms')} ms")
+
+            llm = (await client.get("/api/llm/stats")).json()
+    return steps, llm
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rates", type=float, nargs="+", default=[2.0, 5.0, 10.0], help="arrival rates (req/s), one step each")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds per step")
+    parser.add_argument("--mix", nargs="+", default=["upload=1", "rag=3", "analysis=6"], help="traffic weights: upload, rag, analysis")
+    parser.add_argument("--refresh-ratio", type=float, default=0.0, help="share of analysis GETs sent with refresh=true")
+    parser.add_argument("--es-latency", type=float, default=0.005, help="seconds added to every Elasticsearch call")
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="seconds the fake LLM takes per call")
+    parser.add_argument("--llm-rpm", type=float, help="override the gateway rate limit (default: app config)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per-request timeout in seconds")
+    parser.add_argument("--max-in-flight", type=int, default=1000)
+    parser.add_argument("--pdf", default=os.path.join(BACKEND_DIR, "uploads", "ELIGIBLE RFP - 1.pdf"))
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    with open(args.pdf, "rb") as f:
+        pdf_bytes = f.read()
+    output_path = os.path.abspath(args.output) if args.output else None
+
+    # The app keeps uploads, texts, caches and job/analysis stores relative to
+    # the working directory: run it in a scratch one
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(tempfile.mkdtemp(prefix="rfp-load-"))
+
+    from benchmarks.reporting import run_metadata
+    from utils.executors import embedding_executor, extraction_executor
+
+    started = time.time()
+    try:
+        # The backend logs with print(); keep stdout for the JSON report
+        with contextlib.redirect_stdout(sys.stderr):
+            steps, llm = asyncio.run(run(args, pdf_bytes))
+    finally:
+        extraction_executor.shutdown(wait=True, cancel_futures=True)
+        embedding_executor.shutdown(wait=True, cancel_futures=True)
+
+    report = {
+        "meta": run_metadata(
+            started, mix=args.mix, duration=args.duration, es_latency=args.es_latency,
+            llm_latency=args.llm_latency, refresh_ratio=args.refresh_ratio
+        ),
+        "steps": steps,
+        "llm": llm
+    }
+    output = json.dumps(report, indent=2)
+    if output_path:
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
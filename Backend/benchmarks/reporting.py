@@ -0,0 +1,44 @@
+import os
+import platform
+import statistics
+import subprocess
+import sys
+
+
+def summarize(samples):
+    """Latency summary in milliseconds of a list of durations in seconds."""
+    samples = sorted(samples)
+    if not samples:
+        return {"count": 0}
+
+    def percentile(p):
+        return round(samples[min(len(samples) - 1, int(p * len(samples)))] * 1000, 3)
+
+    return {
+        "count": len(samples),
+        "mean_ms": round(statistics.mean(samples) * 1000, 3),
+        "p50_ms": percentile(0.5),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "max_ms": round(samples[-1] * 1000, 3)
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_metadata(started_at, **settings):
+    return {
+        "started_at": started_at,
+        "git_commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        **settings
+    }
@@ -0,0 +1,238 @@
+"""Component benchmarks on the sample RFPs, with Elasticsearch and Gemini faked in-process.
+
+    python -m benchmarks.run                          # every benchmark, JSON on stdout
+    python -m benchmarks.run --only extraction search --output bench.json
+
+Measures PDF extraction (uploads/*.pdf), chunking and embedding throughput,
+bulk indexing and search latency per retrieval mode (texts/*.txt), and
+end-to-end latency of the five analyses against the fake LLM. Caches and
+stores go to a scratch directory so runs never reuse each other's results.
+"""
+import argparse
+import asyncio
+import contextlib
+import glob
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+_scratch = tempfile.mkdtemp(prefix="rfp-benchmark-")
+os.environ.setdefault("EMBEDDING_CACHE_DIR", _scratch)
+os.environ.setdefault("LLM_CACHE_PATH", os.path.join(_scratch, "llm_responses.sqlite3"))
+os.environ.setdefault("ANALYSIS_DB_PATH", os.path.join(_scratch, "analyses.sqlite3"))
+
+from analysis_store import analysis_tasks
+from benchmarks.fakes import install_fakes
+from benchmarks.reporting import run_metadata, summarize
+from elastic.elastic_helper import (
+    ANALYSIS_QUERIES, CONTEXT_CANDIDATES, embed_query, encode_chunks, ensure_index, index_chunks,
+    search_similar_documents, warm_up_embeddings
+)
+from ingestion import ensure_company_profile, extract_pdf_pages, run_in_extraction_executor
+from utils.chunking import split_pages_into_chunks
+from utils.embedding_generator import EMBEDDING_MODEL_ID, embedder
+from utils.executors import embedding_executor, extraction_executor
+from utils.text_extraction import count_pdf_pages
+
+BENCHMARKS = ("extraction", "chunking", "embedding", "indexing", "search", "analysis")
+BENCHMARK_INDEX = "rfp_benchmark"
+SEARCH_MODES = ("vector", "bm25", "hybrid")
+
+
+def load_texts(texts_dir):
+    documents = {}
+    for path in sorted(glob.glob(os.path.join(texts_dir, "*.txt"))):
+        with open(path, "r", encoding="utf-8") as f:
+            documents[os.path.basename(path)] = f.read()
+    return documents
+
+
+async def bench_extraction(pdfs):
+    # Start the worker processes outside the timed region
+    await run_in_extraction_executor(count_pdf_pages, pdfs[0])
+    files = []
+    for path in pdfs:
+        started = time.perf_counter()
+        result = await extract_pdf_pages(path)
+        seconds = time.perf_counter() - started
+        files.append({
+            "file": os.path.basename(path),
+            "pages": len(result["pages"]),
+            "failed_pages": len(result["failed_pages"]),
+            "seconds": round(seconds, 3),
+            "pages_per_second": round(len(result["pages"]) / seconds, 2)
+        })
+    pages = sum(f["pages"] for f in files)
+    seconds = sum(f["seconds"] for f in files)
+    return {"files": files, "pages": pages, "pages_per_second": round(pages / seconds, 2) if seconds else None}
+
+
+def bench_chunking(documents, iterations):
+    samples = []
+    chunks = {}
+    for _ in range(iterations):
+        started = time.perf_counter()
+        chunks = {name: split_pages_into_chunks([text]) for name, text in documents.items()}
+        samples.append(time.perf_counter() - started)
+    characters = sum(len(text) for text in documents.values())
+    count = sum(len(c) for c in chunks.values())
+    return {
+        "chunks": count,
+        "latency": summarize(samples),
+        "chunks_per_second": round(count / statistics.median(samples), 1),
+        "mb_per_second": round(characters / 1e6 / statistics.median(samples), 2)
+    }, chunks
+
+
+async def bench_embedding(chunks_by_file, iterations):
+    await asyncio.get_running_loop().run_in_executor(embedding_executor, warm_up_embeddings)
+    chunks = [chunk for chunks in chunks_by_file.values() for chunk in chunks]
+
+    started = time.perf_counter()
+    embeddings = await encode_chunks(chunks)
+    seconds = time.perf_counter() - started
+
+    # Concurrent distinct questions, as from simultaneous /rag requests
+    batches_before = embedder.batches
+    questions = [f"{query} (variant {i})" for i in range(iterations) for query in ANALYSIS_QUERIES.values()]
+    latencies = []
+
+    async def timed(question):
+        question_started = time.perf_counter()
+        await embed_query(question)
+        latencies.append(time.perf_counter() - question_started)
+
+    await asyncio.gather(*(timed(question) for question in questions))
+
+    vectors = iter(embeddings)
+    embedded = {name: [next(vectors) for _ in chunks] for name, chunks in chunks_by_file.items()}
+    return {
+        "model": EMBEDDING_MODEL_ID,
+        "chunks": len(chunks),
+        "seconds": round(seconds, 3),
+        "chunks_per_second": round(len(chunks) / seconds, 1),
+        "concurrent_queries": len(questions),
+        "query_latency": summarize(latencies),
+        "query_batches": embedder.batches - batches_before
+    }, embedded
+
+
+async def bench_indexing(chunks_by_file, embeddings_by_file):
+    await ensure_index(BENCHMARK_INDEX)
+    files = []
+    doc_ids = {}
+    for name, chunks in chunks_by_file.items():
+        doc_id = f"benchmark-{len(doc_ids)}"
+        started = time.perf_counter()
+        result = await index_chunks(BENCHMARK_INDEX, name, chunks, embeddings_by_file[name], doc_id=doc_id)
+        seconds = time.perf_counter() - started
+        doc_ids[name] = doc_id
+        files.append({
+            "file": name,
+            "chunks": result["indexed"],
+            "seconds": round(seconds, 3),
+            "chunks_per_second": round(result["indexed"] / seconds, 1)
+        })
+    return {"files": files}, doc_ids
+
+
+async def bench_search(doc_ids, iterations):
+    results = {}
+    queries = list(ANALYSIS_QUERIES.values())
+    for mode in SEARCH_MODES:
+        samples = []
+        for i in range(iterations):
+            for doc_id in doc_ids.values():
+                started = time.perf_counter()
+                await search_similar_documents(
+                    queries[i % len(queries)], top_k=CONTEXT_CANDIDATES, mode=mode,
+                    doc_id=doc_id, index=BENCHMARK_INDEX, with_metadata=True
+                )
+                samples.append(time.perf_counter() - started)
+        results[mode] = summarize(samples)
+    return results
+
+
+async def bench_analysis(doc_ids, iterations):
+    samples = []
+    for _ in range(iterations):
+        for doc_id in doc_ids.values():
+            started = time.perf_counter()
+            await asyncio.gather(*await analysis_tasks(doc_id, refresh=True, index=BENCHMARK_INDEX))
+            samples.append(time.perf_counter() - started)
+    return {"sections": 5, "latency": summarize(samples)}
+
+
+async def run(args):
+    _, gateway = install_fakes(args.es_latency, args.llm_latency, requests_per_minute=args.llm_rpm)
+    selected = set(args.only or BENCHMARKS)
+    results = {}
+
+    if "extraction" in selected:
+        pdfs = sorted(glob.glob(os.path.join(args.uploads, "*.pdf")))
+        results["extraction"] = await bench_extraction(pdfs) if pdfs else {"error": f"no PDFs in {args.uploads}"}
+
+    documents = load_texts(args.texts)
+    if not documents:
+        results["error"] = f"no texts in {args.texts}"
+        return results
+
+    # Later stages need the earlier ones' output, so they always run; only
+    # the selected ones are reported
+    chunking, chunks_by_file = bench_chunking(documents, args.iterations)
+    embedding, embeddings_by_file = await bench_embedding(chunks_by_file, args.iterations)
+    indexing, doc_ids = await bench_indexing(chunks_by_file, embeddings_by_file)
+    for name, result in (("chunking", chunking), ("embedding", embedding), ("indexing", indexing)):
+        if name in selected:
+            results[name] = result
+
+    if "search" in selected:
+        results["search"] = await bench_search(doc_ids, args.iterations)
+    if "analysis" in selected:
+        # Prompts are built from the facts matched in the company index
+        await ensure_company_profile(BENCHMARK_INDEX)
+        results["analysis"] = await bench_analysis(doc_ids, max(1, args.iterations // 5))
+        results["analysis"]["llm"] = gateway.stats()["models"]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--uploads", default="uploads", help="directory of sample RFP PDFs")
+    parser.add_argument("--texts", default="texts", help="directory of extracted RFP texts")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--es-latency", type=float, default=0.0, help="seconds added to every fake Elasticsearch call")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds the fake LLM takes per call")
+    parser.add_argument("--llm-rpm", type=float, default=6000, help="gateway rate limit during the run")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    started = time.time()
+    try:
+        # The backend logs with print(); keep stdout for the JSON report
+        with contextlib.redirect_stdout(sys.stderr):
+            results = asyncio.run(run(args))
+    finally:
+        extraction_executor.shutdown(wait=True, cancel_futures=True)
+        embedding_executor.shutdown(wait=True, cancel_futures=True)
+
+    report = {
+        "meta": run_metadata(
+            started, iterations=args.iterations, es_latency=args.es_latency, llm_latency=args.llm_latency
+        ),
+        "results": results
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""Result parity and latency of the Elasticsearch and NumPy retriever backends.
+
+    python -m benchmarks.vector_backends                          # against FakeElasticsearch
+    python -m benchmarks.vector_backends --es http://localhost:9200
+
+Indexes the chunks of every RFP text in texts/ into both backends, runs the
+analysis queries in every retrieval mode, per RFP and across the index, and
+reports overlap@k of the returned chunks and the search latency of each
+backend, plus how long the NumPy index takes to open. Without --es the ES
+side is the in-process fake (exact kNN), so overlap isolates the NumPy
+backend's own scoring; with --es it includes HNSW approximation.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+
+_scratch = tempfile.mkdtemp(prefix="rfp-backends-")
+os.environ.setdefault("EMBEDDING_CACHE_DIR", _scratch)
+
+from benchmarks.fakes import install_fakes
+from benchmarks.reporting import run_metadata, summarize
+from benchmarks.run import load_texts
+from elastic import elastic_helper
+from elastic.elastic_helper import (
+    ANALYSIS_QUERIES, RETRIEVAL_PROFILES, encode_chunks, ensure_index, index_chunks, search_similar_documents
+)
+from utils.chunking import split_pages_into_chunks
+from utils.executors import embedding_executor, extraction_executor
+from utils.numpy_index import NumpyRetriever, NumpyVectorIndex
+
+BENCHMARK_INDEX = "rfp_backend_benchmark"
+SEARCH_MODES = ("vector", "bm25", "hybrid")
+
+
+async def index_samples(documents):
+    doc_ids = {}
+    await ensure_index(BENCHMARK_INDEX)
+    for name, text in documents.items():
+        chunks = split_pages_into_chunks([text])
+        doc_ids[name] = f"benchmark-{len(doc_ids)}"
+        await index_chunks(BENCHMARK_INDEX, name, chunks, await encode_chunks(chunks), doc_id=doc_ids[name])
+    return doc_ids
+
+
+async def run_queries(doc_ids, top_k, iterations):
+    # (mode, query, doc_id) -> ranked chunk keys; mode -> latency samples
+    results = {}
+    latencies = {mode: [] for mode in SEARCH_MODES}
+    for mode in SEARCH_MODES:
+        for analysis, query in ANALYSIS_QUERIES.items():
+            keywords = RETRIEVAL_PROFILES.get(analysis, {}).get("keywords")
+            for doc_id in [None, *doc_ids.values()]:
+                for _ in range(iterations):
+                    started = time.perf_counter()
+                    chunks = await search_similar_documents(
+                        query, top_k=top_k, min_score=0, mode=mode, keywords=keywords,
+                        with_metadata=True, doc_id=doc_id, index=BENCHMARK_INDEX
+                    )
+                    latencies[mode].append(time.perf_counter() - started)
+                results[(mode, query, doc_id)] = [(chunk["doc_id"], chunk["chunk_index"]) for chunk in chunks]
+    return results, latencies
+
+
+def compare(reference, candidate, top_k):
+    report = {}
+    for mode in SEARCH_MODES:
+        keys = [key for key in reference if key[0] == mode]
+        overlaps = [
+            len(set(reference[key]) & set(candidate[key])) / max(len(reference[key]), 1)
+            for key in keys
+        ]
+        report[mode] = {
+            "queries": len(keys),
+            f"overlap@{top_k}": round(sum(overlaps) / len(overlaps), 4) if overlaps else None,
+            "identical_rankings": sum(reference[key] == candidate[key] for key in keys)
+        }
+    return report
+
+
+async def run(args, documents):
+    if args.es:
+        elastic_helper.ELASTIC_URL = args.es
+        elastic_helper._es = None
+        elastic_helper._retriever = elastic_helper.ElasticsearchRetriever()
+        elastic_helper._ensured_indices.clear()
+        await elastic_helper.delete_index(BENCHMARK_INDEX)
+    else:
+        install_fakes(es_latency=args.es_latency)
+
+    backends = {}
+    try:
+        for name in ("elasticsearch", "numpy"):
+            if name == "numpy":
+                elastic_helper._retriever = NumpyRetriever(os.path.join(_scratch, "vector_store"))
+                elastic_helper._ensured_indices.clear()
+            doc_ids = await index_samples(documents)
+            if args.es and name == "elasticsearch":
+                await elastic_helper.get_es().indices.refresh(index=BENCHMARK_INDEX)
+            backends[name] = await run_queries(doc_ids, args.top_k, args.iterations)
+    finally:
+        if args.es:
+            elastic_helper._retriever = elastic_helper.ElasticsearchRetriever()
+            await elastic_helper.delete_index(BENCHMARK_INDEX)
+            await elastic_helper.close_es()
+
+    started = time.perf_counter()
+    reopened = NumpyVectorIndex(os.path.join(_scratch, "vector_store", BENCHMARK_INDEX))
+    open_seconds = time.perf_counter() - started
+
+    return {
+        "chunks": reopened.count(),
+        "parity": compare(backends["elasticsearch"][0], backends["numpy"][0], args.top_k),
+        "latency": {
+            name: {mode: summarize(samples) for mode, samples in latencies.items()}
+            for name, (_, latencies) in backends.items()
+        },
+        "numpy_open_ms": round(open_seconds * 1000, 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--texts", default="texts", help="directory of extracted RFP texts")
+    parser.add_argument("--es", help="Elasticsearch URL (default: in-process fake)")
+    parser.add_argument("--es-latency", type=float, default=0.002, help="seconds added to every fake Elasticsearch call")
+    parser.add_argument("--top-k", type=int, default=12)
+    parser.add_argument("--iterations", type=int, default=5, help="timed runs per query")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    documents = load_texts(args.texts)
+    if not documents:
+        raise SystemExit(f"No texts in {args.texts}")
+
+    started = time.time()
+    try:
+        # The backend logs with print(); keep stdout for the JSON report
+        with contextlib.redirect_stdout(sys.stderr):
+            results = asyncio.run(run(args, documents))
+    finally:
+        extraction_executor.shutdown(wait=True, cancel_futures=True)
+        embedding_executor.shutdown(wait=True, cancel_futures=True)
+
+    report = {
+        "meta": run_metadata(started, es=args.es or "fake", top_k=args.top_k, iterations=args.iterations),
+        "results": results
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
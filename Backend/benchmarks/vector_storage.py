@@ -0,0 +1,212 @@
+"""Recall vs memory of float32 and quantized vector storage on the sample RFPs.
+
+Encodes the chunks of every RFP text in texts/ and compares, for each
+VECTOR_INDEX_TYPE, the top-k chunks of a set of queries with the exact float32
+top-k (recall@k) next to the memory the HNSW graph needs for the vectors.
+
+    python -m benchmarks.vector_storage                  # in-process, quantization only
+    python -m benchmarks.vector_storage --es http://localhost:9200
+
+Without --es the quantized vectors are scored exhaustively, which isolates
+quantization loss from HNSW approximation. With --es each storage type is
+indexed into a scratch index and queried through kNN; the embedding field's
+size comes from the disk usage API. Results are printed (or written) as JSON.
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import random
+import time
+import numpy as np
+from elastic.elastic_helper import (
+    ANALYSIS_QUERIES, KNN_NUM_CANDIDATES, SEARCH_SOURCE, VECTOR_INDEX_TYPES,
+    build_index_mapping, to_index_vector
+)
+from utils.chunking import split_pages_into_chunks
+from utils.embedding_generator import EMBEDDING_MODEL_ID, encode_texts
+
+DIMS = 384
+# Bytes per vector kept in memory for HNSW search (int8/int4 add one float
+# correction term per vector)
+VECTOR_BYTES = {
+    "hnsw": DIMS * 4,
+    "int8_hnsw": DIMS + 4,
+    "int4_hnsw": DIMS // 2 + 4,
+    "byte": DIMS,
+}
+# Quantile Elasticsearch uses to clip before scalar quantization
+CONFIDENCE_INTERVAL = 0.99
+
+
+def load_sample_chunks(texts_dir):
+    chunks = []
+    for path in sorted(glob.glob(os.path.join(texts_dir, "*.txt"))):
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        for chunk in split_pages_into_chunks([text]):
+            chunk["filename"] = os.path.basename(path)
+            chunks.append(chunk)
+    return chunks
+
+
+def sample_queries(chunks, count, seed):
+    # The analysis queries plus the first sentence of randomly picked chunks
+    queries = list(ANALYSIS_QUERIES.values())
+    rng = random.Random(seed)
+    for chunk in rng.sample(chunks, min(count, len(chunks))):
+        queries.append(chunk["text"].split(". ")[0][:300])
+    return queries
+
+
+def quantize(vectors, vector_index_type):
+    """Round-trip vectors through the storage type and return what search sees."""
+    if vector_index_type == "hnsw":
+        return vectors
+    if vector_index_type == "byte":
+        return np.array([to_index_vector(v, "byte") for v in vectors], dtype=np.float32)
+
+    bits = 8 if vector_index_type == "int8_hnsw" else 4
+    levels = 2 ** bits - 1
+    tail = (1 - CONFIDENCE_INTERVAL) / 2
+    low, high = np.quantile(vectors, [tail, 1 - tail])
+    scale = (high - low) / levels
+    codes = np.round((np.clip(vectors, low, high) - low) / scale)
+    return codes * scale + low
+
+
+def top_k(query_vectors, vectors, k):
+    norms = np.linalg.norm(vectors, axis=1)
+    scores = (query_vectors @ vectors.T) / norms
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def recall(expected, actual):
+    return float(np.mean([len(set(e) & set(a)) / len(e) for e, a in zip(expected, actual)]))
+
+
+def run_in_process(chunk_vectors, query_vectors, exact, k):
+    results = {}
+    for vector_index_type in VECTOR_INDEX_TYPES:
+        stored = quantize(chunk_vectors, vector_index_type)
+        queries = quantize(query_vectors, vector_index_type) if vector_index_type == "byte" else query_vectors
+        results[vector_index_type] = {
+            f"recall@{k}": round(recall(exact, top_k(queries, stored, k)), 4),
+            "vector_bytes": VECTOR_BYTES[vector_index_type] * len(chunk_vectors),
+        }
+    return results
+
+
+async def run_against_elasticsearch(url, password, chunks, chunk_vectors, query_vectors, exact, k, num_candidates):
+    from elasticsearch import AsyncElasticsearch
+    from elasticsearch.helpers import async_bulk
+
+    es = AsyncElasticsearch(url, basic_auth=("elastic", password))
+    results = {}
+    try:
+        for vector_index_type in VECTOR_INDEX_TYPES:
+            name = f"rfp_vector_benchmark_{vector_index_type}"
+            await es.indices.delete(index=name, ignore_unavailable=True)
+            try:
+                await es.indices.create(index=name, body=build_index_mapping(vector_index_type))
+            except Exception as e:
+                # e.g. int4_hnsw before Elasticsearch 8.15
+                results[vector_index_type] = {"error": str(e)}
+                continue
+
+            try:
+                actions = (
+                    {
+                        "_index": name,
+                        "_id": str(position),
+                        "_source": {
+                            "text": chunk["text"],
+                            "filename": chunk["filename"],
+                            "embedding": to_index_vector(vector, vector_index_type)
+                        }
+                    }
+                    for position, (chunk, vector) in enumerate(zip(chunks, chunk_vectors))
+                )
+                await async_bulk(es, actions)
+                await es.indices.forcemerge(index=name, max_num_segments=1)
+                await es.indices.refresh(index=name)
+
+                found = []
+                started = time.perf_counter()
+                for vector in query_vectors:
+                    response = await es.search(index=name, body={
+                        "knn": {
+                            "field": "embedding",
+                            "query_vector": to_index_vector(vector, vector_index_type),
+                            "k": k,
+                            "num_candidates": max(num_candidates, k)
+                        },
+                        "size": k,
+                        "_source": SEARCH_SOURCE
+                    })
+                    found.append([int(hit["_id"]) for hit in response["hits"]["hits"]])
+                elapsed = time.perf_counter() - started
+
+                usage = await es.indices.disk_usage(index=name, run_expensive_tasks=True)
+                embedding_usage = usage[name]["fields"].get("embedding", {})
+                results[vector_index_type] = {
+                    f"recall@{k}": round(recall(exact, found), 4),
+                    "mean_query_ms": round(elapsed / len(query_vectors) * 1000, 2),
+                    "vector_bytes": VECTOR_BYTES[vector_index_type] * len(chunk_vectors),
+                    "embedding_disk_bytes": embedding_usage.get("total_in_bytes"),
+                    "knn_vectors_disk_bytes": embedding_usage.get("knn_vectors_in_bytes"),
+                }
+            finally:
+                await es.indices.delete(index=name, ignore_unavailable=True)
+    finally:
+        await es.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--texts", default="texts", help="directory of extracted RFP texts")
+    parser.add_argument("--queries", type=int, default=50, help="chunk-derived queries on top of the analysis queries")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--num-candidates", type=int, default=KNN_NUM_CANDIDATES)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--es", help="Elasticsearch URL; benchmark real kNN indices instead of in-process")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    chunks = load_sample_chunks(args.texts)
+    if not chunks:
+        raise SystemExit(f"No RFP texts found in {args.texts}")
+    queries = sample_queries(chunks, args.queries, args.seed)
+
+    chunk_vectors = np.asarray(encode_texts([chunk["text"] for chunk in chunks]), dtype=np.float32)
+    query_vectors = np.asarray(encode_texts(queries), dtype=np.float32)
+    exact = top_k(query_vectors, chunk_vectors, args.k)
+
+    if args.es:
+        results = asyncio.run(run_against_elasticsearch(
+            args.es, os.getenv("ELASTIC_PASSWORD"), chunks, chunk_vectors, query_vectors,
+            exact, args.k, args.num_candidates
+        ))
+    else:
+        results = run_in_process(chunk_vectors, query_vectors, exact, args.k)
+
+    report = {
+        "model": EMBEDDING_MODEL_ID,
+        "mode": "elasticsearch" if args.es else "in_process",
+        "chunks": len(chunks),
+        "queries": len(queries),
+        "k": args.k,
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,118 +1,852 @@
+import asyncio
+import hashlib
 import os
 from dotenv import load_dotenv
-from elasticsearch import Elasticsearch
-from sentence_transformers import SentenceTransformer
-import google.generativeai as genai
+from elasticsearch import AsyncElasticsearch
+from elasticsearch.helpers import async_bulk, async_scan
 import json
 import re
-
-# Load environment variables
+import threading
+import time
+from utils.chunking import split_pages_into_chunks
+from utils.context_assembly import assemble_context
+from utils.embedding_cache import EmbeddingCache, load_query_embeddings
+from utils.embedding_generator import EMBEDDING_MODEL_ID, embedder, encode_texts, get_model
+from utils.executors import embedding_executor
+from utils.llm_cache import LLMResponseCache
+from utils.numpy_index import NumpyRetriever
+from utils.rfp_fields import RFP_INFO_FIELDS
+from metrics import RAG_TIME_TO_FIRST_TOKEN, RETRIEVAL_BELOW_MIN_SCORE, RETRIEVAL_HITS, record_cache, span
+from llm_gateway import get_gateway
+
+# Load environment variables (cheap; module-level settings below read them)
 load_dotenv()
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 
-# Elasticsearch client setup
-es = Elasticsearch(
-    "http://localhost:9200",
-    basic_auth=("elastic", os.getenv("ELASTIC_PASSWORD"))
-)
+ELASTIC_URL = os.getenv("ELASTIC_URL", "http://localhost:9200")
+# Where chunks are stored and searched: "elasticsearch", or "numpy" for an
+# in-process, memory-mapped index under VECTOR_STORE_DIR (no ES node needed;
+# for single-process deployments with up to a few hundred thousand chunks)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "elasticsearch")
+VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR", "vector_store")
+
+# Clients are created on first use, so importing this module never touches the
+# network and the app can start while Elasticsearch is still coming up
+_es = None
+
+
+def get_es():
+    global _es
+    if _es is None:
+        _es = AsyncElasticsearch(
+            ELASTIC_URL,
+            basic_auth=("elastic", os.getenv("ELASTIC_PASSWORD"))
+        )
+    return _es
+
+
+async def close_es():
+    global _es
+    if _es is not None:
+        await _es.close()
+        _es = None
+
+
 
 index_name = "rfp_documentsv2"
 
-# Load embedding model once
-embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
-
-# Create index with mapping if it doesn't exist
-if not es.indices.exists(index=index_name):
-    es.indices.create(
-        index=index_name,
-        body={
-            "mappings": {
-                "properties": {
-                    "text": {"type": "text"},
-                    "filename": {"type": "keyword"},
-                    "embedding": {
-                        "type": "dense_vector",
-                        "dims": 384,
-                        "index": True
-                    }
-                }
+# Optional per-tenant indices: requests carrying a tenant id read and write
+# "<TENANT_INDEX_PREFIX>-<tenant>" instead of the shared index
+TENANT_INDEX_ROUTING = os.getenv("TENANT_INDEX_ROUTING", "false").lower() == "true"
+TENANT_INDEX_PREFIX = os.getenv("TENANT_INDEX_PREFIX", index_name)
+_TENANT_ID = re.compile(r"^[a-z0-9][a-z0-9_-]{0,63}$")
+
+# Number of chunk documents sent per bulk request
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", 500))
+
+# How the embedding field is stored and indexed:
+#   "hnsw"       float32 vectors (4 bytes per dimension in the HNSW graph)
+#   "int8_hnsw"  float32 in _source/segments, HNSW on int8-quantized copies (~4x less memory)
+#   "int4_hnsw"  as int8_hnsw with half-byte quantization (~8x less memory, ES 8.15+)
+#   "byte"       int8 vectors only (element_type byte), quantized before indexing
+VECTOR_INDEX_TYPES = ("hnsw", "int8_hnsw", "int4_hnsw", "byte")
+VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "hnsw")
+# Normalized embeddings lie in [-1, 1]; byte vectors store round(v * 127)
+BYTE_VECTOR_SCALE = 127
+# Vectors are only needed inside Elasticsearch; searches never fetch them
+SEARCH_SOURCE = {"excludes": ["embedding"]}
+
+
+def build_index_mapping(vector_index_type=VECTOR_INDEX_TYPE):
+    if vector_index_type not in VECTOR_INDEX_TYPES:
+        raise ValueError(f"Unknown vector index type: {vector_index_type}")
+
+    embedding = {
+        "type": "dense_vector",
+        "dims": 384,
+        "index": True,
+        "similarity": "cosine"
+    }
+    if vector_index_type == "byte":
+        embedding["element_type"] = "byte"
+        embedding["index_options"] = {"type": "hnsw"}
+    else:
+        embedding["index_options"] = {"type": vector_index_type}
+
+    return {
+        "mappings": {
+            "properties": {
+                "text": {"type": "text"},
+                "filename": {"type": "keyword"},
+                "doc_id": {"type": "keyword"},
+                "chunk_hash": {"type": "keyword"},
+                "page": {"type": "integer"},
+                "offset": {"type": "integer"},
+                "chunk_index": {"type": "integer"},
+                "embedding": embedding
             }
         }
+    }
+
+
+INDEX_MAPPING = build_index_mapping()
+
+
+# Vector as sent to Elasticsearch (documents and kNN queries alike)
+def to_index_vector(vector, vector_index_type=VECTOR_INDEX_TYPE):
+    values = vector if isinstance(vector, list) else vector.tolist()
+    if vector_index_type == "byte":
+        return [max(-128, min(127, round(value * BYTE_VECTOR_SCALE))) for value in values]
+    return values
+
+
+# Inverse of to_index_vector for embeddings read back from _source
+def from_index_vector(vector, vector_index_type=VECTOR_INDEX_TYPE):
+    if vector_index_type == "byte":
+        return [value / BYTE_VECTOR_SCALE for value in vector]
+    return vector
+
+
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "cache")
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", 1024))
+
+# Fixed retrieval queries of the analysis endpoints
+ANALYSIS_QUERIES = {
+    "eligibility": "Extract eligibility criteria for bidders from this RFP.",
+    "requirements": "Extract system and project requirements, classify them, and match them against company capabilities.",
+    "contract_risks": "Identify contractual risks in the RFP and suggest mitigation strategies.",
+    "submission_checklist": "Extract the proposal submission checklist from the RFP.",
+    "rfp_info": "Extract title, agency, issue date, due date, contract value, duration, and status from this RFP."
+}
+
+# Analysis query vectors are computed once and persisted next to the model id
+# (loaded by warm_up_embeddings or on first use); free-form /rag questions go
+# through a bounded LRU cache
+query_embeddings = None
+_query_embeddings_lock = threading.Lock()
+query_embedding_cache = EmbeddingCache(maxsize=QUERY_CACHE_SIZE)
+
+
+def get_query_embeddings():
+    global query_embeddings
+    if query_embeddings is None:
+        with _query_embeddings_lock:
+            if query_embeddings is None:
+                query_embeddings = load_query_embeddings(
+                    list(ANALYSIS_QUERIES.values()),
+                    encode_texts,
+                    EMBEDDING_MODEL_ID,
+                    os.path.join(EMBEDDING_CACHE_DIR, "query_embeddings.json")
+                )
+    return query_embeddings
+
+
+# Blocking: loads the embedding model and the analysis query vectors.
+# The app runs it on the embedding executor in the background at startup.
+def warm_up_embeddings():
+    get_model()
+    get_query_embeddings()
+
+
+# Misses go through the shared micro-batching embedder, so concurrent /rag
+# questions are encoded together with each other and with ingestion chunks
+async def embed_query(query):
+    if query_embeddings is None:
+        await asyncio.get_running_loop().run_in_executor(embedding_executor, get_query_embeddings)
+    vector = query_embeddings.get(query)
+    if vector is None:
+        vector = query_embedding_cache.lookup(query)
+    record_cache("query_embedding", vector is not None)
+    if vector is None:
+        with span("encode_query"):
+            vector = (await embedder.encode([query]))[0].tolist()
+        query_embedding_cache.store(query, vector)
+    return vector
+
+
+async def encode_chunks(chunks):
+    with span("encode"):
+        return await embedder.encode([chunk["text"] for chunk in chunks])
+
+
+async def create_index(name=index_name, mapping=INDEX_MAPPING):
+    await get_retriever().create_index(name, mapping)
+    print(f"✅ Created index: {name}")
+
+
+async def delete_index(name=index_name):
+    await get_retriever().delete_index(name)
+    _ensured_indices.discard(name)
+
+
+def index_for_tenant(tenant=None):
+    if not TENANT_INDEX_ROUTING or not tenant:
+        return index_name
+    tenant = tenant.lower()
+    if not _TENANT_ID.match(tenant):
+        raise ValueError(f"Invalid tenant id: {tenant}")
+    return f"{TENANT_INDEX_PREFIX}-{tenant}"
+
+
+_ensured_indices = set()
+
+
+# Create index with mapping if it doesn't exist; called on app startup and
+# before the first upload to a tenant index
+async def ensure_index(name=index_name):
+    if name in _ensured_indices:
+        return
+    if not await get_retriever().index_exists(name):
+        await create_index(name)
+    else:
+        print(f"ℹ️ Index '{name}' already exists")
+    _ensured_indices.add(name)
+
+
+# True if a document with this content hash is already indexed
+async def document_exists(doc_id, name=index_name):
+    return await get_retriever().count(name, doc_id) > 0
+
+
+async def count_documents(name=index_name):
+    return await get_retriever().count(name)
+
+
+# Embeddings already stored for a filename (any version), keyed by chunk text hash,
+# so a changed upload only re-encodes the chunks whose text changed
+async def load_chunk_embeddings(filename, name=index_name):
+    return await get_retriever().load_chunk_embeddings(name, filename)
+
+
+# Remove chunks of older versions of a file once the new version is indexed
+async def delete_stale_chunks(filename, doc_id, name=index_name):
+    deleted = await get_retriever().delete_stale_chunks(name, filename, doc_id)
+    if deleted:
+        print(f"🧹 Removed {deleted} stale chunks of {filename}")
+    return deleted
+
+
+# Remove every chunk of one document, e.g. an RFP a new upload replaces
+async def delete_document_chunks(doc_id, name=index_name):
+    deleted = await get_retriever().delete_document(name, doc_id)
+    if deleted:
+        print(f"🧹 Removed {deleted} chunks of replaced document {doc_id}")
+    return deleted
+
+
+# Bulk-write already encoded chunks of one file. Chunk ids derive from the content
+# hash, so re-running an ingestion overwrites instead of duplicating.
+async def index_chunks(index_name: str, filename: str, chunks, embeddings, batch_size=BULK_BATCH_SIZE, doc_id=None):
+    doc_id = doc_id or hashlib.sha256("\n".join(chunk["text"] for chunk in chunks).encode("utf-8")).hexdigest()
+    documents = (
+        (
+            f"{doc_id}-{chunk['chunk_index']}",
+            {
+                "text": chunk["text"],
+                "filename": filename,
+                "doc_id": doc_id,
+                "chunk_hash": chunk["chunk_hash"],
+                "page": chunk["page"],
+                "offset": chunk["offset"],
+                "chunk_index": chunk["chunk_index"]
+            },
+            embedding
+        )
+        for chunk, embedding in zip(chunks, embeddings)
     )
-    print(f"✅ Created index: {index_name}")
-else:
-    print(f"ℹ️ Index '{index_name}' already exists")
+    with span("index"):
+        indexed, errors = await get_retriever().index_chunks(index_name, documents, batch_size)
+
+    if errors:
+        print(f"⚠️ {len(errors)} chunks of {filename} failed to index")
+    print(f"✅ Indexed {indexed} chunks from {filename}")
+    return {"indexed": indexed, "errors": errors, "doc_id": doc_id}
 
-# Index a document
-def index_document(index_name: str, text: str, filename: str):
+
+# Index a document as page-aware chunks, one encode call and bulk writes
+async def index_document(index_name: str, text: str, filename: str, pages=None, batch_size=BULK_BATCH_SIZE, doc_id=None):
     try:
-        embedding = embedding_model.encode(text).tolist()
-        document = {
-            "text": text,
-            "filename": filename,
-            "embedding": embedding
-        }
-        response = es.index(index=index_name, document=document)
-        print(f"✅ Indexed: {filename}")
-        return response
+        chunks = split_pages_into_chunks(pages if pages is not None else [text])
+        if not chunks:
+            print(f"⚠️ No text to index for {filename}")
+            return None
+
+        embeddings = await encode_chunks(chunks)
+        return await index_chunks(index_name, filename, chunks, embeddings, batch_size, doc_id)
     except Exception as e:
         print(f"❌ Error indexing {filename}: {e}")
         return None
 
 # List all indexed documents (debug)
-def list_indexed_documents():
+async def list_indexed_documents():
     try:
-        results = es.search(index=index_name, body={"query": {"match_all": {}}}, size=10)
-        for i, hit in enumerate(results["hits"]["hits"], 1):
+        for i, hit in enumerate(await get_retriever().sample(index_name, 10), 1):
             print(f"{i}. {hit['_source']['filename']} — {hit['_source']['text'][:100]}...")
     except Exception as e:
         print(f"❌ Error listing documents: {e}")
 
-# Search top-k similar documents
-def search_similar_documents(query, top_k=3, min_score=0.9):
-    query_vector = embedding_model.encode(query).tolist()
+# Candidates HNSW examines per shard; higher gives better recall at some latency cost
+KNN_NUM_CANDIDATES = int(os.getenv("KNN_NUM_CANDIDATES", 100))
 
-    script_query = {
-        "script_score": {
-            "query": {"match_all": {}},
-            "script": {
-                "source": "cosineSimilarity(params.query_vector, 'embedding') + 1.0",
-                "params": {"query_vector": query_vector}
-            }
-        }
+
+def _build_filters(doc_id=None, filenames=None):
+    filters = []
+    if doc_id:
+        filters.append({"term": {"doc_id": doc_id}})
+    if filenames:
+        filters.append({"terms": {"filename": filenames}})
+    return filters
+
+
+def _knn_to_script_score(score):
+    # knn scores cosine as (1 + cos) / 2; callers use the old script_score scale of cos + 1
+    return score * 2
+
+
+def _knn_body(query_vector, top_k, num_candidates, filters):
+    knn = {
+        "field": "embedding",
+        "query_vector": to_index_vector(query_vector),
+        "k": top_k,
+        "num_candidates": max(num_candidates or KNN_NUM_CANDIDATES, top_k)
     }
+    if filters:
+        knn["filter"] = filters
+    return {"knn": knn, "size": top_k, "_source": SEARCH_SOURCE}
 
-    try:
-        results = es.search(
-            index=index_name,
-            body={
-                "size": top_k,
-                "query": script_query
+
+def _bm25_body(keywords, top_k, filters):
+    return {
+        "query": {
+            "bool": {
+                "must": [{"match": {"text": keywords}}],
+                "filter": filters
             }
+        },
+        "size": top_k,
+        "_source": SEARCH_SOURCE
+    }
+
+
+class ElasticsearchRetriever:
+    """Chunks in Elasticsearch: HNSW kNN and BM25, every search plan of a batch in one msearch."""
+    name = "elasticsearch"
+
+    async def index_exists(self, name):
+        return await get_es().indices.exists(index=name)
+
+    async def create_index(self, name, mapping=INDEX_MAPPING):
+        await get_es().indices.create(index=name, body=mapping)
+
+    async def delete_index(self, name):
+        await get_es().indices.delete(index=name, ignore_unavailable=True)
+
+    async def count(self, name, doc_id=None):
+        query = {"term": {"doc_id": doc_id}} if doc_id else {"match_all": {}}
+        return (await get_es().count(index=name, query=query))["count"]
+
+    async def load_chunk_embeddings(self, name, filename):
+        embeddings = {}
+        async for hit in async_scan(
+            get_es(),
+            index=name,
+            query={"query": {"term": {"filename": filename}}, "_source": ["chunk_hash", "embedding"]}
+        ):
+            source = hit["_source"]
+            if source.get("chunk_hash") and source.get("embedding"):
+                embeddings[source["chunk_hash"]] = from_index_vector(source["embedding"])
+        return embeddings
+
+    async def delete_stale_chunks(self, name, filename, doc_id):
+        response = await get_es().delete_by_query(
+            index=name,
+            query={
+                "bool": {
+                    "filter": [{"term": {"filename": filename}}],
+                    "must_not": [{"term": {"doc_id": doc_id}}]
+                }
+            },
+            refresh=True
         )
+        return response.get("deleted", 0)
 
-        hits = results["hits"]["hits"]
-        filtered = [
-            hit["_source"]["text"]
-            for hit in hits
-            if hit.get("_score", 0) >= min_score
+    async def delete_document(self, name, doc_id):
+        response = await get_es().delete_by_query(index=name, query={"term": {"doc_id": doc_id}}, refresh=True)
+        return response.get("deleted", 0)
+
+    async def index_chunks(self, name, documents, batch_size):
+        actions = (
+            {"_index": name, "_id": doc_id, "_source": {**source, "embedding": to_index_vector(embedding)}}
+            for doc_id, source, embedding in documents
+        )
+        return await async_bulk(get_es(), actions, chunk_size=batch_size, raise_on_error=False)
+
+    async def search(self, plans):
+        body = []
+        for plan in plans:
+            filters = _build_filters(**plan["filters"])
+            for retriever, request in plan["requests"]:
+                if retriever == "vector":
+                    search = _knn_body(request["query_vector"], request["size"], request["num_candidates"], filters)
+                else:
+                    search = _bm25_body(request["keywords"], request["size"], filters)
+                body.extend([{"index": plan["index"]}, search])
+        return (await get_es().msearch(searches=body))["responses"]
+
+    async def sample(self, name, size=10):
+        results = await get_es().search(index=name, body={"query": {"match_all": {}}, "_source": SEARCH_SOURCE}, size=size)
+        return results["hits"]["hits"]
+
+    async def close(self):
+        await close_es()
+
+
+_retriever = None
+
+
+def get_retriever():
+    global _retriever
+    if _retriever is None:
+        if VECTOR_BACKEND == "elasticsearch":
+            _retriever = ElasticsearchRetriever()
+        elif VECTOR_BACKEND == "numpy":
+            _retriever = NumpyRetriever(VECTOR_STORE_DIR)
+        else:
+            raise ValueError(f"Unknown vector backend: {VECTOR_BACKEND}")
+    return _retriever
+
+
+async def close_retriever():
+    global _retriever
+    if _retriever is not None:
+        await _retriever.close()
+        _retriever = None
+
+
+# Constant k in 1 / (k + rank); 60 is the value from the original RRF paper
+RRF_RANK_CONSTANT = int(os.getenv("RRF_RANK_CONSTANT", 60))
+# Hits fetched from each retriever before fusion, so fusion has something to re-rank
+HYBRID_RANK_WINDOW = int(os.getenv("HYBRID_RANK_WINDOW", 20))
+
+
+def _reciprocal_rank_fusion(ranked_hits, weights, rank_constant=RRF_RANK_CONSTANT):
+    """Fuse ranked hit lists keyed by retriever name into one list, best first.
+
+    Each hit contributes weight / (rank_constant + rank) for every list it appears in.
+    """
+    scores = {}
+    hits_by_id = {}
+    for name, hits in ranked_hits.items():
+        weight = weights.get(name, 1.0)
+        for rank, hit in enumerate(hits, start=1):
+            scores[hit["_id"]] = scores.get(hit["_id"], 0.0) + weight / (rank_constant + rank)
+            hits_by_id.setdefault(hit["_id"], hit)
+
+    ranked_ids = sorted(scores, key=scores.get, reverse=True)
+    return [hits_by_id[doc_id] for doc_id in ranked_ids]
+
+
+# A backend-neutral search: one (retriever, request) pair per ranked list to
+# fetch; the retriever backend turns them into queries
+# query_vector, when given, is used as is instead of embedding the query
+async def _plan_search(query, top_k=3, min_score=0.9, num_candidates=None, filename=None,
+                 mode="vector", weights=None, keywords=None, doc_id=None, index=None, query_vector=None):
+    keywords = keywords or query
+
+    if mode == "bm25":
+        requests = [("bm25", {"keywords": keywords, "size": top_k})]
+    else:
+        if query_vector is None:
+            query_vector = await embed_query(query)
+        if mode == "hybrid":
+            window = max(top_k, HYBRID_RANK_WINDOW)
+            requests = [
+                ("vector", {"query_vector": query_vector, "size": window, "num_candidates": num_candidates}),
+                ("bm25", {"keywords": keywords, "size": window})
+            ]
+        else:
+            requests = [("vector", {"query_vector": query_vector, "size": top_k, "num_candidates": num_candidates})]
+
+    return {
+        "requests": requests,
+        "filters": {
+            "doc_id": doc_id,
+            "filenames": [filename] if isinstance(filename, str) else list(filename or [])
+        },
+        "index": index or index_name,
+        "top_k": top_k,
+        "min_score": min_score,
+        "mode": mode,
+        "weights": weights or {}
+    }
+
+
+def _rank_hits(plan, hits_by_retriever):
+    if "vector" in hits_by_retriever:
+        vector_hits = hits_by_retriever["vector"]
+        hits_by_retriever["vector"] = [
+            hit for hit in vector_hits
+            if _knn_to_script_score(hit.get("_score", 0)) >= plan["min_score"]
         ]
+        dropped = len(vector_hits) - len(hits_by_retriever["vector"])
+        if dropped:
+            RETRIEVAL_BELOW_MIN_SCORE.labels(plan["mode"]).inc(dropped)
+
+    if len(hits_by_retriever) > 1:
+        hits = _reciprocal_rank_fusion(hits_by_retriever, plan["weights"])
+    else:
+        hits = next(iter(hits_by_retriever.values()))
+
+    # Never return the same chunk text twice, e.g. from the same RFP under two filenames
+    unique_hits = []
+    seen = set()
+    for hit in hits:
+        key = hit["_source"].get("chunk_hash") or hit["_source"]["text"]
+        if key not in seen:
+            seen.add(key)
+            unique_hits.append(hit)
+    return unique_hits[:plan["top_k"]]
+
+
+def _hit_to_chunk(hit):
+    source = hit["_source"]
+    return {
+        "text": source["text"],
+        "filename": source.get("filename"),
+        "doc_id": source.get("doc_id"),
+        "page": source.get("page"),
+        "offset": source.get("offset"),
+        "chunk_index": source.get("chunk_index"),
+        "score": hit.get("_score")
+    }
 
-        print(f"🔍 Found {len(filtered)} relevant documents (min_score={min_score})")
-        return filtered
 
+# Run several searches in a single msearch round trip. Each search is a dict of
+# search_similar_documents keyword arguments; returns one list of texts per search
+# (or chunk dicts with filename/page/offset when with_metadata is set), and a
+# failing search yields [] without affecting the others.
+async def search_many(searches, with_metadata=False, log=True):
+    try:
+        plans = await asyncio.gather(*(_plan_search(**search) for search in searches))
+        with span("search"):
+            responses = await get_retriever().search(plans)
     except Exception as e:
         print(f"❌ Error during search: {e}")
+        return [[] for _ in searches]
+
+    results = []
+    position = 0
+    for plan in plans:
+        hits_by_retriever = {}
+        error = None
+        for retriever, _ in plan["requests"]:
+            response = responses[position]
+            position += 1
+            if "error" in response:
+                error = response["error"]
+            else:
+                hits_by_retriever[retriever] = response["hits"]["hits"]
+
+        if error is not None:
+            print(f"❌ Error during search: {error}")
+            results.append([])
+            continue
+
+        hits = _rank_hits(plan, hits_by_retriever)
+        RETRIEVAL_HITS.labels(plan["mode"]).observe(len(hits))
+        if log:
+            print(f"🔍 Found {len(hits)} relevant documents (mode={plan['mode']}, min_score={plan['min_score']})")
+        if with_metadata:
+            results.append([_hit_to_chunk(hit) for hit in hits])
+        else:
+            results.append([hit["_source"]["text"] for hit in hits])
+
+    return results
+
+
+# Search top-k similar chunks.
+# mode: "vector" (approximate kNN / HNSW), "bm25" (match on text) or "hybrid"
+# (both in one msearch round trip, fused with reciprocal-rank fusion).
+# min_score applies to vector hits only, on the old cosine + 1 scale.
+# filename / doc_id restrict the search to one RFP (a filter inside the kNN query,
+# so the k nearest chunks all come from that RFP); index selects a tenant index.
+async def search_similar_documents(query, top_k=3, min_score=0.9, num_candidates=None, filename=None,
+                                   mode="vector", weights=None, keywords=None, with_metadata=False, doc_id=None,
+                                   index=None):
+    return (await search_many([{
+        "doc_id": doc_id,
+        "index": index,
+        "query": query,
+        "top_k": top_k,
+        "min_score": min_score,
+        "num_candidates": num_candidates,
+        "filename": filename,
+        "mode": mode,
+        "weights": weights,
+        "keywords": keywords
+    }], with_metadata=with_metadata))[0]
+
+
+# Retrieval settings per analysis. BM25 keywords carry the exact tokens
+# (form names, license numbers, NAICS codes) that embeddings tend to miss.
+RETRIEVAL_PROFILES = {
+    "eligibility": {
+        "mode": "hybrid",
+        "weights": {"vector": 1.0, "bm25": 1.0},
+        "keywords": "eligibility eligible qualifications license registration certification insurance experience NAICS bonding"
+    },
+    "requirements": {
+        "mode": "hybrid",
+        "weights": {"vector": 1.0, "bm25": 0.7},
+        "keywords": "must shall required mandatory requirements qualifications license certification experience"
+    },
+    "contract_risks": {
+        "mode": "hybrid",
+        "weights": {"vector": 1.0, "bm25": 0.5},
+        "keywords": "termination indemnify indemnification liability penalty liquidated damages insurance warranty"
+    },
+    "submission_checklist": {
+        "mode": "hybrid",
+        "weights": {"vector": 0.7, "bm25": 1.0},
+        "keywords": "form attachment affidavit signature submit submission copies page limit font format deadline"
+    },
+    "rfp_info": {
+        "mode": "hybrid",
+        "weights": {"vector": 1.0, "bm25": 1.0},
+        "keywords": "request for proposal RFP due date issue date contract term value agency"
+    },
+    "rag": {
+        "mode": "hybrid",
+        "weights": {"vector": 1.0, "bm25": 1.0}
+    }
+}
+
+
+# Candidate chunks retrieved per analysis; context assembly picks from them
+CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", 12))
+
+# Prompt context budget per endpoint, in estimated tokens
+CONTEXT_TOKEN_BUDGETS = {
+    "eligibility": int(os.getenv("ELIGIBILITY_CONTEXT_TOKENS", 2500)),
+    "requirements": int(os.getenv("REQUIREMENTS_CONTEXT_TOKENS", 3000)),
+    "contract_risks": int(os.getenv("CONTRACT_RISKS_CONTEXT_TOKENS", 2500)),
+    "submission_checklist": int(os.getenv("SUBMISSION_CHECKLIST_CONTEXT_TOKENS", 2500)),
+    "rfp_info": int(os.getenv("RFP_INFO_CONTEXT_TOKENS", 1500)),
+    "rag": int(os.getenv("RAG_CONTEXT_TOKENS", 2000))
+}
+
+
+def _retrieval_options(analysis, mode=None, weights=None):
+    options = dict(RETRIEVAL_PROFILES[analysis])
+    options.setdefault("top_k", CONTEXT_CANDIDATES)
+    if mode is not None:
+        options["mode"] = mode
+    if weights is not None:
+        options["weights"] = weights
+    return options
+
+
+# Retrieve the context of several analyses at once (one msearch round trip),
+# to be passed to the analysis functions as top_docs
+async def retrieve_analysis_documents(analyses=None, doc_id=None, index=None):
+    analyses = list(analyses or ANALYSIS_QUERIES)
+    results = await search_many([
+        dict(query=ANALYSIS_QUERIES[analysis], doc_id=doc_id, index=index, **_retrieval_options(analysis))
+        for analysis in analyses
+    ], with_metadata=True)
+    return dict(zip(analyses, results))
+
+
+# Ranked chunks -> MMR-deduplicated context that fits the endpoint's token budget
+def _assemble_context(analysis, top_docs):
+    with span("prompt_build"):
+        assembled = assemble_context(top_docs, CONTEXT_TOKEN_BUDGETS[analysis])
+    report = assembled["report"]
+    print(
+        f"🧩 {analysis} context: {report['tokens_used']}/{report['token_budget']} tokens, "
+        f"{report['chunks_used']} chunks used, {report['tokens_dropped']} tokens dropped "
+        f"({report['chunks_dropped_duplicate']} duplicates, {report['chunks_dropped_budget']} over budget)"
+    )
+    return assembled
+
+
+# Company capabilities live in their own index next to each RFP index, one
+# fact per document (see ingestion.ingest_company_document). Prompts get only
+# the facts that match the RFP content they analyse, instead of a fixed profile.
+COMPANY_NAME = os.getenv("COMPANY_NAME", "FirstStaff Workforce Solutions, LLC")
+COMPANY_INDEX_SUFFIX = os.getenv("COMPANY_INDEX_SUFFIX", "company")
+# A fact matches a requirement sentence at this cosine similarity or above
+COMPANY_MATCH_MIN_SIMILARITY = float(os.getenv("COMPANY_MATCH_MIN_SIMILARITY", 0.35))
+COMPANY_FACTS_PER_REQUIREMENT = int(os.getenv("COMPANY_FACTS_PER_REQUIREMENT", 3))
+# Sentences matched per prompt, taken in turn from every chunk; each one is
+# an embedding and a kNN search
+COMPANY_MATCH_MAX_REQUIREMENTS = int(os.getenv("COMPANY_MATCH_MAX_REQUIREMENTS", 12))
+COMPANY_MATCH_MAX_FACTS = int(os.getenv("COMPANY_MATCH_MAX_FACTS", 15))
+# Facts every prompt gets whatever the RFP content: the best keyword match of
+# each of these ";"-separated queries (who the company is, what it holds)
+COMPANY_CORE_FACTS = [
+    query.strip() for query in os.getenv("COMPANY_CORE_FACTS", "company legal name;certifications").split(";")
+    if query.strip()
+]
+
+_SENTENCE_BREAK = re.compile(r"(?<=[.;!?])\s+|\n+")
+# Sentences that state an obligation are matched first
+_REQUIREMENT_CUE = re.compile(
+    r"\b(must|shall|required?|requirements?|mandatory|certif\w*|licen[cs]\w*|insurance|registered|registration)\b",
+    re.IGNORECASE
+)
+
+
+def company_index(index=None):
+    return f"{index or index_name}-{COMPANY_INDEX_SUFFIX}"
+
+
+# Up to `limit` sentences, one per chunk in turn, so every chunk of the
+# prompt's context is matched; within a chunk, requirement-like sentences first
+def _requirement_sentences(chunks, limit=COMPANY_MATCH_MAX_REQUIREMENTS):
+    per_chunk = []
+    seen = set()
+    for chunk in chunks:
+        candidates = []
+        for sentence in _SENTENCE_BREAK.split(chunk["text"]):
+            sentence = " ".join(sentence.split())
+            if len(sentence.split()) >= 4 and sentence not in seen:
+                seen.add(sentence)
+                candidates.append(sentence)
+        candidates.sort(key=lambda sentence: _REQUIREMENT_CUE.search(sentence) is None)
+        per_chunk.append(candidates)
+
+    sentences = []
+    for turn in range(max(map(len, per_chunk), default=0)):
+        for candidates in per_chunk:
+            if turn < len(candidates):
+                sentences.append(candidates[turn])
+                if len(sentences) == limit:
+                    return sentences
+    return sentences
+
+
+# Company facts for the RFP chunks going into a prompt: the core facts, then
+# those most similar to the chunks' sentences, best match first. One kNN
+# search per sentence and one keyword search per core fact, in a single round
+# trip. Sentences are encoded in one batch, bypassing the query embedding
+# caches: they are RFP text, not questions, and would only evict real /rag queries.
+async def match_company_facts(chunks, index=None):
+    name = company_index(index)
+    if name not in _ensured_indices and not await get_retriever().index_exists(name):
+        print(f"⚠️ No company facts: index {name} does not exist")
         return []
 
-def query_eligibility_criteria():
-    query = "Extract eligibility criteria for bidders from this RFP."
-    top_docs = search_similar_documents(query)
+    sentences = _requirement_sentences(chunks)
+    with span("company_match"):
+        vectors = []
+        if sentences:
+            with span("encode"):
+                vectors = await embedder.encode(sentences)
+        results = await search_many([
+            dict(query=query, top_k=1, mode="bm25", index=name) for query in COMPANY_CORE_FACTS
+        ] + [
+            dict(query=sentence, query_vector=vector.tolist(), top_k=COMPANY_FACTS_PER_REQUIREMENT,
+                 min_score=1 + COMPANY_MATCH_MIN_SIMILARITY, index=name)
+            for sentence, vector in zip(sentences, vectors)
+        ], with_metadata=True, log=False)
+
+    core = list(dict.fromkeys(hit["text"] for hits in results[:len(COMPANY_CORE_FACTS)] for hit in hits))
+    best = {}
+    for hits in results[len(COMPANY_CORE_FACTS):]:
+        for hit in hits:
+            if hit["text"] not in core and hit["score"] > best.get(hit["text"], 0.0):
+                best[hit["text"]] = hit["score"]
+    facts = (core + sorted(best, key=best.get, reverse=True))[:COMPANY_MATCH_MAX_FACTS]
+    print(f"🏢 {len(facts) - len(core)} company facts matched {len(sentences)} requirement sentences")
+    return facts
+
+
+def _company_profile(facts):
+    if not facts:
+        return f"Company Profile ({COMPANY_NAME}):\n- No company facts on file match this RFP content"
+    return f"Company Profile ({COMPANY_NAME}), facts relevant to this RFP content:\n" + "\n".join(f"- {fact}" for fact in facts)
+
+GEMINI_MODEL = "gemini-1.5-flash"
+LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", 1.0))
+
+# Bump a version whenever its prompt template changes in a way that should
+# invalidate cached answers
+PROMPT_VERSIONS = {
+    "eligibility": 3,
+    "requirements": 3,
+    "contract_risks": 3,
+    "submission_checklist": 3,
+    "rfp_info": 2
+}
+
+llm_cache = LLMResponseCache(
+    os.getenv("LLM_CACHE_PATH", os.path.join(EMBEDDING_CACHE_DIR, "llm_responses.sqlite3")),
+    ttl_seconds=int(os.getenv("LLM_CACHE_TTL_SECONDS", 7 * 24 * 3600)),
+    max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", 5000))
+)
+
+
+# Ask Gemini for a JSON answer. Parsed output is cached on disk keyed by the
+# template version, the full prompt (company profile + retrieved context),
+# the model and the temperature; use_cache=False skips the lookup but still
+# refreshes the stored answer.
+async def _generate_json(analysis, prompt, use_cache=True):
+    cache_key = LLMResponseCache.make_key(
+        analysis, PROMPT_VERSIONS[analysis], prompt, GEMINI_MODEL, LLM_TEMPERATURE
+    )
+    if use_cache:
+        cached = await asyncio.to_thread(llm_cache.get, cache_key)
+        record_cache("llm_response", cached is not None)
+        if cached is not None:
+            print(f"⚡ LLM cache hit for {analysis}")
+            return cached
+
+    response_text = await get_gateway().generate(prompt, GEMINI_MODEL, LLM_TEMPERATURE)
+    with span("json_parse"):
+        raw_text = response_text.strip()
+
+        # 🧹 Clean markdown wrapper like ```json ... ```
+        cleaned_text = re.sub(r"^```(?:json)?\s*|```$", "", raw_text, flags=re.MULTILINE).strip()
+
+        # ✅ Convert cleaned string to JSON
+        parsed_json = json.loads(cleaned_text)
+
+    if parsed_json is not None:
+        await asyncio.to_thread(llm_cache.set, cache_key, parsed_json)
+    return parsed_json
+
+
+async def query_eligibility_criteria(mode=None, weights=None, use_cache=True, top_docs=None, doc_id=None, index=None):
+    query = ANALYSIS_QUERIES["eligibility"]
+    if top_docs is None:
+        top_docs = await search_similar_documents(query, with_metadata=True, doc_id=doc_id, index=index, **_retrieval_options("eligibility", mode, weights))
 
     if not top_docs:
         return {"error": "No relevant documents found for eligibility analysis."}
 
-    context = "\n\n".join(top_docs)
+    assembled = _assemble_context("eligibility", top_docs)
+    context = assembled["context"]
+    profile = _company_profile(await match_company_facts(assembled["chunks"], index))
 
     prompt = """Extract the eligibility criteria for bidders from the following RFP content. For each criterion, return a structured object with:
 
@@ -121,23 +855,7 @@ def query_eligibility_criteria():
 - "status": "met" or "not_met" based on the following company profile
 - "details": Justification for the status
 
-Company Profile (FirstStaff Workforce Solutions, LLC):
-- Legal entity: Limited Liability Company incorporated in Delaware
-- Operating history: 9 years in business, 7 years in temporary staffing
-- Services: Administrative, IT, Legal & Credentialing Staffing
-- NAICS codes: 561320 (Temporary Help Services), 541611 (Admin Management)
-- DUNS: 07-842-1490, CAGE Code: 8J4T7
-- SAM.gov registration: Active since 03/01/2022
-- State registration: SRN-DE-0923847
-- Texas Employment Agency License #TXEA-34892
-- Insurance: Travelers Insurance (Policy #TX-884529-A) covering Workers' Comp, Liability, and Auto
-- Key personnel:
-  * Ramesh Iyer (Project Manager)
-  * Sarah Collins (Technical Lead)
-  * James Wu (Security Auditor)
-- Not MBE certified or HUB/DBE status
-- Form W 9 Certificate present
-- Certificate of insurance is present
+""" + profile + """
 
     
 Rules:
@@ -154,7 +872,7 @@ These include:
 - Compliance expectations (e.g. background checks, legal verification)
 - DO not consider e-varify
 
-Verify whether ConsultAdd is legally eligible to bid (e.g., state registration, certifications, past performance requirements).
+Verify whether """ + COMPANY_NAME + """ is legally eligible to bid (e.g., state registration, certifications, past performance requirements).
 Identify any deal-breakers early in the process.
 
 IMPORTANT: Only return eligibility conditions if you are 100 percent sure that it is required and there is no indirect alternative.
@@ -168,18 +886,7 @@ RFP Content:
 
 
     try:
-        genai_model = genai.GenerativeModel("gemini-1.5-flash")
-        response = genai_model.generate_content(prompt)
-
-        raw_text = response.text.strip()
-
-        # 🧹 Clean markdown wrapper like ```json ... ```
-        cleaned_text = re.sub(r"^```(?:json)?\s*|```$", "", raw_text, flags=re.MULTILINE).strip()
-
-        # ✅ Convert cleaned string to JSON
-        parsed_json = json.loads(cleaned_text)
-
-        return parsed_json
+        return await _generate_json("eligibility", prompt, use_cache)
 
     except json.JSONDecodeError as json_err:
         print(f"❌ JSON parsing error: {json_err}")
@@ -189,17 +896,20 @@ RFP Content:
         return {"error": "Failed to generate eligibility criteria."}
     
 
-def query_project_requirements():
-    query = "Extract system and project requirements, classify them, and match them against company capabilities."
-    top_docs = search_similar_documents(query)
+async def query_project_requirements(mode=None, weights=None, use_cache=True, top_docs=None, doc_id=None, index=None):
+    query = ANALYSIS_QUERIES["requirements"]
+    if top_docs is None:
+        top_docs = await search_similar_documents(query, with_metadata=True, doc_id=doc_id, index=index, **_retrieval_options("requirements", mode, weights))
 
     if not top_docs:
         return {"error": "No relevant documents found for requirement analysis."}
 
-    context = "\n\n".join(top_docs)
+    assembled = _assemble_context("requirements", top_docs)
+    context = assembled["context"]
+    profile = _company_profile(await match_company_facts(assembled["chunks"], index))
 
     prompt = f"""
-Using the following RFP content, extract structured **mandatory eligibility requirements** that FirstStaff Workforce Solutions, LLC must meet in order to be eligible to submit a compliant proposal.
+Using the following RFP content, extract structured **mandatory eligibility requirements** that {COMPANY_NAME} must meet in order to be eligible to submit a compliant proposal.
 
 🎯 Focus on MUST-HAVE qualifications, certifications, licenses, registrations, and experience explicitly required in the RFP for eligibility. 
 
@@ -216,26 +926,11 @@ For each eligibility requirement found, return an object with the following stru
     - "medium" – Strongly preferred, could impact evaluation
     - "low" – Optional or minor preference
 - status: 
-    - "fulfilled" if FirstStaff meets the requirement based on the profile below
-    - "gap" if FirstStaff does not meet or has no evidence of meeting it
-- recommendation: If status is "gap", provide a clear and actionable recommendation to close the gap or determine if FirstStaff should proceed with the proposal
-
-📘 Company Profile (FirstStaff Workforce Solutions, LLC):
-- Legal entity: Limited Liability Company incorporated in Delaware
-- Principal office: 3105 Maple Avenue, Suite 1200, Dallas, TX 75201
-- Operating history: 9 years in business, 7 years in temporary staffing
-- Services: Administrative, IT, Legal & Credentialing Staffing
-- NAICS codes: 561320 (Temporary Help Services), 541611 (Admin Management)
-- DUNS: 07-842-1490, CAGE Code: 8J4T7
-- SAM.gov registration: Active since 03/01/2022
-- TIN: 47-6392011
-- Texas Employment Agency License #TXEA-34892
-- Insurance: Travelers Insurance (Policy #TX-884529-A) covering Workers' Comp, Liability, and Auto
-- Key personnel:
-  * Ramesh Iyer (Project Manager)
-  * Sarah Collins (Technical Lead)
-  * James Wu (Security Auditor)
-- Not MBE certified or HUB/DBE status
+    - "fulfilled" if the company meets the requirement based on the profile below
+    - "gap" if the company does not meet or has no evidence of meeting it
+- recommendation: If status is "gap", provide a clear and actionable recommendation to close the gap or determine if the company should proceed with the proposal
+
+📘 {profile}
 
 📄 RFP Content:
 {context}
@@ -245,16 +940,7 @@ Return your output strictly as a **JSON array** with no additional commentary or
 
 
     try:
-        genai_model = genai.GenerativeModel("gemini-1.5-flash")
-        response = genai_model.generate_content(prompt)
-        raw_text = response.text.strip()
-
-        # 🧹 Clean markdown wrapper like ```json ... ```
-        cleaned_text = re.sub(r"^```(?:json)?\s*|```$", "", raw_text, flags=re.MULTILINE).strip()
-
-        # ✅ Convert cleaned string to JSON
-        parsed_json = json.loads(cleaned_text)
-        return parsed_json
+        return await _generate_json("requirements", prompt, use_cache)
 
     except json.JSONDecodeError as json_err:
         print(f"❌ JSON parsing error: {json_err}")
@@ -264,14 +950,17 @@ Return your output strictly as a **JSON array** with no additional commentary or
         return {"error": "Failed to generate project requirements."}
 
     
-def analyze_contract_risks():
-    query = "Identify contractual risks in the RFP and suggest mitigation strategies."
-    top_docs = search_similar_documents(query)
+async def analyze_contract_risks(mode=None, weights=None, use_cache=True, top_docs=None, doc_id=None, index=None):
+    query = ANALYSIS_QUERIES["contract_risks"]
+    if top_docs is None:
+        top_docs = await search_similar_documents(query, with_metadata=True, doc_id=doc_id, index=index, **_retrieval_options("contract_risks", mode, weights))
 
     if not top_docs:
         return {"error": "No relevant RFP content found."}
 
-    context = "\n\n".join(top_docs)
+    assembled = _assemble_context("contract_risks", top_docs)
+    context = assembled["context"]
+    profile = _company_profile(await match_company_facts(assembled["chunks"], index))
 
     prompt = f"""
 From the following RFP content, extract contract risk clauses in structured JSON format. For each risk, return:
@@ -281,24 +970,12 @@ From the following RFP content, extract contract risk clauses in structured JSON
 - "risk": Description of the risk
 - "severity": "high", "medium", or "low"
 - "recommendation": Recommended mitigation or negotiation strategy
-- "impact": How this might specifically affect FirstStaff Workforce Solutions based on their profile
-
-Company Profile (FirstStaff Workforce Solutions, LLC):
-- Legal entity: Limited Liability Company incorporated in Delaware
-- Operating history: 9 years in business, 7 years in temporary staffing
-- Services: Administrative, IT, Legal & Credentialing Staffing
-- Annual revenue: Not specified
-- Key personnel:
-  * Ramesh Iyer (Project Manager)
-  * Sarah Collins (Technical Lead)
-  * James Wu (Security Auditor)
-- Licensed in Texas (Employment Agency License #TXEA-34892)
-- Insurance: Travelers Insurance (Policy #TX-884529-A) covering Workers' Comp, Liability, and Auto
-- No bank letter of creditworthiness available
-- No specified line of credit or financial reserves mentioned
+- "impact": How this might specifically affect {COMPANY_NAME} based on their profile
+
+{profile}
 
 Rules for Analyzing Contract Risks:
-- Identify biased clauses that could put ConsultAdd at a disadvantage (e.g., unilateral termination rights).
+- Identify biased clauses that could put {COMPANY_NAME} at a disadvantage (e.g., unilateral termination rights).
 - Suggest modifications to balance contract terms (e.g., adding a notice period for termination).
 
 RFP Content:
@@ -309,14 +986,7 @@ Return only a JSON array of these objects.
 
 
     try:
-        genai_model = genai.GenerativeModel("gemini-1.5-flash")
-        response = genai_model.generate_content(prompt)
-
-        raw_text = response.text.strip()
-        cleaned = re.sub(r"^```(?:json)?|```$", "", raw_text, flags=re.MULTILINE).strip()
-        parsed = json.loads(cleaned)
-
-        return parsed
+        return await _generate_json("contract_risks", prompt, use_cache)
 
     except json.JSONDecodeError as e:
         print("❌ JSON error:", e)
@@ -326,17 +996,20 @@ Return only a JSON array of these objects.
         return {"error": "Gemini generation failed."}
 
 
-def generate_submission_checklist():
-    query = "Extract the proposal submission checklist from the RFP."
-    top_docs = search_similar_documents(query)
+async def generate_submission_checklist(mode=None, weights=None, use_cache=True, top_docs=None, doc_id=None, index=None):
+    query = ANALYSIS_QUERIES["submission_checklist"]
+    if top_docs is None:
+        top_docs = await search_similar_documents(query, with_metadata=True, doc_id=doc_id, index=index, **_retrieval_options("submission_checklist", mode, weights))
 
     if not top_docs:
         return []
 
-    context = "\n\n".join(top_docs)
+    assembled = _assemble_context("submission_checklist", top_docs)
+    context = assembled["context"]
+    profile = _company_profile(await match_company_facts(assembled["chunks"], index))
 
     prompt = f"""
-From the following RFP content, extract a structured checklist of **verifiable proposal submission requirements** that FirstStaff Workforce Solutions, LLC must submit as part of the proposal.
+From the following RFP content, extract a structured checklist of **verifiable proposal submission requirements** that {COMPANY_NAME} must submit as part of the proposal.
 
 Only include submission elements that can be physically or digitally provided as **proof**, such as:
 - Required forms, certifications, licenses, or affidavits
@@ -352,7 +1025,7 @@ Only include submission elements that can be physically or digitally provided as
 📌 If multiple required forms are found together on the same page, you may group them together or assign the same page number.
 
 ✅ For the `completed` field:
-- Set it to `true` if the item can be fulfilled using information or documents already provided in FirstStaff's profile.
+- Set it to `true` if the item can be fulfilled using information or documents already provided in the company profile below.
 - Otherwise, set it to `false`.
 
 Return the result as a **JSON array**, where each object represents a **category** of requirements. For each category, return:
@@ -362,12 +1035,14 @@ Return the result as a **JSON array**, where each object represents a **category
 - items: A list of checklist items, where each item has:
   - id: unique string (e.g., "3-2")
   - description: Description of what is required, including form name and page number if mentioned
-  - completed: true/false depending on whether FirstStaff can already fulfill this
-  - relevance: One of the following based on FirstStaff’s profile:
+  - completed: true/false depending on whether the company can already fulfill this
+  - relevance: One of the following based on the company profile:
       - "standard" (typical requirement)
       - "needs_attention" (may require customization or extra effort)
       - "critical" (potential blocker or key differentiator)
-  - notes: Optional guidance for FirstStaff on how to approach or satisfy the requirement, especially if action is needed
+  - notes: Optional guidance for the company on how to approach or satisfy the requirement, especially if action is needed
+
+{profile}
 
 RFP Content:
 {context}
@@ -379,12 +1054,7 @@ Return the result **strictly as a JSON array** with no extra commentary, markdow
 
 
     try:
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        response = model.generate_content(prompt)
-        text = response.text.strip()
-        cleaned = re.sub(r"^```(?:json)?|```$", "", text, flags=re.MULTILINE).strip()
-        checklist = json.loads(cleaned)
-        return checklist
+        return await _generate_json("submission_checklist", prompt, use_cache)
 
     except json.JSONDecodeError as e:
         print("❌ JSON parsing failed:", e)
@@ -394,32 +1064,10 @@ Return the result **strictly as a JSON array** with no extra commentary, markdow
         return []
 
 
-def generate_rag_response(query):
-    top_docs = search_similar_documents(query)
-
-    if not top_docs:
-        return "Sorry, I couldn't find relevant documents."
+def _build_rag_prompt(query, context, facts):
+    return f"""Use the context below to answer the question regarding {COMPANY_NAME}'s eligibility and capabilities for this RFP:
 
-    context = "\n\n".join(top_docs)
-    prompt = f"""Use the context below to answer the question regarding FirstStaff Workforce Solutions, LLC's eligibility and capabilities for this RFP:
-
-Company Profile (FirstStaff Workforce Solutions, LLC):
-- Legal entity: Limited Liability Company incorporated in Delaware
-- Principal office: 3105 Maple Avenue, Suite 1200, Dallas, TX 75201
-- Operating history: 9 years in business, 7 years in temporary staffing
-- Services: Administrative, IT, Legal & Credentialing Staffing
-- NAICS codes: 561320 (Temporary Help Services), 541611 (Admin Management)
-- DUNS: 07-842-1490, CAGE Code: 8J4T7
-- SAM.gov registration: Active since 03/01/2022 
-- State registration: SRN-DE-0923847
-- Texas Employment Agency License #TXEA-34892
-- Insurance: Travelers Insurance (Policy #TX-884529-A) covering Workers' Comp, Liability, and Auto
-- Key personnel:
-  * Ramesh Iyer (Project Manager)
-  * Sarah Collins (Technical Lead)
-  * James Wu (Security Auditor)
-- Authorized representative: Meredith Chan, Director of Contracts
-- Not MBE certified or HUB/DBE status 
+{_company_profile(facts)}
 
 Context:
 {context}
@@ -427,37 +1075,84 @@ Context:
 Question: {query}
 Answer:"""
 
+
+async def generate_rag_response(query, mode=None, weights=None, doc_id=None, index=None):
+    top_docs = await search_similar_documents(
+        query, with_metadata=True, doc_id=doc_id, index=index, **_retrieval_options("rag", mode, weights)
+    )
+
+    if not top_docs:
+        return "Sorry, I couldn't find relevant documents."
+
+    assembled = _assemble_context("rag", top_docs)
+    # The question itself is matched too: it often names the capability asked about
+    facts = await match_company_facts([{"text": query}, *assembled["chunks"]], index)
+    prompt = _build_rag_prompt(query, assembled["context"], facts)
+
     try:
-        genai_model = genai.GenerativeModel("gemini-1.5-flash")
-        response = genai_model.generate_content(prompt)
-        return response.text
+        return await get_gateway().generate(prompt, GEMINI_MODEL, LLM_TEMPERATURE)
     except Exception as e:
         print(f"❌ Error calling Gemini: {e}")
         return "An error occurred while generating the response."
+
+
+# Streaming variant of generate_rag_response. Yields (event, data) pairs:
+# "metadata" first (the chunks used as context), then one "token" per streamed
+# piece of text, and finally "done" with the time to first token, or "error".
+async def stream_rag_response(query, mode=None, weights=None, doc_id=None, index=None):
+    started = time.perf_counter()
+    chunks = await search_similar_documents(
+        query, with_metadata=True, doc_id=doc_id, index=index, **_retrieval_options("rag", mode, weights)
+    )
+    assembled = _assemble_context("rag", chunks)
+
+    yield "metadata", {
+        "query": query,
+        "chunks": [{key: value for key, value in chunk.items() if key != "text"} for chunk in assembled["chunks"]],
+        "context": assembled["report"]
+    }
+
+    if not chunks:
+        yield "token", {"text": "Sorry, I couldn't find relevant documents."}
+        yield "done", {"time_to_first_token": None}
+        return
+
+    facts = await match_company_facts([{"text": query}, *assembled["chunks"]], index)
+    prompt = _build_rag_prompt(query, assembled["context"], facts)
+    time_to_first_token = None
+    try:
+        async for text in get_gateway().stream(prompt, GEMINI_MODEL, LLM_TEMPERATURE):
+            if time_to_first_token is None:
+                time_to_first_token = time.perf_counter() - started
+                RAG_TIME_TO_FIRST_TOKEN.observe(time_to_first_token)
+            yield "token", {"text": text}
+    except Exception as e:
+        print(f"❌ Error streaming from Gemini: {e}")
+        yield "error", {"message": "An error occurred while generating the response."}
+        return
+
+    yield "done", {"time_to_first_token": time_to_first_token}
     
 
 
-def query_rfp_metadata():
-    query = "Extract title, agency, issue date, due date, contract value, duration, and status from this RFP."
-    top_docs = search_similar_documents(query)
+# `fields` narrows the request to the fields rule-based extraction could not
+# resolve (see utils/rfp_fields.py); by default all of them are asked for
+async def query_rfp_metadata(mode=None, weights=None, use_cache=True, top_docs=None, doc_id=None, index=None,
+                             fields=RFP_INFO_FIELDS):
+    query = ANALYSIS_QUERIES["rfp_info"]
+    if top_docs is None:
+        top_docs = await search_similar_documents(query, with_metadata=True, doc_id=doc_id, index=index, **_retrieval_options("rfp_info", mode, weights))
 
     if not top_docs:
         return {"error": "No relevant documents found for metadata extraction."}
 
-    context = "\n\n".join(top_docs)
+    context = _assemble_context("rfp_info", top_docs)["context"]
 
+    template = json.dumps({name: "" for name in fields}, indent=2)
     prompt = """
 Extract the following metadata from the given RFP content and return only a clean JSON object with these fields:
 
-{
-  "title": "",
-  "agency": "",
-  "issueDate": "",
-  "dueDate": "",
-  "contractValue": "",
-  "duration": "",
-  "status": ""
-}
+""" + template + """
 
 Only include these fields. Do not add markdown (e.g., ```json) or any explanation. Ensure the JSON is directly parsable.
 
@@ -465,17 +1160,7 @@ RFP Content:
 """ + context
 
     try:
-        genai_model = genai.GenerativeModel("gemini-1.5-flash")
-        response = genai_model.generate_content(prompt)
-        raw_text = response.text.strip()
-
-        # 🧹 Clean potential code blocks or markdown
-        cleaned_text = re.sub(r"^```(?:json)?\s*|```$", "", raw_text, flags=re.MULTILINE).strip()
-
-        # ✅ Parse JSON safely
-        parsed_json = json.loads(cleaned_text)
-
-        return parsed_json
+        return await _generate_json("rfp_info", prompt, use_cache)
 
     except json.JSONDecodeError as json_err:
         print(f"❌ JSON parsing error: {json_err}")
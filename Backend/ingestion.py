@@ -0,0 +1,267 @@
+import asyncio
+import hashlib
+import json
+import os
+from analysis_store import PRECOMPUTE_ANALYSES, analysis_store, precompute_analyses
+from elastic.elastic_helper import (
+    company_index, count_documents, delete_document_chunks, delete_stale_chunks, encode_chunks, ensure_index,
+    index_chunks, index_for_tenant, load_chunk_embeddings
+)
+from metrics import record_cache, span
+from utils.chunking import split_pages_into_chunks
+from s3_utils import file_exists_in_s3, upload_file_to_s3
+from utils.executors import extraction_executor
+from utils.rfp_fields import extract_rfp_fields
+from utils.text_extraction import count_pdf_pages, extract_page_range, extract_text_from_docx
+
+# Pages handed to one worker process at a time, and the per-page extraction limit
+PAGES_PER_TASK = int(os.getenv("PAGES_PER_TASK", 8))
+PAGE_TIMEOUT_SECONDS = float(os.getenv("PAGE_TIMEOUT_SECONDS", 20))
+
+# Profile every new company index starts from, one fact per line
+# (next to this module, so it is found whatever the working directory)
+COMPANY_PROFILE_PATH = os.getenv(
+    "COMPANY_PROFILE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "company_data", "profile.txt")
+)
+COMPANY_FACT_MAX_CHARS = int(os.getenv("COMPANY_FACT_MAX_CHARS", 400))
+# PDF extraction can split a line into word-sized fragments; lines shorter
+# than this are joined to the previous one
+COMPANY_FACT_MIN_CHARS = 12
+
+
+def write_file(path, content):
+    mode = "wb" if isinstance(content, bytes) else "w"
+    encoding = None if isinstance(content, bytes) else "utf-8"
+    with open(path, mode, encoding=encoding) as f:
+        f.write(content)
+
+
+async def run_in_extraction_executor(func, *args):
+    # PDF parsing and chunking are pure Python and hold the GIL, so they run in processes
+    return await asyncio.get_running_loop().run_in_executor(extraction_executor, func, *args)
+
+
+def _pages_sidecar_path(text_path):
+    return os.path.splitext(text_path)[0] + ".pages.json"
+
+
+# Extract a PDF with page ranges spread over the extraction process pool.
+# When text_path is given, pages are streamed to it in page order as soon as
+# every earlier page is done, and a .pages.json sidecar records page offsets
+# (same layout as the chunk offsets: pages joined with "\n").
+async def extract_pdf_pages(file_location, text_path=None, pages_per_task=PAGES_PER_TASK,
+                            page_timeout=PAGE_TIMEOUT_SECONDS):
+    with span("extract"):
+        page_count = await run_in_extraction_executor(count_pdf_pages, file_location)
+        ranges = [
+            (start, min(start + pages_per_task, page_count))
+            for start in range(0, page_count, pages_per_task)
+        ]
+
+        pages = [None] * page_count
+        offsets = []
+        failed_pages = {}
+        next_page = 0
+        position = 0
+        text_file = open(text_path, "w", encoding="utf-8") if text_path else None
+
+        try:
+            pending = [
+                run_in_extraction_executor(extract_page_range, file_location, start, stop, page_timeout)
+                for start, stop in ranges
+            ]
+            for completed in asyncio.as_completed(pending):
+                for index, text, status in await completed:
+                    pages[index] = text
+                    if status != "ok":
+                        failed_pages[index + 1] = status
+
+                # Flush the contiguous run of finished pages
+                ready = []
+                while next_page < page_count and pages[next_page] is not None:
+                    separator = "\n" if next_page else ""
+                    offsets.append(position + len(separator))
+                    ready.append(separator + pages[next_page])
+                    position += len(ready[-1])
+                    next_page += 1
+                if ready and text_file:
+                    with span("text_write"):
+                        await asyncio.to_thread(text_file.write, "".join(ready))
+        finally:
+            if text_file:
+                text_file.close()
+
+        if failed_pages:
+            print(f"⚠️ {len(failed_pages)} pages of {os.path.basename(file_location)} could not be extracted: {failed_pages}")
+
+        result = {"pages": pages, "offsets": offsets, "failed_pages": failed_pages}
+        if text_path:
+            sidecar = {"page_count": page_count, "offsets": offsets, "failed_pages": failed_pages}
+            with span("text_write"):
+                await asyncio.to_thread(write_file, _pages_sidecar_path(text_path), json.dumps(sidecar))
+        return result
+
+
+def store_in_s3(file_location, filename, doc_id):
+    if file_exists_in_s3(doc_id):
+        return None
+    return upload_file_to_s3(file_location, filename, doc_id)
+
+
+# Encode only chunks whose text has no stored embedding yet
+async def _embed_changed_chunks(chunks, known_embeddings):
+    changed = [chunk for chunk in chunks if chunk["chunk_hash"] not in known_embeddings]
+    record_cache("chunk_embedding", True, len(chunks) - len(changed))
+    record_cache("chunk_embedding", False, len(changed))
+    if changed:
+        for chunk, embedding in zip(changed, await encode_chunks(changed)):
+            known_embeddings[chunk["chunk_hash"]] = embedding.tolist()
+    return [known_embeddings[chunk["chunk_hash"]] for chunk in chunks], len(changed)
+
+
+# Drop an RFP that a new version replaces: its chunks, stored analyses and fields
+async def remove_document(doc_id, index_name):
+    deleted = await delete_document_chunks(doc_id, index_name)
+    await asyncio.to_thread(analysis_store.delete, doc_id, index_name)
+    return deleted
+
+
+# Job handler for uploaded RFPs:
+# extract (streamed to texts/) -> chunk -> extract RFP fields with rules -> reuse
+# stored embeddings -> embed changed chunks -> index under the content hash
+# -> record as the latest RFP -> drop the version it replaces, if the upload
+# named one -> store in S3 (optional) -> precompute the analyses
+async def ingest_rfp(payload, progress):
+    filename = payload["filename"]
+    index_name = payload["index_name"]
+    doc_id = payload["doc_id"]
+
+    extracted = await progress.run(
+        "extract",
+        extract_pdf_pages(payload["file_location"], payload["text_path"]),
+        count=lambda result: len(result["pages"])
+    )
+    pages = extracted["pages"]
+    chunks = await progress.run("chunk", run_in_extraction_executor(split_pages_into_chunks, pages), count=len)
+    if not chunks:
+        raise ValueError(f"No text could be extracted from {filename}")
+
+    extracted_fields = await progress.run(
+        "fields",
+        run_in_extraction_executor(extract_rfp_fields, pages),
+        count=lambda result: len(result["fields"])
+    )
+    await asyncio.to_thread(analysis_store.set_fields, doc_id, extracted_fields)
+
+    known_embeddings = await progress.run("reuse", load_chunk_embeddings(filename, index_name), count=len)
+    embeddings, encoded = await progress.run(
+        "embed",
+        _embed_changed_chunks(chunks, known_embeddings),
+        count=lambda result: result[1]
+    )
+    indexed = await progress.run(
+        "index",
+        index_chunks(index_name, filename, chunks, embeddings, doc_id=doc_id),
+        count=lambda result: result["indexed"]
+    )
+    # Searchable now, so it is the latest RFP of its index whether or not analyses are precomputed
+    await asyncio.to_thread(analysis_store.record_document, doc_id, filename, index_name)
+    replaces = payload.get("replaces")
+    if replaces and replaces != doc_id:
+        if indexed["errors"]:
+            # Keep the old version searchable rather than leave only a partial new one
+            print(f"⚠️ Kept {replaces}: {len(indexed['errors'])} chunks of {filename} failed to index")
+            replaces = None
+        else:
+            await progress.run("cleanup", remove_document(replaces, index_name), count=lambda deleted: deleted)
+    if payload.get("store_s3"):
+        # boto3 sends the multipart upload's parts from its own thread pool
+        await progress.run("store", asyncio.to_thread(store_in_s3, payload["file_location"], filename, doc_id))
+    analyses = {}
+    if PRECOMPUTE_ANALYSES:
+        analyses = await progress.run("analyze", precompute_analyses(doc_id, index_name), count=len)
+
+    return {
+        "doc_id": doc_id,
+        "filename": filename,
+        "pages": len(pages),
+        "chunks": len(chunks),
+        "encoded": encoded,
+        "indexed": indexed["indexed"],
+        "replaced": replaces,
+        "text_file": os.path.basename(payload["text_path"]),
+        "failed_pages": extracted["failed_pages"],
+        "analysis_errors": [name for name, result in analyses.items() if isinstance(result, dict) and "error" in result]
+    }
+
+
+# Company documents are stored as facts: one per line (profile sheets, Word
+# paragraphs and table rows), long lines split like RFP chunks. The "page" of
+# a fact is its line number.
+def split_company_facts(text):
+    lines = []
+    for line in text.splitlines():
+        line = " ".join(line.split())
+        if not line:
+            continue
+        if lines and len(lines[-1]) < COMPANY_FACT_MIN_CHARS:
+            lines[-1] += " " + line
+        else:
+            lines.append(line)
+    return split_pages_into_chunks(lines, chunk_size=COMPANY_FACT_MAX_CHARS, overlap=COMPANY_FACT_MAX_CHARS // 5)
+
+
+def read_text_file(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+async def extract_company_text(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".pdf":
+        return "\n".join((await extract_pdf_pages(path))["pages"])
+    if extension in (".doc", ".docx"):
+        return await run_in_extraction_executor(extract_text_from_docx, path)
+    return await asyncio.to_thread(read_text_file, path)
+
+
+# Extract, split, embed and index one company document into the company index
+# of `index`. A new version of a file replaces its facts, and stored analyses
+# of that index are dropped since their prompts were built from the old facts.
+async def ingest_company_document(path, filename, index=None):
+    # Analyses are stored under the resolved index name; None would clear every index's
+    index = index or index_for_tenant()
+    text = await extract_company_text(path)
+    facts = split_company_facts(text)
+    if not facts:
+        raise ValueError(f"No text could be extracted from {filename}")
+
+    name = company_index(index)
+    doc_id = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    await ensure_index(name)
+    indexed = await index_chunks(name, filename, facts, await encode_chunks(facts), doc_id=doc_id)
+    if not indexed["errors"]:
+        await delete_stale_chunks(filename, doc_id, name)
+    await asyncio.to_thread(analysis_store.clear_analyses, index)
+    return {"doc_id": doc_id, "text": text, "facts": len(facts), "indexed": indexed["indexed"]}
+
+
+_company_indices_ready = set()
+
+
+# Create the company index of `index` and seed it from COMPANY_PROFILE_PATH
+# when it holds no facts yet
+async def ensure_company_profile(index=None):
+    name = company_index(index)
+    if name in _company_indices_ready:
+        return
+    await ensure_index(name)
+    if await count_documents(name) == 0 and os.path.exists(COMPANY_PROFILE_PATH):
+        result = await ingest_company_document(COMPANY_PROFILE_PATH, os.path.basename(COMPANY_PROFILE_PATH), index)
+        print(f"🏢 Seeded {name} with {result['facts']} company facts")
+    _company_indices_ready.add(name)
+
+
+INGESTION_HANDLERS = {
+    "ingest_rfp": ingest_rfp
+}
@@ -0,0 +1,284 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", os.path.join("cache", "jobs.sqlite3"))
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", 2))
+# Workers also poll, so jobs enqueued by another uvicorn process get picked up
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 2.0))
+# A job that keeps killing its worker is failed after this many attempts
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+# Workers touch their running jobs this often; a job untouched for the timeout
+# belongs to a worker that is gone or hung, and is requeued
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", 10.0))
+JOB_HEARTBEAT_TIMEOUT = float(os.getenv("JOB_HEARTBEAT_TIMEOUT", 60.0))
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _process_token(pid):
+    """Boot id and start time of a process: unlike the pid, not reused after a
+    restart. None where /proc is not available (the heartbeat still applies)."""
+    try:
+        with open("/proc/sys/kernel/random/boot_id") as f:
+            boot_id = f.read().strip()
+        with open(f"/proc/{pid}/stat") as f:
+            # Field 22 is the start time; the command name before it may contain spaces
+            start_time = f.read().rsplit(")", 1)[1].split()[19]
+    except (OSError, IndexError):
+        return None
+    return f"{boot_id}:{pid}:{start_time}"
+
+
+class JobStore:
+    """Local, SQLite-backed job queue. Jobs survive restarts: anything left
+    "running" by a process that no longer exists, or whose heartbeat stopped,
+    is put back in the queue by requeue_interrupted()."""
+
+    def __init__(self, path=JOB_DB_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY,"
+                " kind TEXT NOT NULL,"
+                " payload TEXT NOT NULL,"
+                " status TEXT NOT NULL,"
+                " stages TEXT NOT NULL,"
+                " result TEXT,"
+                " error TEXT,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " worker_pid INTEGER,"
+                " worker_token TEXT,"
+                " heartbeat_at REAL,"
+                " created_at REAL NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+            # Queues created before workers recorded a start token and heartbeat
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, kind in (("worker_token", "TEXT"), ("heartbeat_at", "REAL")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _to_dict(row):
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["stages"] = json.loads(job["stages"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def create(self, kind, payload):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, payload, status, stages, created_at, updated_at)"
+                " VALUES (?, ?, ?, 'queued', '[]', ?, ?)",
+                (job_id, kind, json.dumps(payload), now, now)
+            )
+        return job_id
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row)
+
+    def find_active(self, kind, key, value):
+        """Return a queued or running job of `kind` whose payload[key] == value."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE kind = ? AND status IN ('queued', 'running')"
+                " AND json_extract(payload, '$.' || ?) = ? ORDER BY created_at LIMIT 1",
+                (kind, key, value)
+            ).fetchone()
+        return self._to_dict(row)
+
+    def claim_next(self):
+        """Atomically move the oldest queued job to running and return it."""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, worker_pid = ?, worker_token = ?,"
+                " heartbeat_at = ?, updated_at = ?"
+                " WHERE id = (SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1)"
+                " RETURNING *",
+                (os.getpid(), _process_token(os.getpid()), now, now)
+            ).fetchone()
+        return self._to_dict(row)
+
+    def heartbeat(self):
+        """Mark the jobs this process is running as still alive."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE status = 'running' AND worker_pid = ?",
+                (time.time(), os.getpid())
+            )
+
+    def update_stages(self, job_id, stages):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET stages = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(stages), time.time(), job_id)
+            )
+
+    def finish(self, job_id, result=None, error=None):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE id = ?",
+                ("failed" if error else "done", json.dumps(result), error, time.time(), job_id)
+            )
+
+    @staticmethod
+    def _worker_alive(row, now, heartbeat_timeout):
+        # A pid may belong to another process after a restart: its start token tells them apart
+        if row["worker_pid"] == os.getpid() or not _process_alive(row["worker_pid"]):
+            return False
+        if row["worker_token"] and row["worker_token"] != _process_token(row["worker_pid"]):
+            return False
+        return now - (row["heartbeat_at"] or row["updated_at"]) < heartbeat_timeout
+
+    def requeue_interrupted(self, max_attempts=JOB_MAX_ATTEMPTS, heartbeat_timeout=JOB_HEARTBEAT_TIMEOUT):
+        """Requeue running jobs whose worker process died or stopped sending
+        heartbeats (other live workers keep theirs)."""
+        now = time.time()
+        requeued = 0
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, attempts, worker_pid, worker_token, heartbeat_at, updated_at FROM jobs WHERE status = 'running'"
+            ).fetchall()
+            for row in rows:
+                if self._worker_alive(row, now, heartbeat_timeout):
+                    continue
+                if row["attempts"] >= max_attempts:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'failed', error = ?, updated_at = ? WHERE id = ?",
+                        (f"Worker died {row['attempts']} times while running this job", now, row["id"])
+                    )
+                else:
+                    conn.execute("UPDATE jobs SET status = 'queued', updated_at = ? WHERE id = ?", (now, row["id"]))
+                    requeued += 1
+        if requeued:
+            print(f"🔁 Requeued {requeued} interrupted jobs")
+        return requeued
+
+
+class JobProgress:
+    """Records per-stage status and timings of a running job."""
+
+    def __init__(self, store, job_id):
+        self.store = store
+        self.job_id = job_id
+        self.stages = []
+
+    async def run(self, name, awaitable, count=None):
+        """Await one stage; `count(result)` optionally records how many items it produced."""
+        stage = {"name": name, "status": "running", "seconds": None}
+        self.stages.append(stage)
+        await asyncio.to_thread(self.store.update_stages, self.job_id, self.stages)
+
+        started = time.perf_counter()
+        try:
+            result = await awaitable
+            stage["status"] = "done"
+            if count is not None:
+                stage["items"] = count(result)
+            return result
+        except Exception:
+            stage["status"] = "failed"
+            raise
+        finally:
+            stage["seconds"] = round(time.perf_counter() - started, 3)
+            await asyncio.to_thread(self.store.update_stages, self.job_id, self.stages)
+
+
+class JobWorkerPool:
+    """Runs queued jobs on the event loop with a fixed number of worker tasks.
+
+    handlers maps a job kind to `async def handler(payload, progress) -> result`;
+    handlers push CPU-bound work to the process/thread executors themselves.
+    """
+
+    def __init__(self, store, handlers, workers=INGESTION_WORKERS, poll_interval=JOB_POLL_INTERVAL,
+                 heartbeat_interval=JOB_HEARTBEAT_INTERVAL):
+        self.store = store
+        self.handlers = handlers
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self._wakeup = asyncio.Event()
+        self._tasks = []
+
+    async def submit(self, kind, payload):
+        job_id = await asyncio.to_thread(self.store.create, kind, payload)
+        self._wakeup.set()
+        return job_id
+
+    def start(self):
+        self.store.requeue_interrupted()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._heartbeat()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await asyncio.to_thread(self.store.heartbeat)
+            except sqlite3.Error as e:
+                print(f"⚠️ Job heartbeat failed: {e}")
+
+    async def _work(self):
+        while True:
+            job = await asyncio.to_thread(self.store.claim_next)
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            progress = JobProgress(self.store, job["id"])
+            try:
+                result = await self.handlers[job["kind"]](job["payload"], progress)
+                await asyncio.to_thread(self.store.finish, job["id"], result)
+                print(f"✅ Job {job['id']} ({job['kind']}) finished")
+            except asyncio.CancelledError:
+                # Shutting down: leave the job "running" so the next start requeues it
+                raise
+            except Exception as e:
+                print(f"❌ Job {job['id']} ({job['kind']}) failed: {e}")
+                await asyncio.to_thread(self.store.finish, job["id"], None, str(e))
@@ -1,22 +1,18 @@
-import os
-import openai
+from llm_gateway import get_gateway
 
-# Load API key from environment variable or set it here directly
-openai.api_key = os.getenv("OPENAI_API_KEY")  # Or replace with your key directly
+OPENAI_MODEL = "gpt-3.5-turbo"  # or gpt-4 if you have access
 
-# Async function to call LLM with a given prompt
+# Async function to call LLM with a given prompt (concurrency, rate limits and
+# retries are handled by the shared gateway)
 async def async_llm_call(prompt: str) -> str:
     try:
-        response = await openai.ChatCompletion.acreate(
-            model="gpt-3.5-turbo",  # or gpt-4 if you have access
-            messages=[
-                {"role": "system", "content": "You are an expert government compliance analyst."},
-                {"role": "user", "content": prompt}
-            ],
+        return await get_gateway("openai").generate(
+            prompt,
+            OPENAI_MODEL,
             temperature=0.2,
+            system="You are an expert government compliance analyst.",
             max_tokens=1000
         )
-        return response['choices'][0]['message']['content']
     except Exception as e:
         # Fallback in case of error or for development/testing
         return str({
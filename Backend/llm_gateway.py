@@ -0,0 +1,394 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+from collections import deque
+from metrics import LLM_TOKENS, span
+from utils.context_assembly import estimate_tokens
+
+# Provider every call goes to: "gemini", "openai" or "fake" (local, no network;
+# overrides the provider asked for by call sites, for benchmarks and tests)
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini")
+# Requests in flight to the provider at once; further calls wait in a queue
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 4))
+# Token bucket: sustained request rate and burst size
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", 60))
+LLM_BURST = int(os.getenv("LLM_BURST", 5))
+# Retries of rate-limited / transient failures, with exponential backoff and full jitter
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 4))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", 1.0))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", 30.0))
+# Latency of the fake provider
+FAKE_LLM_LATENCY_SECONDS = float(os.getenv("FAKE_LLM_LATENCY_SECONDS", 0.2))
+# Latency samples kept per model for percentiles
+LATENCY_WINDOW = 500
+
+
+class RetryableLLMError(Exception):
+    """Rate limit (429) or transient provider failure; retry_after in seconds if the provider said."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class GeminiProvider:
+    name = "gemini"
+
+    def __init__(self):
+        self._genai = None
+
+    def _model(self, model):
+        if self._genai is None:
+            # Imported on first use: the SDK is slow to import
+            import google.generativeai as genai
+            genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+            self._genai = genai
+        return self._genai.GenerativeModel(model)
+
+    @staticmethod
+    def _translate(e):
+        from google.api_core import exceptions
+        transient = (
+            exceptions.ResourceExhausted, exceptions.TooManyRequests, exceptions.ServiceUnavailable,
+            exceptions.InternalServerError, exceptions.DeadlineExceeded
+        )
+        if isinstance(e, transient):
+            return RetryableLLMError(str(e))
+        return e
+
+    async def generate(self, model, prompt, temperature, system=None, max_tokens=None):
+        config = {"temperature": temperature}
+        if max_tokens:
+            config["max_output_tokens"] = max_tokens
+        if system:
+            prompt = f"{system}\n\n{prompt}"
+        try:
+            response = await self._model(model).generate_content_async(prompt, generation_config=config)
+        except Exception as e:
+            raise self._translate(e) from e
+        return response.text
+
+    async def stream(self, model, prompt, temperature):
+        try:
+            response = await self._model(model).generate_content_async(
+                prompt, generation_config={"temperature": temperature}, stream=True
+            )
+        except Exception as e:
+            raise self._translate(e) from e
+        async for part in response:
+            try:
+                text = part.text
+            except ValueError:
+                # Chunks carrying only finish/safety information have no text
+                continue
+            if text:
+                yield text
+
+
+class OpenAIProvider:
+    name = "openai"
+
+    def __init__(self):
+        self._openai = None
+
+    def _client(self):
+        if self._openai is None:
+            import openai
+            openai.api_key = os.getenv("OPENAI_API_KEY")
+            self._openai = openai
+        return self._openai
+
+    def _translate(self, e):
+        error = getattr(self._openai, "error", None)
+        transient = tuple(
+            getattr(error, name) for name in ("RateLimitError", "ServiceUnavailableError", "APIError", "Timeout")
+            if hasattr(error, name)
+        )
+        if transient and isinstance(e, transient):
+            return RetryableLLMError(str(e))
+        return e
+
+    async def generate(self, model, prompt, temperature, system=None, max_tokens=None):
+        messages = [{"role": "user", "content": prompt}]
+        if system:
+            messages.insert(0, {"role": "system", "content": system})
+        try:
+            response = await self._client().ChatCompletion.acreate(
+                model=model, messages=messages, temperature=temperature, max_tokens=max_tokens
+            )
+        except Exception as e:
+            raise self._translate(e) from e
+        return response["choices"][0]["message"]["content"]
+
+    async def stream(self, model, prompt, temperature):
+        yield await self.generate(model, prompt, temperature)
+
+
+class FakeProvider:
+    """Local stand-in: answers after a fixed latency with deterministic text.
+
+    responder(prompt) -> str overrides the answer; rate_limit_every=n makes
+    every n-th call fail with a rate-limit error to exercise retries.
+    """
+    name = "fake"
+
+    def __init__(self, latency=FAKE_LLM_LATENCY_SECONDS, responder=None, rate_limit_every=0):
+        self.latency = latency
+        self.responder = responder
+        self.rate_limit_every = rate_limit_every
+        self.calls = 0
+
+    def _answer(self, prompt):
+        if self.responder is not None:
+            return self.responder(prompt)
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+        return "```json\n" + json.dumps({"fake": True, "prompt_sha256": digest, "prompt_chars": len(prompt)}) + "\n```"
+
+    async def generate(self, model, prompt, temperature, system=None, max_tokens=None):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if self.rate_limit_every and self.calls % self.rate_limit_every == 0:
+            raise RetryableLLMError("fake rate limit", retry_after=0)
+        return self._answer(prompt)
+
+    async def stream(self, model, prompt, temperature):
+        text = await self.generate(model, prompt, temperature)
+        for word in text.split(" "):
+            await asyncio.sleep(self.latency / 10)
+            yield word + " "
+
+
+PROVIDERS = {
+    "gemini": GeminiProvider,
+    "openai": OpenAIProvider,
+    "fake": FakeProvider
+}
+
+
+class TokenBucket:
+    """Allows `burst` requests at once and refills at `rate` requests per second."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        # Single-threaded on the event loop: no lock needed between check and take
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def penalize(self, seconds):
+        # The provider said "slow down": stop handing out tokens for a while
+        self._refill()
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+class _ModelStats:
+    def __init__(self):
+        self.requests = 0
+        self.provider_calls = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.errors = 0
+        self.queued = 0
+        self.in_flight = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def to_dict(self):
+        latencies = sorted(self.latencies)
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 3)
+
+        return {
+            "requests": self.requests,
+            "provider_calls": self.provider_calls,
+            "coalesced": self.coalesced,
+            "retries": self.retries,
+            "errors": self.errors,
+            "queue_depth": self.queued,
+            "in_flight": self.in_flight,
+            "latency_p50": percentile(0.5),
+            "latency_p95": percentile(0.95),
+            "latency_max": round(latencies[-1], 3) if latencies else None
+        }
+
+
+class LLMGateway:
+    """Single entry point for LLM calls.
+
+    Calls wait for one of max_concurrency slots and a rate-limit token, are
+    retried with jittered exponential backoff on rate limits and transient
+    errors, and identical prompts already in flight share one provider call.
+    """
+
+    def __init__(self, provider, max_concurrency=LLM_MAX_CONCURRENCY, requests_per_minute=LLM_REQUESTS_PER_MINUTE,
+                 burst=LLM_BURST, max_retries=LLM_MAX_RETRIES, backoff_base=LLM_BACKOFF_BASE_SECONDS,
+                 backoff_max=LLM_BACKOFF_MAX_SECONDS):
+        self.provider = provider
+        self.max_concurrency = max_concurrency
+        self.bucket = TokenBucket(requests_per_minute / 60, burst)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._stats = {}
+        self._loop = None
+        self._slots = None
+        self._in_flight = {}
+
+    def _ensure_loop(self):
+        # asyncio primitives belong to one event loop; start fresh on a new one
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+            self._in_flight = {}
+
+    def _model_stats(self, model):
+        return self._stats.setdefault(model, _ModelStats())
+
+    def _backoff(self, attempt, error):
+        if getattr(error, "retry_after", None) is not None:
+            return error.retry_after
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def _acquire(self, stats):
+        stats.queued += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            stats.queued -= 1
+        try:
+            await self.bucket.acquire()
+        except BaseException:
+            self._slots.release()
+            raise
+        stats.in_flight += 1
+
+    def _release(self, stats):
+        stats.in_flight -= 1
+        self._slots.release()
+
+    async def _call(self, model, prompt, temperature, options):
+        stats = self._model_stats(model)
+        attempt = 0
+        while True:
+            await self._acquire(stats)
+            started = time.perf_counter()
+            try:
+                stats.provider_calls += 1
+                text = await self.provider.generate(model, prompt, temperature, **options)
+                stats.latencies.append(time.perf_counter() - started)
+                self._record_tokens(model, prompt, text)
+                return text
+            except RetryableLLMError as e:
+                if attempt >= self.max_retries:
+                    stats.errors += 1
+                    raise
+                delay = self._backoff(attempt, e)
+                self.bucket.penalize(delay)
+                stats.retries += 1
+                attempt += 1
+                print(f"⏳ LLM {model} rate limited or unavailable ({e}), retry {attempt} in {delay:.1f}s")
+            except Exception:
+                stats.errors += 1
+                raise
+            finally:
+                self._release(stats)
+            await asyncio.sleep(delay)
+
+    async def generate(self, prompt, model, temperature=1.0, **options):
+        """Return the completion text for prompt. options: system, max_tokens."""
+        self._ensure_loop()
+        stats = self._model_stats(model)
+        stats.requests += 1
+
+        key = hashlib.sha256(json.dumps([model, temperature, prompt, options], sort_keys=True).encode("utf-8")).hexdigest()
+        task = self._in_flight.get(key)
+        if task is not None:
+            stats.coalesced += 1
+        else:
+            task = asyncio.ensure_future(self._call(model, prompt, temperature, options))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _, key=key, in_flight=self._in_flight: in_flight.pop(key, None))
+        # shield: one caller going away must not cancel the call the others wait on
+        with span("llm"):
+            return await asyncio.shield(task)
+
+    async def stream(self, prompt, model, temperature=1.0):
+        """Yield completion text as it arrives. Retries only until the first piece."""
+        self._ensure_loop()
+        stats = self._model_stats(model)
+        stats.requests += 1
+        attempt = 0
+        with span("llm"):
+            while True:
+                await self._acquire(stats)
+                started = time.perf_counter()
+                received = []
+                try:
+                    stats.provider_calls += 1
+                    async for text in self.provider.stream(model, prompt, temperature):
+                        received.append(text)
+                        yield text
+                    stats.latencies.append(time.perf_counter() - started)
+                    self._record_tokens(model, prompt, "".join(received))
+                    return
+                except RetryableLLMError as e:
+                    if received or attempt >= self.max_retries:
+                        stats.errors += 1
+                        raise
+                    delay = self._backoff(attempt, e)
+                    self.bucket.penalize(delay)
+                    stats.retries += 1
+                    attempt += 1
+                except Exception:
+                    stats.errors += 1
+                    raise
+                finally:
+                    self._release(stats)
+                await asyncio.sleep(delay)
+
+    @staticmethod
+    def _record_tokens(model, prompt, text):
+        # Estimated from the text length: providers differ in what usage they report
+        LLM_TOKENS.labels(model, "prompt").observe(estimate_tokens(prompt))
+        LLM_TOKENS.labels(model, "response").observe(estimate_tokens(text))
+
+    def stats(self):
+        return {
+            "provider": self.provider.name,
+            "max_concurrency": self.max_concurrency,
+            "models": {model: stats.to_dict() for model, stats in self._stats.items()}
+        }
+
+
+_gateways = {}
+
+
+def get_gateway(provider=None):
+    """The shared gateway of a provider (LLM_PROVIDER=fake routes everything to the fake)."""
+    name = "fake" if LLM_PROVIDER == "fake" else (provider or LLM_PROVIDER)
+    if name not in _gateways:
+        _gateways[name] = LLMGateway(PROVIDERS[name]())
+    return _gateways[name]
+
+
+def gateway_stats():
+    return {name: gateway.stats() for name, gateway in _gateways.items()}
@@ -0,0 +1,105 @@
+import time
+from contextvars import ContextVar
+from prometheus_client import Counter, Histogram
+
+# Buckets cover a cache hit (tens of ms) up to a slow Gemini start (~10 s)
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 7.5, 10.0, 20.0)
+# Stages range from a JSON parse (sub-millisecond) to extracting a long PDF
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+HIT_BUCKETS = (0, 1, 2, 3, 5, 8, 12, 20, 50)
+
+RAG_TIME_TO_FIRST_TOKEN = Histogram(
+    "rag_time_to_first_token_seconds",
+    "Time from a streamed /rag request to the first generated token (retrieval included)",
+    buckets=LATENCY_BUCKETS
+)
+
+STAGE_SECONDS = Histogram(
+    "rfp_stage_duration_seconds",
+    "Time spent per pipeline stage (extract, text_write, encode, index, search, prompt_build, llm, json_parse, ...)",
+    ["stage"],
+    buckets=STAGE_BUCKETS
+)
+
+LLM_TOKENS = Histogram(
+    "llm_tokens",
+    "Estimated prompt and response tokens per LLM call",
+    ["model", "kind"],
+    buckets=TOKEN_BUCKETS
+)
+
+CACHE_LOOKUPS = Counter(
+    "rfp_cache_lookups_total",
+    "Cache lookups by cache and result (hit/miss)",
+    ["cache", "result"]
+)
+
+RETRIEVAL_HITS = Histogram(
+    "rfp_retrieval_hits",
+    "Chunks returned per search after min_score filtering and deduplication",
+    ["mode"],
+    buckets=HIT_BUCKETS
+)
+
+RETRIEVAL_BELOW_MIN_SCORE = Counter(
+    "rfp_retrieval_below_min_score_total",
+    "Vector hits discarded for scoring under min_score",
+    ["mode"]
+)
+
+# Spans of the current request, when the request is being traced (see app.py)
+_request_spans = ContextVar("request_spans", default=None)
+_stage_histograms = {}
+
+
+class span:
+    """Times one pipeline stage: `with span("search"): ...`.
+
+    The duration goes to rfp_stage_duration_seconds and, inside a traced
+    request, to that request's span list. Costs two perf_counter calls and a
+    histogram observe.
+    """
+    __slots__ = ("stage", "started", "spans")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.spans = _request_spans.get()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.started
+        histogram = _stage_histograms.get(self.stage)
+        if histogram is None:
+            histogram = _stage_histograms[self.stage] = STAGE_SECONDS.labels(self.stage)
+        histogram.observe(seconds)
+        if self.spans is not None:
+            self.spans.append((self.stage, seconds))
+        return False
+
+
+def start_request_trace():
+    """Collect the spans of the current request (and of tasks it starts) into a list."""
+    spans = []
+    _request_spans.set(spans)
+    return spans
+
+
+def summarize_spans(spans):
+    # Total seconds per stage, in first-seen order
+    totals = {}
+    for stage, seconds in spans:
+        totals[stage] = totals.get(stage, 0.0) + seconds
+    return totals
+
+
+def server_timing(totals):
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in totals.items())
+
+
+def record_cache(cache, hit, count=1):
+    if count:
+        CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc(count)
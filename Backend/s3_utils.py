@@ -1,30 +1,85 @@
 import boto3
 import hashlib
-from botocore.exceptions import NoCredentialsError
+import os
+import threading
+from urllib.parse import quote
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError, NoCredentialsError
 
-BUCKET_NAME = "rfp-storage-hackathon"
-REGION = "ap-south-1"
+BUCKET_NAME = os.getenv("S3_BUCKET", "rfp-storage-hackathon")
+REGION = os.getenv("S3_REGION", "ap-south-1")
+# Point at a local S3 stand-in (MinIO, moto server) for development and tests
+ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None
+# Keep a copy of every uploaded RFP in S3 (off unless configured)
+S3_ENABLED = os.getenv("S3_ENABLED", "false").lower() == "true"
 
-s3 = boto3.client("s3", region_name=REGION)  # auto-picks credentials
+# Multipart settings: files larger than one part are sent as parallel parts
+PART_SIZE = int(os.getenv("S3_PART_SIZE_MB", 8)) * 1024 * 1024
+MAX_CONCURRENCY = int(os.getenv("S3_MAX_CONCURRENCY", 4))
+HASH_READ_SIZE = 1024 * 1024
+
+_s3 = None
+_s3_lock = threading.Lock()
+
+# Created on first use so importing this module doesn't resolve credentials;
+# boto3 client creation isn't thread-safe, hence the lock
+def get_s3_client():
+    global _s3
+    if _s3 is None:
+        with _s3_lock:
+            if _s3 is None:
+                _s3 = boto3.client("s3", region_name=REGION, endpoint_url=ENDPOINT_URL)  # auto-picks credentials
+    return _s3
 
 def get_file_hash(file_content: bytes) -> str:
     """Generate SHA256 hash of the file."""
     return hashlib.sha256(file_content).hexdigest()
 
+def get_file_hash_from_path(path: str) -> str:
+    """Generate SHA256 hash of a file on disk without loading it into memory."""
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_READ_SIZE), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+def _object_key(hash_name: str) -> str:
+    return f"rfps/{hash_name}"
+
+def _object_url(key: str) -> str:
+    if ENDPOINT_URL:
+        return f"{ENDPOINT_URL.rstrip('/')}/{BUCKET_NAME}/{key}"
+    return f"https://{BUCKET_NAME}.s3.{REGION}.amazonaws.com/{key}"
+
 def file_exists_in_s3(hash_name: str) -> bool:
     """Check if a file with the given hash already exists in the bucket."""
     try:
-        s3.head_object(Bucket=BUCKET_NAME, Key=f"rfps/{hash_name}")
+        get_s3_client().head_object(Bucket=BUCKET_NAME, Key=_object_key(hash_name))
         return True
-    except:
+    except ClientError:
         return False
 
 def upload_to_s3(file_content: bytes, original_filename: str, hash_name: str) -> str:
     """Upload file to S3 and return the file URL."""
-    key = f"rfps/{hash_name}-{original_filename}"
+    key = _object_key(hash_name)
+    try:
+        get_s3_client().put_object(Bucket=BUCKET_NAME, Key=key, Body=file_content, Metadata={"filename": quote(original_filename)})
+        return _object_url(key)
+    except NoCredentialsError:
+        raise Exception("AWS credentials not found.")
+
+def upload_file_to_s3(path: str, original_filename: str, hash_name: str,
+                      part_size: int = PART_SIZE, max_concurrency: int = MAX_CONCURRENCY) -> str:
+    """Upload a file from disk with multipart upload (parallel parts) and return the file URL."""
+    key = _object_key(hash_name)
+    config = TransferConfig(
+        multipart_threshold=part_size,
+        multipart_chunksize=part_size,
+        max_concurrency=max_concurrency,
+        use_threads=True
+    )
     try:
-        s3.put_object(Bucket=BUCKET_NAME, Key=key, Body=file_content)
-        file_url = f"https://{BUCKET_NAME}.s3.{REGION}.amazonaws.com/{key}"
-        return file_url
+        get_s3_client().upload_file(path, BUCKET_NAME, key, ExtraArgs={"Metadata": {"filename": quote(original_filename)}}, Config=config)
+        return _object_url(key)
     except NoCredentialsError:
         raise Exception("AWS credentials not found.")
@@ -0,0 +1,105 @@
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import numpy as np
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_PDF = os.path.join(BACKEND_DIR, "uploads", "ELIGIBLE RFP - 1.pdf")
+SECOND_PDF = os.path.join(BACKEND_DIR, "uploads", "IN-ELIGIBLE_RFP.pdf")
+
+# The app keeps uploads, texts, caches and job/analysis stores relative to
+# the working directory: tests run in a scratch one, like benchmarks.load
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(tempfile.mkdtemp(prefix="rfp-tests-"))
+
+
+class HashingModel:
+    """Stand-in for the SentenceTransformer: a deterministic unit vector per text.
+
+    seconds_per_text makes encode take time in proportion to the batch, like
+    the real model (it runs on the embedding executor too).
+    """
+
+    def __init__(self, seconds_per_text=0.0):
+        self.seconds_per_text = seconds_per_text
+
+    def encode(self, texts, normalize_embeddings=True, **kwargs):
+        time.sleep(self.seconds_per_text * len(texts))
+        vectors = []
+        for text in texts:
+            seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+            vector = np.random.default_rng(seed).normal(size=384).astype(np.float32)
+            vectors.append(vector / np.linalg.norm(vector))
+        return np.stack(vectors)
+
+
+@pytest.fixture
+def fake_backend(monkeypatch):
+    """The app's process-wide state, fresh for one in-process run: fake
+    Elasticsearch and LLM, a HashingModel, new executors (the lifespan shuts
+    them down) and no precomputed analyses. Returns the model."""
+    import app as backend
+    import ingestion
+    from benchmarks.fakes import install_fakes
+    from elastic import elastic_helper
+    from utils import embedding_generator, executors
+
+    # The fake LLM has no quota: keep the gateway's rate limit out of the timings
+    install_fakes(es_latency=0.001, llm_latency=0.05, requests_per_minute=60000)
+    model = HashingModel()
+    monkeypatch.setattr(embedding_generator, "_model", model)
+    # Only ingestion competes with requests here, not the analyses' LLM calls
+    monkeypatch.setattr(ingestion, "PRECOMPUTE_ANALYSES", False)
+    monkeypatch.setattr(ingestion, "_company_indices_ready", set())
+    for component in backend.readiness:
+        monkeypatch.setitem(backend.readiness, component, False)
+
+    embedding = ThreadPoolExecutor(max_workers=executors.EMBEDDING_WORKERS, thread_name_prefix="embedding")
+    extraction = ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context("spawn"))
+    for module in (executors, backend, elastic_helper):
+        monkeypatch.setattr(module, "embedding_executor", embedding)
+    for module in (executors, backend, ingestion):
+        monkeypatch.setattr(module, "extraction_executor", extraction)
+    monkeypatch.setattr(embedding_generator.embedder, "executor", embedding)
+    yield model
+    embedding.shutdown(wait=False, cancel_futures=True)
+    extraction.shutdown(wait=False, cancel_futures=True)
+
+
+@asynccontextmanager
+async def serve(timeout=60):
+    """An httpx client for the app, served in-process once it reports ready."""
+    import httpx
+    import app as backend
+
+    transport = httpx.ASGITransport(app=backend.app)
+    async with backend.app.router.lifespan_context(backend.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=timeout) as client:
+            deadline = time.monotonic() + timeout
+            while (await client.get("/readyz")).status_code != 200:
+                assert time.monotonic() < deadline, "app did not become ready"
+                await asyncio.sleep(0.1)
+            yield client
+
+
+async def wait_for_job(client, job_id, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = (await client.get(f"/api/jobs/{job_id}")).json()
+        if job["status"] in ("done", "failed"):
+            return job
+        await asyncio.sleep(0.1)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+async def upload(client, path, filename, **data):
+    with open(path, "rb") as f:
+        response = await client.post("/api/upload", files={"file": (filename, f.read(), "application/pdf")}, data=data)
+    return response
@@ -0,0 +1,56 @@
+import asyncio
+from analysis_store import analysis_store
+from elastic.elastic_helper import _requirement_sentences, index_for_tenant, match_company_facts
+from ingestion import ensure_company_profile, ingest_company_document
+
+
+def _chunk(*sentences):
+    return {"text": " ".join(sentences)}
+
+
+def test_requirement_sentences_come_from_every_chunk():
+    chunks = [
+        _chunk("The agency was founded in 1921 downtown.", "Vendors must carry general liability insurance."),
+        _chunk("This section describes the evaluation process.", "Offerors shall hold a state staffing license."),
+        _chunk("Questions are answered on the portal weekly.", "The contractor must be SAM.gov registered."),
+    ]
+
+    sentences = _requirement_sentences(chunks, limit=3)
+
+    assert sentences == [
+        "Vendors must carry general liability insurance.",
+        "Offerors shall hold a state staffing license.",
+        "The contractor must be SAM.gov registered.",
+    ]
+
+
+def test_core_facts_are_always_matched(fake_backend):
+    async def run():
+        await ensure_company_profile("tenant-a")
+        return await match_company_facts([_chunk("The building has three floors and a parking garage.")], "tenant-a")
+
+    facts = asyncio.run(run())
+
+    assert facts[0].startswith("Company legal name:")
+    assert facts[1].startswith("Certifications:")
+
+
+def test_missing_company_index_is_checked_once(fake_backend, capsys):
+    chunks = [_chunk(f"Requirement number {number} must be met by the vendor.") for number in range(10)]
+
+    facts = asyncio.run(match_company_facts(chunks, "no-such-tenant"))
+
+    assert facts == []
+    assert capsys.readouterr().out.count("no-such-tenant-company") == 1
+
+
+def test_company_upload_clears_only_its_index(fake_backend, tmp_path):
+    profile = tmp_path / "profile.txt"
+    profile.write_text("Certifications: HUB certified by the State of Texas since 2021\n")
+    analysis_store.set("doc", "rfp_documentsv2-tenant-b", "eligibility", 1, {"eligible": True})
+    analysis_store.set("doc", index_for_tenant(), "eligibility", 1, {"eligible": False})
+
+    asyncio.run(ingest_company_document(str(profile), "profile.txt"))
+
+    assert analysis_store.get("doc", "rfp_documentsv2-tenant-b", "eligibility", 1) == {"eligible": True}
+    assert analysis_store.get("doc", index_for_tenant(), "eligibility", 1) is None
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("sentence_transformers")
+pytest.importorskip("torch")
+
+from utils.embedding_generator import load_model
+
+# Quantized backends must stay this close (cosine) to the float32 vectors
+PARITY_THRESHOLD = 0.98
+SAMPLES = [
+    "Extract eligibility criteria for bidders from this RFP.",
+    "Proposals must include a Certificate of Insurance and a signed Form W-9.",
+    "The contractor shall hold a valid Texas Employment Agency License.",
+    "NAICS code 561320 Temporary Help Services",
+    "Bids are due Thursday at 2:00 PM; late submissions will not be accepted.",
+]
+
+
+def _encode(model):
+    return model.encode(SAMPLES, normalize_embeddings=True, show_progress_bar=False)
+
+
+@pytest.fixture(scope="module")
+def reference_vectors():
+    return _encode(load_model("torch"))
+
+
+@pytest.mark.parametrize("backend", ["int8", "onnx"])
+def test_backend_matches_float32_vectors(backend, reference_vectors):
+    if backend == "onnx":
+        pytest.importorskip("onnxruntime")
+        pytest.importorskip("optimum")
+    vectors = _encode(load_model(backend))
+    assert vectors.shape == reference_vectors.shape
+    assert float(np.min(np.sum(vectors * reference_vectors, axis=1))) >= PARITY_THRESHOLD
@@ -0,0 +1,86 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+from utils.embedding_generator import MicroBatchEmbedder
+
+# Stand-in model cost: encoding time grows with the batch, like the real one
+SECONDS_PER_TEXT = 0.002
+
+
+def slow_encode(texts):
+    time.sleep(SECONDS_PER_TEXT * len(texts))
+    return np.array([[float(text.split("-")[1])] for text in texts], dtype=np.float32)
+
+
+@pytest.fixture
+def embedder():
+    executor = ThreadPoolExecutor(max_workers=1)
+    yield MicroBatchEmbedder(slow_encode, max_batch_size=64, max_wait_ms=5, executor=executor)
+    executor.shutdown()
+
+
+def test_query_does_not_wait_behind_a_large_encode(embedder):
+    chunks = [f"chunk-{number}" for number in range(1000)]
+
+    async def run():
+        upload = asyncio.ensure_future(embedder.encode(chunks))
+        await asyncio.sleep(0.1)
+        started = time.perf_counter()
+        query = await embedder.encode(["query-7"])
+        latency = time.perf_counter() - started
+        assert not upload.done()
+        return latency, query, await upload
+
+    latency, query, vectors = asyncio.run(run())
+
+    # The whole upload takes 2 s; the query waits for one 64-text slice at most
+    assert latency < 0.5, latency
+    assert query.tolist() == [[7.0]]
+    assert vectors.shape == (1000, 1)
+    assert vectors[:, 0].tolist() == list(range(1000))
+
+
+def test_concurrent_queries_share_a_batch(embedder):
+    async def run():
+        return await asyncio.gather(*(embedder.encode([f"query-{number}"]) for number in range(10)))
+
+    results = asyncio.run(run())
+
+    assert [result.tolist() for result in results] == [[[float(number)]] for number in range(10)]
+    assert embedder.batches == 1
+
+
+def test_failed_encode_reaches_every_caller(embedder):
+    def failing_encode(texts):
+        raise RuntimeError("model unavailable")
+
+    embedder.encode_batch = failing_encode
+
+    async def run():
+        return await asyncio.gather(embedder.encode(["query-1"]), embedder.encode(["query-2"] * 200),
+                                    return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in asyncio.run(run()))
+
+
+def test_large_encodes_take_turns(embedder):
+    chunks = [f"chunk-{number}" for number in range(1000)]
+    sentences = [f"sentence-{number}" for number in range(100)]
+
+    async def run():
+        upload = asyncio.ensure_future(embedder.encode(chunks))
+        await asyncio.sleep(0.1)
+        started = time.perf_counter()
+        vectors = await embedder.encode(sentences)
+        latency = time.perf_counter() - started
+        assert not upload.done()
+        await upload
+        return latency, vectors
+
+    latency, vectors = asyncio.run(run())
+
+    # Two slices of its own, each after at most one slice of the upload
+    assert latency < 0.8, latency
+    assert vectors[:, 0].tolist() == list(range(100))
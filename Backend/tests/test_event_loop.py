@@ -0,0 +1,73 @@
+import asyncio
+import math
+import statistics
+import time
+import pytest
+from conftest import SAMPLE_PDF, SECOND_PDF, serve, upload, wait_for_job
+
+from elastic import elastic_helper
+from utils import embedding_generator
+
+QUESTIONS = (
+    "What insurance coverage is required?",
+    "When are proposals due?",
+    "Which licenses must the bidder hold?",
+    "What is the contract term?",
+    "How should the proposal be formatted?"
+)
+SECONDS_PER_TEXT = 0.02
+# Small slices make the upload's encode many model calls, as a large RFP's would
+SLICE_SIZE = 8
+
+
+async def _rag_latency(client, number):
+    started = time.perf_counter()
+    response = await client.get("/rag", params={"q": QUESTIONS[number % len(QUESTIONS)] + f" ({number})"})
+    assert response.status_code == 200
+    return time.perf_counter() - started
+
+
+def _stage(job):
+    running = [stage["name"] for stage in job["stages"] if stage["status"] == "running"]
+    return running[-1] if running else None
+
+
+async def _measure():
+    async with serve() as client:
+        # A first RFP to answer questions from; also starts the extraction workers
+        seed = await upload(client, SAMPLE_PDF, "seed.pdf")
+        assert (await wait_for_job(client, seed.json()["job_id"]))["status"] == "done"
+
+        idle = [await _rag_latency(client, number) for number in range(15)]
+
+        job_id = (await upload(client, SECOND_PDF, "second.pdf")).json()["job_id"]
+        during = []
+        while (job := (await client.get(f"/api/jobs/{job_id}")).json())["status"] in ("queued", "running"):
+            during.append((_stage(job), await _rag_latency(client, len(during))))
+        job = await wait_for_job(client, job_id)
+        assert job["status"] == "done"
+        assert job["result"]["encoded"] == job["result"]["chunks"]
+    return idle, during
+
+
+@pytest.fixture
+def slow_model(fake_backend, monkeypatch):
+    monkeypatch.setattr(fake_backend, "seconds_per_text", SECONDS_PER_TEXT)
+    monkeypatch.setattr(embedding_generator.embedder, "max_batch_size", SLICE_SIZE)
+
+
+def test_rag_latency_stays_flat_during_upload(slow_model):
+    idle, during = asyncio.run(_measure())
+
+    idle_median = statistics.median(idle)
+    embedding = [latency for stage, latency in during if stage == "embed"]
+    assert len(embedding) >= 5, "the upload was embedded before /rag could be sampled"
+    # The upload's chunks take over two seconds to encode. /rag makes one
+    # model call for the question and one per slice of the sentences matched
+    # against company facts; each may wait for one slice of the upload, not
+    # for the whole of it. PDF parsing and indexing run off the event loop
+    slice_seconds = SLICE_SIZE * SECONDS_PER_TEXT
+    model_calls = 1 + math.ceil(elastic_helper.COMPANY_MATCH_MAX_REQUIREMENTS / SLICE_SIZE)
+    assert statistics.median(embedding) < idle_median + model_calls * slice_seconds, (idle_median, embedding)
+    assert max(embedding) < idle_median + (model_calls + 1) * slice_seconds, (idle_median, embedding)
+    assert max(latency for _, latency in during) < idle_median + 0.5, (idle_median, during)
@@ -0,0 +1,80 @@
+import asyncio
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+import pytest
+
+from job_queue import JobStore, JobWorkerPool, _process_token
+
+needs_proc = pytest.mark.skipif(_process_token(os.getpid()) is None, reason="no /proc to read start tokens from")
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.sqlite3"))
+
+
+@pytest.fixture
+def other_worker():
+    """A live process standing in for another uvicorn worker."""
+    process = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+    yield process.pid
+    process.kill()
+    process.wait()
+
+
+def _running_as(store, pid, token, heartbeat_at):
+    job_id = store.create("ingest_rfp", {})
+    store.claim_next()
+    with sqlite3.connect(store.path) as conn:
+        conn.execute(
+            "UPDATE jobs SET worker_pid = ?, worker_token = ?, heartbeat_at = ? WHERE id = ?",
+            (pid, token, heartbeat_at, job_id)
+        )
+    return job_id
+
+
+@needs_proc
+def test_live_worker_keeps_its_job(store, other_worker):
+    job_id = _running_as(store, other_worker, _process_token(other_worker), time.time())
+
+    assert store.requeue_interrupted() == 0
+    assert store.get(job_id)["status"] == "running"
+
+
+@needs_proc
+def test_reused_pid_does_not_keep_the_job(store, other_worker):
+    # The pid is alive, but it was started after the worker that claimed the job
+    token = _process_token(other_worker).rsplit(":", 1)[0] + ":0"
+    job_id = _running_as(store, other_worker, token, time.time())
+
+    assert store.requeue_interrupted() == 1
+    assert store.get(job_id)["status"] == "queued"
+
+
+def test_stale_heartbeat_requeues_the_job(store, other_worker):
+    job_id = _running_as(store, other_worker, _process_token(other_worker), time.time() - 120)
+
+    assert store.requeue_interrupted(heartbeat_timeout=60) == 1
+    assert store.get(job_id)["status"] == "queued"
+
+
+def test_pool_sends_heartbeats_while_a_job_runs(store):
+    async def slow(payload, progress):
+        await asyncio.sleep(0.5)
+
+    async def run():
+        pool = JobWorkerPool(store, {"slow": slow}, workers=1, poll_interval=0.05, heartbeat_interval=0.1)
+        job_id = await pool.submit("slow", {})
+        pool.start()
+        await asyncio.sleep(0.1)
+        claimed = store.get(job_id)["heartbeat_at"]
+        await asyncio.sleep(0.3)
+        latest = store.get(job_id)["heartbeat_at"]
+        await pool.stop()
+        return claimed, latest
+
+    claimed, latest = asyncio.run(run())
+    assert latest > claimed
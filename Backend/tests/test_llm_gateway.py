@@ -0,0 +1,100 @@
+import asyncio
+import time
+import pytest
+from llm_gateway import FakeProvider, LLMGateway, RetryableLLMError, TokenBucket
+
+MODEL = "fake-model"
+
+
+class CountingProvider(FakeProvider):
+    """FakeProvider that records how many calls overlap, and fails the first
+    `failures` calls with a retryable error."""
+
+    def __init__(self, failures=0, retry_after=None, **kwargs):
+        super().__init__(**kwargs)
+        self.failures = failures
+        self.retry_after = retry_after
+        self.running = 0
+        self.max_running = 0
+
+    async def generate(self, model, prompt, temperature, system=None, max_tokens=None):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            if self.calls < self.failures:
+                self.calls += 1
+                await asyncio.sleep(self.latency)
+                raise RetryableLLMError("429 Too Many Requests", retry_after=self.retry_after)
+            return await super().generate(model, prompt, temperature, system, max_tokens)
+        finally:
+            self.running -= 1
+
+
+def _gateway(provider, **kwargs):
+    kwargs.setdefault("requests_per_minute", 60000)
+    kwargs.setdefault("burst", 100)
+    return LLMGateway(provider, **kwargs)
+
+
+def test_identical_concurrent_prompts_share_one_call():
+    gateway = _gateway(CountingProvider(latency=0.05))
+
+    async def run():
+        return await asyncio.gather(*(gateway.generate("Summarize the RFP.", MODEL) for _ in range(10)))
+
+    answers = asyncio.run(run())
+
+    assert len(set(answers)) == 1
+    assert gateway.provider.calls == 1
+    assert gateway.stats()["models"][MODEL]["coalesced"] == 9
+
+
+def test_rate_limited_call_is_retried():
+    gateway = _gateway(CountingProvider(failures=1, retry_after=0, latency=0.01))
+
+    answer = asyncio.run(gateway.generate("Summarize the RFP.", MODEL))
+
+    assert "prompt_sha256" in answer
+    assert gateway.provider.calls == 2
+    stats = gateway.stats()["models"][MODEL]
+    assert stats["retries"] == 1 and stats["errors"] == 0
+
+
+def test_transient_errors_back_off_with_jitter_until_retries_run_out():
+    gateway = _gateway(CountingProvider(failures=10, latency=0), max_retries=3, backoff_base=0.01, backoff_max=0.05)
+
+    started = time.perf_counter()
+    with pytest.raises(RetryableLLMError):
+        asyncio.run(gateway.generate("Summarize the RFP.", MODEL))
+
+    # Full jitter: each wait is somewhere in [0, min(max, base * 2^attempt)]
+    assert time.perf_counter() - started < 0.01 + 0.02 + 0.04 + 0.1
+    assert gateway.provider.calls == 4
+    stats = gateway.stats()["models"][MODEL]
+    assert stats["retries"] == 3 and stats["errors"] == 1
+    assert all(0 <= gateway._backoff(attempt, None) <= min(0.05, 0.01 * 2 ** attempt) for attempt in range(6))
+
+
+def test_concurrency_never_exceeds_the_limit():
+    gateway = _gateway(CountingProvider(latency=0.02), max_concurrency=3)
+
+    async def run():
+        await asyncio.gather(*(gateway.generate(f"Question {number}", MODEL) for number in range(20)))
+
+    asyncio.run(run())
+
+    assert gateway.provider.calls == 20
+    assert gateway.provider.max_running == 3
+
+
+def test_token_bucket_spaces_requests_after_the_burst():
+    bucket = TokenBucket(rate=20, burst=2)
+
+    async def run():
+        started = time.perf_counter()
+        for _ in range(6):
+            await bucket.acquire()
+        return time.perf_counter() - started
+
+    # Two at once, then one every 1/20 s
+    assert 0.19 <= asyncio.run(run()) < 0.4
@@ -0,0 +1,15 @@
+import asyncio
+from conftest import serve
+
+
+def test_metrics_are_served_without_a_redirect(fake_backend):
+    async def run():
+        async with serve() as client:
+            await client.get("/healthz")
+            return await client.get("/metrics")
+
+    response = asyncio.run(run())
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "# TYPE" in response.text
@@ -0,0 +1,78 @@
+import os
+import shutil
+import numpy as np
+import pytest
+from utils import numpy_index
+from utils.numpy_index import NumpyVectorIndex
+
+
+def _documents(doc_id, count):
+    rng = np.random.default_rng(len(doc_id))
+    return [
+        (f"{doc_id}-{number}", {"doc_id": doc_id, "filename": "RFP.pdf", "text": f"{doc_id} chunk {number}"},
+         rng.normal(size=8))
+        for number in range(count)
+    ]
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    # Compact only when a test asks for it
+    monkeypatch.setattr(numpy_index, "COMPACT_DEAD_RATIO", float("inf"))
+    index = NumpyVectorIndex(str(tmp_path / "rfps"))
+    index.add(_documents("old", 6))
+    index.add(_documents("new", 4))
+    index.delete_document("old")
+    return index
+
+
+def _ids(index):
+    return sorted(hit["_id"] for hit in index.sample(100))
+
+
+def test_compact_switches_to_a_new_generation(index):
+    index.compact()
+
+    reopened = NumpyVectorIndex(index.path)
+    assert reopened.generation == "gen-1"
+    assert sorted(os.listdir(index.path)) == ["CURRENT", "gen-1"]
+    assert _ids(reopened) == [f"new-{number}" for number in range(4)]
+
+
+def test_crash_before_the_switch_keeps_the_old_generation(index, monkeypatch):
+    def crash(self, generation):
+        raise OSError("power cut")
+
+    monkeypatch.setattr(NumpyVectorIndex, "_switch_generation", crash)
+    with pytest.raises(OSError):
+        index.compact()
+    monkeypatch.undo()
+
+    reopened = NumpyVectorIndex(index.path)
+    assert reopened.generation == "gen-0"
+    assert _ids(reopened) == [f"new-{number}" for number in range(4)]
+    reopened.compact()
+    assert _ids(NumpyVectorIndex(index.path)) == [f"new-{number}" for number in range(4)]
+
+
+def test_crash_after_the_switch_ignores_old_tombstones(index, monkeypatch):
+    monkeypatch.setattr(NumpyVectorIndex, "_remove_old_generations", lambda self: None)
+    index.compact()
+
+    # The old generation's deleted.txt names rows 0-5, which are live chunks after compaction
+    reopened = NumpyVectorIndex(index.path)
+    assert reopened.generation == "gen-1"
+    assert reopened.count() == 4
+    assert _ids(reopened) == [f"new-{number}" for number in range(4)]
+
+
+def test_index_without_generations_still_opens(index, tmp_path):
+    legacy = str(tmp_path / "legacy")
+    shutil.copytree(os.path.join(index.path, "gen-0"), legacy)
+
+    reopened = NumpyVectorIndex(legacy)
+    assert reopened.generation == ""
+    assert reopened.count() == 4
+    reopened.compact()
+    assert sorted(os.listdir(legacy)) == ["CURRENT", "gen-1"]
+    assert _ids(NumpyVectorIndex(legacy)) == [f"new-{number}" for number in range(4)]
@@ -0,0 +1,65 @@
+import asyncio
+import hashlib
+import io
+import os
+import boto3
+import pytest
+from fastapi import UploadFile
+from moto import mock_aws
+import s3_utils
+from utils.uploads import save_upload
+
+MiB = 1024 * 1024
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setattr(s3_utils, "ENDPOINT_URL", None)
+    with mock_aws():
+        monkeypatch.setattr(s3_utils, "_s3", None)
+        client = boto3.client("s3", region_name=s3_utils.REGION)
+        client.create_bucket(
+            Bucket=s3_utils.BUCKET_NAME, CreateBucketConfiguration={"LocationConstraint": s3_utils.REGION}
+        )
+        yield client
+    s3_utils._s3 = None
+
+
+def test_upload_file_to_s3_sends_parts(s3, tmp_path):
+    # 5 MiB is the smallest part S3 accepts
+    body = os.urandom(12 * MiB)
+    path = tmp_path / "rfp.pdf"
+    path.write_bytes(body)
+    digest = hashlib.sha256(body).hexdigest()
+
+    url = s3_utils.upload_file_to_s3(str(path), "RFP 25-008.pdf", digest, part_size=5 * MiB)
+
+    stored = s3.get_object(Bucket=s3_utils.BUCKET_NAME, Key=f"rfps/{digest}")
+    assert url.endswith(f"rfps/{digest}")
+    assert stored["ETag"].strip('"').endswith("-3")
+    assert stored["Metadata"]["filename"] == "RFP%2025-008.pdf"
+    assert stored["Body"].read() == body
+
+
+def test_file_exists_in_s3(s3, tmp_path):
+    path = tmp_path / "rfp.pdf"
+    path.write_bytes(b"%PDF-1.4 small")
+    assert not s3_utils.file_exists_in_s3("abc")
+    s3_utils.upload_file_to_s3(str(path), "rfp.pdf", "abc")
+    assert s3_utils.file_exists_in_s3("abc")
+
+
+def test_save_upload_names_the_file_after_its_hash(tmp_path):
+    body = os.urandom(3 * MiB + 17)
+    upload = UploadFile(io.BytesIO(body), filename="rfp.pdf")
+
+    digest, size, path = asyncio.run(save_upload(upload, str(tmp_path), ".pdf", chunk_size=MiB))
+
+    assert digest == hashlib.sha256(body).hexdigest()
+    assert size == len(body)
+    assert path == os.path.join(str(tmp_path), f"{digest}.pdf")
+    assert os.listdir(tmp_path) == [f"{digest}.pdf"]
+    with open(path, "rb") as f:
+        assert f.read() == body
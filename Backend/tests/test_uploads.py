@@ -0,0 +1,80 @@
+import asyncio
+from conftest import SAMPLE_PDF, SECOND_PDF, serve, upload, wait_for_job
+
+from analysis_store import analysis_store
+from elastic import elastic_helper
+from elastic.elastic_helper import document_exists
+
+INDEX = elastic_helper.index_name
+
+
+async def _ingest(client, path, filename, **data):
+    response = await upload(client, path, filename, **data)
+    assert response.status_code == 200, response.text
+    job = await wait_for_job(client, response.json()["job_id"])
+    assert job["status"] == "done", job["error"]
+    return job["result"]
+
+
+async def _indexed(doc_id):
+    return await document_exists(doc_id, INDEX) and analysis_store.has_document(doc_id, INDEX)
+
+
+def test_upload_replaces_only_the_named_version(fake_backend, tmp_path):
+    revised = tmp_path / "revised.pdf"
+    with open(SAMPLE_PDF, "rb") as f:
+        revised.write_bytes(f.read() + b"\n% revised\n")
+
+    async def run():
+        async with serve() as client:
+            first = await _ingest(client, SAMPLE_PDF, "RFP.pdf")
+            # Another RFP under the same name is a separate document
+            other = await _ingest(client, SECOND_PDF, "RFP.pdf")
+            assert await _indexed(first["doc_id"]) and await _indexed(other["doc_id"])
+
+            unknown = await upload(client, str(revised), "RFP.pdf", replaces="0" * 64)
+            assert unknown.status_code == 404
+
+            new = await _ingest(client, str(revised), "RFP.pdf", replaces=first["doc_id"])
+            assert new["replaced"] == first["doc_id"]
+            assert not await _indexed(first["doc_id"])
+            assert analysis_store.get_fields(first["doc_id"]) is None
+            assert await _indexed(other["doc_id"]) and await _indexed(new["doc_id"])
+
+    asyncio.run(run())
+
+
+def test_partly_indexed_upload_keeps_the_old_version(fake_backend, monkeypatch, tmp_path):
+    revised = tmp_path / "revised.pdf"
+    with open(SECOND_PDF, "rb") as f:
+        revised.write_bytes(f.read() + b"\n% revised\n")
+    index_chunks = elastic_helper.ElasticsearchRetriever.index_chunks
+
+    async def failing_index_chunks(self, name, documents, batch_size):
+        indexed, errors = await index_chunks(self, name, list(documents)[1:], batch_size)
+        return indexed, errors + [{"index": {"status": 429}}]
+
+    async def run():
+        async with serve() as client:
+            old = await _ingest(client, SECOND_PDF, "RFP.pdf")
+            monkeypatch.setattr(elastic_helper.ElasticsearchRetriever, "index_chunks", failing_index_chunks)
+            new = await _ingest(client, str(revised), "RFP.pdf", replaces=old["doc_id"])
+            assert new["replaced"] is None
+            assert await _indexed(old["doc_id"])
+
+    asyncio.run(run())
+
+
+def test_clearing_the_index_forgets_its_documents(fake_backend):
+    async def run():
+        async with serve() as client:
+            ingested = await _ingest(client, SAMPLE_PDF, "RFP.pdf")
+            assert analysis_store.get_fields(ingested["doc_id"]) is not None
+
+            response = await client.delete("/api/clear-index")
+            assert response.status_code == 200
+            assert not await _indexed(ingested["doc_id"])
+            assert analysis_store.latest_document(INDEX) is None
+            assert analysis_store.get_fields(ingested["doc_id"]) is None
+
+    asyncio.run(run())
@@ -0,0 +1,56 @@
+import hashlib
+import os
+
+# Chunk sizes are in characters; all-MiniLM-L6-v2 truncates at 256 word pieces,
+# which is roughly 1000-1200 characters of RFP prose.
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", 1000))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", 200))
+
+
+def split_pages_into_chunks(pages, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """Split per-page text into overlapping chunks that never cross a page boundary.
+
+    Each chunk carries its 1-based page number, its character offset in the
+    full document text (pages joined with "\\n", the same layout written to texts/)
+    and a SHA-256 of its text, used to reuse embeddings of unchanged chunks.
+    """
+    if overlap >= chunk_size:
+        raise ValueError("overlap must be smaller than chunk_size")
+
+    chunks = []
+    page_start = 0
+    for page_number, page_text in enumerate(pages, start=1):
+        length = len(page_text)
+        start = 0
+        while start < length:
+            end = min(start + chunk_size, length)
+            if end < length:
+                # Break on whitespace so words are not cut in half
+                lower = start + overlap + 1
+                boundary = max(page_text.rfind(" ", lower, end), page_text.rfind("\n", lower, end))
+                if boundary > start:
+                    end = boundary
+
+            piece = page_text[start:end]
+            stripped = piece.strip()
+            if stripped:
+                leading = len(piece) - len(piece.lstrip())
+                chunks.append({
+                    "text": stripped,
+                    "page": page_number,
+                    "offset": page_start + start + leading,
+                    "chunk_index": len(chunks),
+                    "chunk_hash": hashlib.sha256(stripped.encode("utf-8")).hexdigest(),
+                })
+
+            if end >= length:
+                break
+            next_start = max(end - overlap, start + 1)
+            # Start the overlap on a word boundary as well
+            boundaries = [page_text.find(" ", next_start, end), page_text.find("\n", next_start, end)]
+            boundaries = [i for i in boundaries if i >= 0]
+            start = min(boundaries) + 1 if boundaries else next_start
+
+        page_start += length + 1
+
+    return chunks
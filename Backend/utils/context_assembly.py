@@ -0,0 +1,87 @@
+import os
+import re
+
+# Rough size of a token for English RFP prose; good enough to budget prompts
+# without calling the tokenizer API
+CHARS_PER_TOKEN = float(os.getenv("CHARS_PER_TOKEN", 4.0))
+# Trade-off between relevance (1.0) and diversity (0.0) when picking chunks
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", 0.7))
+# Chunks at least this similar to an already picked chunk are dropped outright
+DUPLICATE_SIMILARITY = float(os.getenv("DUPLICATE_SIMILARITY", 0.8))
+
+_WORD = re.compile(r"\w+")
+
+
+def estimate_tokens(text):
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+
+def _words(text):
+    return set(_WORD.findall(text.lower()))
+
+
+def _similarity(a, b):
+    # Jaccard similarity of the word sets (embeddings are not fetched from the index)
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def assemble_context(chunks, token_budget, mmr_lambda=MMR_LAMBDA,
+                     duplicate_similarity=DUPLICATE_SIMILARITY, separator="\n\n"):
+    """Pick chunks for a prompt with maximal marginal relevance under a token budget.
+
+    chunks are ranked best first (texts or chunk dicts with "text"). Relevance
+    falls linearly with rank; each step picks the chunk with the best
+    mmr_lambda * relevance - (1 - mmr_lambda) * similarity to the chunks already
+    picked. Near-duplicates and chunks that no longer fit are dropped.
+
+    Returns the joined context, the picked chunks and a token report.
+    """
+    candidates = []
+    for rank, chunk in enumerate(chunks):
+        if isinstance(chunk, str):
+            chunk = {"text": chunk}
+        candidates.append({
+            "chunk": chunk,
+            "relevance": 1.0 - rank / max(len(chunks), 1),
+            "tokens": estimate_tokens(chunk["text"]),
+            "words": _words(chunk["text"])
+        })
+
+    separator_tokens = estimate_tokens(separator) - 1
+    selected = []
+    tokens_used = 0
+    duplicates = []
+    over_budget = []
+
+    while candidates:
+        best, best_score, best_similarity = None, None, 0.0
+        for candidate in candidates:
+            similarity = max((_similarity(candidate["words"], s["words"]) for s in selected), default=0.0)
+            score = mmr_lambda * candidate["relevance"] - (1 - mmr_lambda) * similarity
+            if best_score is None or score > best_score:
+                best, best_score, best_similarity = candidate, score, similarity
+        candidates.remove(best)
+
+        cost = best["tokens"] + (separator_tokens if selected else 0)
+        if best_similarity >= duplicate_similarity:
+            duplicates.append(best)
+        elif tokens_used + cost > token_budget:
+            over_budget.append(best)
+        else:
+            selected.append(best)
+            tokens_used += cost
+
+    return {
+        "context": separator.join(s["chunk"]["text"] for s in selected),
+        "chunks": [s["chunk"] for s in selected],
+        "report": {
+            "token_budget": token_budget,
+            "tokens_used": tokens_used,
+            "tokens_dropped": sum(c["tokens"] for c in duplicates + over_budget),
+            "chunks_used": len(selected),
+            "chunks_dropped_duplicate": len(duplicates),
+            "chunks_dropped_budget": len(over_budget)
+        }
+    }
@@ -0,0 +1,64 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+class EmbeddingCache:
+    """Bounded LRU cache of query embeddings with hit/miss counters."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, text):
+        """Return the cached vector for `text`, or None, counting the hit or miss."""
+        with self._lock:
+            vector = self._entries.get(text)
+            if vector is not None:
+                self._entries.move_to_end(text)
+                self.hits += 1
+                return vector
+            self.misses += 1
+            return None
+
+    def store(self, text, vector):
+        with self._lock:
+            self._entries[text] = vector
+            self._entries.move_to_end(text)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+def load_query_embeddings(queries, encode, model_name, path):
+    """Return {query: vector} for fixed queries, reusing vectors persisted at `path`.
+
+    The file is rewritten when the model changes or a query is missing, so editing
+    a query string or switching models never serves stale vectors.
+    """
+    stored = {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("model") == model_name:
+            stored = data.get("queries", {})
+    except (OSError, ValueError):
+        pass
+
+    missing = [query for query in queries if query not in stored]
+    if missing:
+        for query, vector in zip(missing, encode(missing)):
+            stored[query] = vector.tolist()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"model": model_name, "queries": {q: stored[q] for q in queries}}, f)
+        print(f"✅ Computed {len(missing)} query embeddings ({model_name})")
+
+    return {query: stored[query] for query in queries}
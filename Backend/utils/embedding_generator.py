@@ -1,7 +1,194 @@
-from sentence_transformers import SentenceTransformer
+import asyncio
+import os
+import threading
+from collections import deque
 import numpy as np
+from utils.executors import embedding_executor
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+# "torch" (reference float32), "int8" (dynamically quantized Linear layers on CPU)
+# or "onnx" (onnxruntime; needs sentence-transformers[onnx])
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+# Identifies the vectors a backend produces, for caches persisted to disk
+EMBEDDING_MODEL_ID = EMBEDDING_MODEL_NAME if EMBEDDING_BACKEND == "torch" else f"{EMBEDDING_MODEL_NAME}:{EMBEDDING_BACKEND}"
+
+ENCODE_BATCH_SIZE = int(os.getenv("ENCODE_BATCH_SIZE", 32))
+# Concurrent encode requests are coalesced until this many texts are waiting or
+# the oldest request has waited this long
+MAX_BATCH_SIZE = int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", 64))
+MAX_WAIT_MS = float(os.getenv("EMBEDDING_MAX_WAIT_MS", 5))
+
+
+# sentence-transformers (and torch) are imported on first load, not with the
+# app: the model loads in the background after the server is up
+def load_model(backend=EMBEDDING_BACKEND):
+    from sentence_transformers import SentenceTransformer
+    if backend == "onnx":
+        return SentenceTransformer(EMBEDDING_MODEL_NAME, backend="onnx")
+    model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    if backend == "int8":
+        import torch
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    elif backend != "torch":
+        raise ValueError(f"Unknown embedding backend: {backend}")
+    return model
+
+
+_model = None
+_model_lock = threading.Lock()
+
+
+# The one embedding model of the process, loaded on first use
+def get_model():
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = load_model()
+    return _model
+
+
+def encode_texts(texts, batch_size=ENCODE_BATCH_SIZE):
+    return get_model().encode(texts, batch_size=batch_size, show_progress_bar=False, normalize_embeddings=True)
 
-model = SentenceTransformer("all-MiniLM-L6-v2")
 
 def generate_embedding(text):
-    return model.encode(text)
+    return get_model().encode(text, normalize_embeddings=True)
+
+
+class _Request:
+    """One encode() call, answered once all of its slices are encoded."""
+
+    def __init__(self, texts, future, slice_size):
+        self.future = future
+        self.slices = [(self, number, texts[start:start + slice_size])
+                       for number, start in enumerate(range(0, len(texts), slice_size))]
+        self.parts = [None] * len(self.slices)
+        self.remaining = len(self.slices)
+
+    def resolve(self, number, vectors):
+        self.parts[number] = vectors
+        self.remaining -= 1
+        if self.remaining == 0 and not self.future.done():
+            self.future.set_result(self.parts[0] if len(self.parts) == 1 else np.concatenate(self.parts))
+
+
+class MicroBatchEmbedder:
+    """Coalesces concurrent encode requests into micro-batches.
+
+    Callers await encode(texts); a single worker task gathers requests until
+    max_batch_size texts are queued or max_wait_ms has passed, encodes them in
+    one model call on the embedding executor and hands each caller its slice.
+
+    Requests larger than max_batch_size (ingestion) are encoded one
+    max_batch_size slice at a time, taking turns with each other, and waiting
+    smaller requests (queries) go before the next slice, so a query waits for
+    at most one slice of an upload rather than the whole of it.
+    """
+
+    def __init__(self, encode_batch=encode_texts, max_batch_size=MAX_BATCH_SIZE,
+                 max_wait_ms=MAX_WAIT_MS, executor=embedding_executor):
+        self.encode_batch = encode_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.executor = executor
+        self.batches = 0
+        self.texts = 0
+        self._queue = None
+        self._worker = None
+        self._loop = None
+        self._small = deque()
+        self._bulk = deque()
+
+    async def encode(self, texts):
+        texts = list(texts)
+        if not texts:
+            return []
+        self._ensure_worker()
+        future = self._loop.create_future()
+        await self._queue.put(_Request(texts, future, self.max_batch_size))
+        return await future
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._small.clear()
+            self._bulk.clear()
+            self._worker = loop.create_task(self._run())
+
+    def _accept(self, request):
+        if len(request.slices) == 1:
+            self._small.append(request.slices[0])
+        else:
+            self._bulk.append(deque(request.slices))
+
+    def _take(self, batch, size):
+        while self._small and (not batch or size + len(self._small[0][2]) <= self.max_batch_size):
+            batch.append(self._small.popleft())
+            size += len(batch[-1][2])
+        # Waiting queries are encoded on their own: a slice in the same call
+        # would add its encode time to theirs
+        # Large requests take turns, one slice each, so a short one (a prompt's
+        # company-match sentences) is not queued behind a whole upload
+        while self._bulk and not batch:
+            slices = self._bulk.popleft()
+            # Drop the rest of a request whose caller gave up or whose earlier slice failed
+            if slices[0][0].future.done():
+                continue
+            batch.append(slices.popleft())
+            size += len(batch[-1][2])
+            if slices:
+                self._bulk.append(slices)
+        return size
+
+    async def _next_batch(self):
+        batch = []
+        while not batch:
+            if not self._small and not self._bulk:
+                self._accept(await self._queue.get())
+            while not self._queue.empty():
+                self._accept(self._queue.get_nowait())
+            size = self._take(batch, 0)
+
+        deadline = self._loop.time() + self.max_wait
+        # Wait briefly for more queries to share the call, unless it is full
+        # or an upload is waiting for its next slice
+        while size < self.max_batch_size and not self._bulk and len(batch[0][0].slices) == 1:
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                self._accept(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+            size = self._take(batch, size)
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            texts = [text for _, _, slice_texts in batch for text in slice_texts]
+            try:
+                vectors = await self._loop.run_in_executor(self.executor, self.encode_batch, texts)
+            except Exception as e:
+                for request, _, _ in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.texts += len(texts)
+            offset = 0
+            for request, number, slice_texts in batch:
+                if not request.future.done():
+                    request.resolve(number, vectors[offset:offset + len(slice_texts)])
+                offset += len(slice_texts)
+
+    def stats(self):
+        return {"batches": self.batches, "texts": self.texts, "max_batch_size": self.max_batch_size, "max_wait_ms": self.max_wait * 1000}
+
+
+# Shared by every caller in the process (query embedding, ingestion, company data)
+embedder = MicroBatchEmbedder()
@@ -0,0 +1,18 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# Bounded pools for CPU-bound work, so it never runs on the event loop.
+# Embedding runs in threads (torch releases the GIL while encoding); PDF parsing is
+# pure Python and holds the GIL, so it runs in separate processes.
+EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", 2))
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", min(4, os.cpu_count() or 1)))
+
+embedding_executor = ThreadPoolExecutor(max_workers=EMBEDDING_WORKERS, thread_name_prefix="embedding")
+
+# Worker processes are only started on first use; "spawn" avoids forking a parent
+# that already has torch threads running
+extraction_executor = ProcessPoolExecutor(
+    max_workers=EXTRACTION_WORKERS,
+    mp_context=multiprocessing.get_context("spawn")
+)
@@ -0,0 +1,438 @@
+import asyncio
+import json
+import math
+import os
+import re
+import shutil
+from collections import Counter
+import numpy as np
+
+# Rebuild an index's files once it holds more deleted rows than live ones
+COMPACT_DEAD_RATIO = float(os.getenv("NUMPY_INDEX_COMPACT_DEAD_RATIO", 1.0))
+# BM25 parameters, Elasticsearch's defaults
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_WORD = re.compile(r"\w+")
+
+
+def _tokenize(text):
+    # Close to Elasticsearch's standard analyzer: Unicode word tokens, lowercased
+    return _WORD.findall(text.lower())
+
+
+def _write_synced(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _fsync_directory(path):
+    # Makes a rename in the directory durable; not possible on Windows
+    if hasattr(os, "O_DIRECTORY"):
+        descriptor = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+
+
+class NumpyVectorIndex:
+    """One index of chunk documents in a directory, searched in-process.
+
+    CURRENT       name of the live generation directory (gen-<n>)
+    gen-<n>/      the index's files:
+      vectors.f32   float32 rows of unit-length embeddings, memory-mapped
+      chunks.jsonl  one {"_id", "_source"} line per row, same order
+      deleted.txt   row numbers of deleted or overwritten rows
+
+    Writes only append, so persisting a new RFP costs its own rows and
+    opening an index maps the matrix instead of reading it. Rows are
+    written before their metadata line, which acts as the commit marker: a
+    torn write is cut back to the last complete line on the next open.
+    Compaction writes the live rows into a new generation and switches
+    CURRENT to it in one atomic rename, so row numbers in deleted.txt always
+    refer to the files next to them.
+    One process writes an index; other processes see changes on reopen.
+    Not thread-safe: NumpyRetriever serializes all access to an index.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._load()
+
+    def _file(self, name):
+        return os.path.join(self.path, self.generation, name)
+
+    def _current_generation(self):
+        try:
+            with open(os.path.join(self.path, "CURRENT"), "r", encoding="utf-8") as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            pass
+        # Indices written before generations keep their files in the directory itself
+        if os.path.exists(os.path.join(self.path, "chunks.jsonl")):
+            return ""
+        os.makedirs(os.path.join(self.path, "gen-0"), exist_ok=True)
+        self._switch_generation("gen-0")
+        return "gen-0"
+
+    def _switch_generation(self, generation):
+        pointer = os.path.join(self.path, "CURRENT")
+        _write_synced(pointer + ".tmp", generation.encode("utf-8"))
+        os.replace(pointer + ".tmp", pointer)
+        _fsync_directory(self.path)
+
+    def _load(self):
+        os.makedirs(self.path, exist_ok=True)
+        self.generation = self._current_generation()
+        meta_path = self._file("meta.json")
+        self.dim = None
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                self.dim = json.load(f)["dim"]
+
+        sources, ids, committed = [], [], 0
+        chunks_path = self._file("chunks.jsonl")
+        if os.path.exists(chunks_path):
+            with open(chunks_path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    entry = json.loads(line)
+                    ids.append(entry["_id"])
+                    sources.append(entry["_source"])
+                    committed += len(line)
+            if committed != os.path.getsize(chunks_path):
+                os.truncate(chunks_path, committed)
+
+        vectors_path = self._file("vectors.f32")
+        if self.dim and os.path.exists(vectors_path):
+            row_bytes = self.dim * 4
+            if os.path.getsize(vectors_path) > len(sources) * row_bytes:
+                os.truncate(vectors_path, len(sources) * row_bytes)
+
+        live = np.ones(len(sources), dtype=bool)
+        deleted_path = self._file("deleted.txt")
+        if os.path.exists(deleted_path):
+            with open(deleted_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    row = line.strip()
+                    if row.isdigit() and int(row) < len(live):
+                        live[int(row)] = False
+
+        self._sources = sources
+        self._ids = ids
+        self._live = live
+        self._rebuild_lookups()
+        self._map_vectors()
+
+    def _map_vectors(self):
+        rows = len(self._sources)
+        if not rows:
+            self._vectors = np.zeros((0, self.dim or 0), dtype=np.float32)
+        else:
+            self._vectors = np.memmap(self._file("vectors.f32"), dtype=np.float32, mode="r", shape=(rows, self.dim))
+
+    def _rebuild_lookups(self):
+        # _id -> live row, doc_id / filename -> rows, and BM25 postings over live rows
+        self._row_by_id = {}
+        self._rows_by_doc = {}
+        self._rows_by_filename = {}
+        self._postings = {}
+        self._lengths = np.zeros(len(self._sources), dtype=np.float32)
+        for row in np.flatnonzero(self._live):
+            self._add_lookups(int(row))
+
+    def _add_lookups(self, row):
+        source = self._sources[row]
+        self._row_by_id[self._ids[row]] = row
+        self._rows_by_doc.setdefault(source.get("doc_id"), set()).add(row)
+        self._rows_by_filename.setdefault(source.get("filename"), set()).add(row)
+        tokens = _tokenize(source.get("text", ""))
+        self._lengths[row] = len(tokens)
+        for term, tf in Counter(tokens).items():
+            self._postings.setdefault(term, {})[row] = tf
+
+    def _remove_lookups(self, row):
+        source = self._sources[row]
+        self._row_by_id.pop(self._ids[row], None)
+        self._rows_by_doc.get(source.get("doc_id"), set()).discard(row)
+        self._rows_by_filename.get(source.get("filename"), set()).discard(row)
+        for term in set(_tokenize(source.get("text", ""))):
+            self._postings.get(term, {}).pop(row, None)
+        self._lengths[row] = 0
+
+    # --- writes ---------------------------------------------------------------
+
+    def add(self, documents):
+        """Upsert (_id, source, vector) triples; returns the number written."""
+        documents = list(documents)
+        if not documents:
+            return 0
+        vectors = np.asarray([vector for _, _, vector in documents], dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            with open(self._file("meta.json"), "w", encoding="utf-8") as f:
+                json.dump({"dim": self.dim}, f)
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-dimensional vectors, got {vectors.shape[1]}")
+
+        replaced = [self._row_by_id[doc_id] for doc_id, _, _ in documents if doc_id in self._row_by_id]
+        self._mark_deleted(replaced)
+
+        with open(self._file("vectors.f32"), "ab") as f:
+            f.write(vectors.tobytes())
+        with open(self._file("chunks.jsonl"), "a", encoding="utf-8") as f:
+            f.write("".join(
+                json.dumps({"_id": doc_id, "_source": source}, ensure_ascii=False) + "\n"
+                for doc_id, source, _ in documents
+            ))
+
+        first = len(self._sources)
+        self._ids.extend(doc_id for doc_id, _, _ in documents)
+        self._sources.extend(source for _, source, _ in documents)
+        self._live = np.concatenate([self._live, np.ones(len(documents), dtype=bool)])
+        self._lengths = np.concatenate([self._lengths, np.zeros(len(documents), dtype=np.float32)])
+        for row in range(first, len(self._sources)):
+            self._add_lookups(row)
+        self._map_vectors()
+        self._maybe_compact()
+        return len(documents)
+
+    def delete_where(self, filename=None, keep_doc_id=None):
+        """Delete the rows of filename whose doc_id is not keep_doc_id; returns how many."""
+        rows = [
+            row for row in self._rows_by_filename.get(filename, ())
+            if self._sources[row].get("doc_id") != keep_doc_id
+        ]
+        self._mark_deleted(rows)
+        self._maybe_compact()
+        return len(rows)
+
+    def delete_document(self, doc_id):
+        """Delete every row of doc_id; returns how many."""
+        rows = list(self._rows_by_doc.get(doc_id, ()))
+        self._mark_deleted(rows)
+        self._maybe_compact()
+        return len(rows)
+
+    def _mark_deleted(self, rows):
+        if not rows:
+            return
+        with open(self._file("deleted.txt"), "a", encoding="utf-8") as f:
+            f.write("".join(f"{row}\n" for row in rows))
+        live = self._live.copy()
+        for row in rows:
+            self._remove_lookups(row)
+            live[row] = False
+        self._live = live
+
+    def _maybe_compact(self):
+        dead = len(self._live) - int(self._live.sum())
+        if dead and dead > COMPACT_DEAD_RATIO * max(int(self._live.sum()), 1):
+            self.compact()
+
+    def compact(self):
+        """Rewrite the live rows into a new generation and switch to it.
+
+        A crash before the switch leaves the old generation as it was (a
+        half-written new one is overwritten by the next compaction); after
+        it, the complete new one. Older generations are removed last.
+        """
+        rows = np.flatnonzero(self._live)
+        number = int(self.generation.split("-")[1]) + 1 if self.generation else 1
+        generation = f"gen-{number}"
+        target = os.path.join(self.path, generation)
+        shutil.rmtree(target, ignore_errors=True)
+        os.makedirs(target)
+        _write_synced(os.path.join(target, "meta.json"), json.dumps({"dim": self.dim}).encode("utf-8"))
+        _write_synced(os.path.join(target, "vectors.f32"), np.ascontiguousarray(self._vectors[rows]).tobytes())
+        _write_synced(os.path.join(target, "chunks.jsonl"), "".join(
+            json.dumps({"_id": self._ids[row], "_source": self._sources[row]}, ensure_ascii=False) + "\n"
+            for row in rows
+        ).encode("utf-8"))
+        _fsync_directory(target)
+        self._switch_generation(generation)
+        self._load()
+        self._remove_old_generations()
+
+    def _remove_old_generations(self):
+        for name in os.listdir(self.path):
+            if name.startswith("gen-") and name != self.generation:
+                shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+            elif name in ("meta.json", "vectors.f32", "chunks.jsonl", "deleted.txt"):
+                os.remove(os.path.join(self.path, name))
+
+    # --- reads ----------------------------------------------------------------
+
+    def _candidate_rows(self, doc_id=None, filenames=None):
+        # None means every live row
+        rows = None
+        if doc_id:
+            rows = set(self._rows_by_doc.get(doc_id, ()))
+        if filenames:
+            by_filename = set().union(*(self._rows_by_filename.get(name, ()) for name in filenames))
+            rows = by_filename if rows is None else rows & by_filename
+        return rows
+
+    def count(self, doc_id=None):
+        rows = self._candidate_rows(doc_id)
+        return int(self._live.sum()) if rows is None else len(rows)
+
+    def _hit(self, row, score):
+        return {"_id": self._ids[row], "_score": score, "_source": self._sources[row]}
+
+    def knn(self, query_vector, k, doc_id=None, filenames=None):
+        """Exact top-k by cosine, scored (1 + cos) / 2 like Elasticsearch's knn."""
+        vectors = self._vectors
+        rows = self._candidate_rows(doc_id, filenames)
+        if rows is None:
+            rows = np.flatnonzero(self._live)
+        else:
+            rows = np.fromiter(sorted(rows), dtype=np.int64, count=len(rows))
+        if not len(rows) or k <= 0:
+            return []
+
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        scores = vectors[rows] @ query
+        if len(rows) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind="stable")]
+        else:
+            top = np.argsort(-scores, kind="stable")
+        return [self._hit(int(rows[i]), float((1 + scores[i]) / 2)) for i in top]
+
+    def bm25(self, keywords, k, doc_id=None, filenames=None):
+        """BM25 over chunk text (any keyword matches), scored like Elasticsearch's match query."""
+        candidates = self._candidate_rows(doc_id, filenames)
+        documents = int(self._live.sum())
+        if not documents or k <= 0:
+            return []
+        average_length = float(self._lengths.sum()) / documents
+
+        scores = {}
+        for term in set(_tokenize(keywords)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (documents - len(postings) + 0.5) / (len(postings) + 0.5))
+            for row, tf in postings.items():
+                if candidates is not None and row not in candidates:
+                    continue
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[row] / average_length)
+                scores[row] = scores.get(row, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+        ranked = sorted(scores.items(), key=lambda item: -item[1])[:k]
+        return [self._hit(row, float(score)) for row, score in ranked]
+
+    def embeddings_for_filename(self, filename):
+        return {
+            self._sources[row].get("chunk_hash"): self._vectors[row].tolist()
+            for row in self._rows_by_filename.get(filename, ())
+            if self._sources[row].get("chunk_hash")
+        }
+
+    def sample(self, size):
+        return [self._hit(int(row), 1.0) for row in np.flatnonzero(self._live)[:size]]
+
+
+class NumpyRetriever:
+    """Retriever backed by NumpyVectorIndex directories under `path`, one per index name.
+
+    Same interface as elastic_helper.ElasticsearchRetriever: index admin,
+    chunk writes and execution of search plans. Each index has an asyncio
+    lock held by every operation on it, so readers never see a half-applied
+    write. Searches and lookups take microseconds and run inline on the event
+    loop; opening an index (parsing chunks.jsonl, building BM25 postings),
+    writes and compaction run in a worker thread under the lock.
+    """
+    name = "numpy"
+
+    def __init__(self, path):
+        self.path = path
+        self._indices = {}
+        self._locks = {}
+
+    def _lock(self, name):
+        lock = self._locks.get(name)
+        if lock is None:
+            lock = self._locks[name] = asyncio.Lock()
+        return lock
+
+    async def _open(self, name, create=False):
+        # Call with the index's lock held
+        index = self._indices.get(name)
+        if index is None:
+            directory = os.path.join(self.path, name)
+            if not create and not os.path.isdir(directory):
+                raise KeyError(f"no such index [{name}]")
+            index = self._indices[name] = await asyncio.to_thread(NumpyVectorIndex, directory)
+        return index
+
+    async def index_exists(self, name):
+        return name in self._indices or os.path.isdir(os.path.join(self.path, name))
+
+    async def create_index(self, name, mapping=None):
+        # No mapping: the layout is fixed and the dimension comes from the first vectors
+        async with self._lock(name):
+            await self._open(name, create=True)
+
+    async def delete_index(self, name):
+        async with self._lock(name):
+            self._indices.pop(name, None)
+            await asyncio.to_thread(shutil.rmtree, os.path.join(self.path, name), True)
+
+    async def count(self, name, doc_id=None):
+        async with self._lock(name):
+            return (await self._open(name)).count(doc_id)
+
+    async def load_chunk_embeddings(self, name, filename):
+        async with self._lock(name):
+            return (await self._open(name)).embeddings_for_filename(filename)
+
+    async def delete_stale_chunks(self, name, filename, doc_id):
+        async with self._lock(name):
+            index = await self._open(name)
+            return await asyncio.to_thread(index.delete_where, filename, doc_id)
+
+    async def delete_document(self, name, doc_id):
+        async with self._lock(name):
+            index = await self._open(name)
+            return await asyncio.to_thread(index.delete_document, doc_id)
+
+    async def index_chunks(self, name, documents, batch_size):
+        documents = list(documents)
+        indexed = 0
+        # The lock is released between batches, so searches interleave with a long write
+        for start in range(0, len(documents), batch_size):
+            async with self._lock(name):
+                index = await self._open(name, create=True)
+                indexed += await asyncio.to_thread(index.add, documents[start:start + batch_size])
+        return indexed, []
+
+    async def search(self, plans):
+        # One {"hits": {"hits": [...]}} or {"error": ...} per request of every plan, in order
+        responses = []
+        for plan in plans:
+            for retriever, request in plan["requests"]:
+                try:
+                    async with self._lock(plan["index"]):
+                        index = await self._open(plan["index"])
+                        if retriever == "vector":
+                            hits = index.knn(request["query_vector"], request["size"], **plan["filters"])
+                        else:
+                            hits = index.bm25(request["keywords"], request["size"], **plan["filters"])
+                    responses.append({"hits": {"hits": hits}})
+                except Exception as e:
+                    responses.append({"error": {"type": type(e).__name__, "reason": str(e)}})
+        return responses
+
+    async def sample(self, name, size=10):
+        async with self._lock(name):
+            return (await self._open(name)).sample(size)
+
+    async def close(self):
+        pass
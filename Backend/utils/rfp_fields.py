@@ -0,0 +1,249 @@
+import datetime
+import os
+import re
+
+# Title, agency and dates are taken from the first pages only; they sit on
+# the cover, the invitation or the timeline of events
+RFP_FIELD_PAGES = int(os.getenv("RFP_FIELD_PAGES", 6))
+# Characters before a date searched for what it is the date of
+DATE_LABEL_WINDOW = 100
+# Characters after a keyword searched for the amount or duration it introduces
+VALUE_WINDOW = 120
+DURATION_WINDOW = 300
+# Occurrences kept per identifier kind
+MAX_IDENTIFIERS = int(os.getenv("RFP_MAX_IDENTIFIERS", 50))
+# Bump when the rules change so stored fields are extracted again
+RFP_FIELDS_VERSION = 1
+
+# Fields of /api/rfp-info, in the order the frontend shows them
+RFP_INFO_FIELDS = ("title", "agency", "issueDate", "dueDate", "contractValue", "duration", "status")
+
+_MONTHS = {
+    name[:3]: number for number, name in enumerate(
+        ("january", "february", "march", "april", "may", "june", "july",
+         "august", "september", "october", "november", "december"), start=1
+    )
+}
+_NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8,
+    "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "eighteen": 18, "twenty-four": 24,
+    "thirty": 30, "thirty-six": 36, "sixty": 60, "ninety": 90
+}
+
+# PDF extraction leaves stray spaces inside dates ("February  27 , 2025")
+DATE = re.compile(
+    r"\b(?P<month>jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.?\s+(?P<day>\d{1,2})(?:st|nd|rd|th)?"
+    r"\s*,?\s*(?P<year>\d{4})\b"
+    r"|\b(?P<us_month>\d{1,2})/(?P<us_day>\d{1,2})/(?P<us_year>\d{4}|\d{2})\b"
+    r"|\b(?P<iso_year>\d{4})-(?P<iso_month>\d{2})-(?P<iso_day>\d{2})\b",
+    re.IGNORECASE
+)
+# The last label before a date says what it is the date of: "Deadline To
+# Submit Questions  Monday, February 17" is a question deadline, not the due date
+DATE_LABEL = re.compile(
+    r"(?P<due>\bdue\b|deadline|submission|submit|closing|\bclose[sd]?\b|no later than|on or before|must be received"
+    r"|received by|bid opening)"
+    r"|(?P<issue>\bissued?\b|issuance|release[d]?\b|publish(?:ed)?|posted|advertised)"
+    r"|(?P<other>question|inquir|conference|pre-?bid|pre-?proposal|site visit|walk-?through|award|anticipated"
+    r"|\bstart|commence|interview|presentation|evaluation|effective|addend|expir)",
+    re.IGNORECASE
+)
+AMOUNT = re.compile(
+    r"\$\s?(?P<number>\d{1,3}(?:,\d{3})+(?:\.\d{2})?|\d+(?:\.\d+)?)"
+    r"(?:\s?(?P<scale>million|billion|thousand|mm?\b|k\b))?",
+    re.IGNORECASE
+)
+VALUE_LABEL = re.compile(
+    r"not[\s-]+to[\s-]+exceed|contract (?:value|amount|ceiling|price)|budget|estimated (?:value|amount|cost|contract)"
+    r"|total (?:award|contract|project)|award amount|maximum (?:amount|value|contract)|funding (?:amount|available)"
+    r"|ceiling",
+    re.IGNORECASE
+)
+DURATION = re.compile(
+    r"\b(?P<count>\d{1,3}|" + "|".join(sorted(_NUMBER_WORDS, key=len, reverse=True)) + r")"
+    r"\s*(?:\(\s*\d{1,3}\s*\)\s*)?-?\s*(?:calendar\s+|business\s+)?(?P<unit>year|month|week|day)s?\b",
+    re.IGNORECASE
+)
+DURATION_LABEL = re.compile(
+    r"term of (?:the|this|any) (?:contract|agreement)|contract term|initial term|period of performance"
+    r"|contract period|duration|performance period",
+    re.IGNORECASE
+)
+NAICS = re.compile(r"\bNAICS\b(?:\s*(?:code|codes|no\.?|number|#|:))*\s*(?P<code>\d{6})\b", re.IGNORECASE)
+LICENSE = re.compile(
+    r"\b(?:licen[cs]e|certificat(?:e|ion)|registration|permit)\s*(?:no\.?|number|#)\s*:?\s*(?P<number>[A-Z0-9][A-Z0-9-]{2,})",
+    re.IGNORECASE
+)
+FORM = re.compile(
+    r"\b(?i:standard\s+)?(?i:form)\s+(?i:no\.?\s*)?(?P<form>[A-Z]{0,3}\s?-?\s?\d[\w-]*|[A-Z]\s?-\s?[A-Z]{2,4})\b"
+    r"|\b(?P<standard>W-9|W-4|I-9|SF[- ]?\d{2,4}|DD[- ]?\d{3,4})\b"
+)
+# "Page 3 of 33" running headers are not references
+PAGE_REFERENCE = re.compile(r"\b(?:see\s+)?(?:page|pg\.|p\.)\s+(?P<page>\d{1,4})\b(?!\s*of\b)", re.IGNORECASE)
+# "REQUEST FOR PROPOSAL   TEMPORARY STAFFING SERVICES   RFP 25-008": the
+# upper-case line after the solicitation heading and its number
+TITLE_AFTER_HEADING = re.compile(
+    r"(?:REQUEST\s+FOR\s+(?:PROPOSALS?|QUOTES?|QUOTATIONS?|QUALIFICATIONS|BIDS?)|INVITATION\s+(?:FOR|TO)\s+BIDS?)"
+    r"(?:\s*\((?:RFP|RFQ|RFB|ITB|IFB|RFQUAL)\))?"
+    r"(?:\s*(?:NO\.?|NUMBER|#)\s*\d[\d\s-]*\d)?"
+    r"\s+(?P<title>[A-Z0-9][A-Z0-9&,'’/()\- ]{4,}?[A-Z)])(?=\s{2,}|\s*\n|\s*$)"
+)
+TITLE_LABEL = re.compile(
+    r"\b(?:project\s+title|solicitation\s+title|project\s+name|title|subject)\s*:\s*(?P<title>[^\n:]{5,120}?)(?=\s{2,}|\n|$)",
+    re.IGNORECASE
+)
+AGENCY_LABEL = re.compile(
+    r"\b(?:issuing\s+(?:agency|office|entity|organization|department)|agency(?:\s+name)?|issued\s+by|owner"
+    r"|purchasing\s+agency)\s*:\s*(?P<agency>[^\n:]{3,100}?)(?=\s{2,}|\n|$)",
+    re.IGNORECASE
+)
+# "MHMR of Tarrant County (“MHMR”) is accepting proposals": capitalized words
+# joined by single spaces, so a preceding heading ("INVITATION  MHMR") is left out
+_NAME_WORD = r"(?:[A-Z][\w&'’-]*|of|the|and|for|&)"
+AGENCY_INVITES = re.compile(
+    r"(?P<agency>[A-Z][\w&'’-]*(?: " + _NAME_WORD + r"){0,10})\s*(?:\([^)\n]{1,40}\)\s*)?"
+    r"(?:is|are)\s+(?:now\s+|hereby\s+)?(?:accepting|seeking|soliciting|requesting|inviting|issuing)\b"
+)
+
+
+def _normalize_date(match):
+    groups = match.groupdict()
+    try:
+        if groups["month"]:
+            date = datetime.date(int(groups["year"]), _MONTHS[groups["month"][:3].lower()], int(groups["day"]))
+        elif groups["us_month"]:
+            year = int(groups["us_year"])
+            date = datetime.date(year + 2000 if year < 100 else year, int(groups["us_month"]), int(groups["us_day"]))
+        else:
+            date = datetime.date(int(groups["iso_year"]), int(groups["iso_month"]), int(groups["iso_day"]))
+    except ValueError:
+        return None
+    return date.isoformat()
+
+
+def _normalize_amount(match):
+    number = float(match.group("number").replace(",", ""))
+    scale = (match.group("scale") or "").lower()
+    number *= {"thousand": 1e3, "k": 1e3, "million": 1e6, "m": 1e6, "mm": 1e6, "billion": 1e9}.get(scale, 1)
+    return f"${number:,.2f}".replace(".00", "")
+
+
+def _normalize_duration(match):
+    count = match.group("count").lower()
+    count = _NUMBER_WORDS.get(count) or int(count)
+    unit = match.group("unit").lower()
+    return f"{count} {unit}{'s' if count != 1 else ''}"
+
+
+def _clean(text):
+    return " ".join(text.split()).strip(" .,;:-")
+
+
+def _evidence(text, start, end, margin=40):
+    return _clean(text[max(0, start - margin):end + margin])
+
+
+def _date_label(text, start):
+    label = None
+    for label_match in DATE_LABEL.finditer(text, max(0, start - DATE_LABEL_WINDOW), start):
+        label = label_match.lastgroup
+    return label
+
+
+def _field(value, page, text, start, end):
+    return {"value": value, "page": page, "evidence": _evidence(text, start, end)}
+
+
+def _labelled_match(pages, label_pattern, value_pattern, window, normalize):
+    # First value found within `window` characters after a label
+    for page_number, text in pages:
+        for label in label_pattern.finditer(text):
+            match = value_pattern.search(text, label.end(), label.end() + window)
+            if match:
+                return _field(normalize(match), page_number, text, label.start(), match.end())
+    return None
+
+
+def _first_match(pages, patterns, group):
+    for page_number, text in pages:
+        for pattern in patterns:
+            match = pattern.search(text)
+            if match:
+                value = _clean(match.group(group))
+                if value.lower().startswith("the "):
+                    value = value[4:]
+                if len(value) >= 3:
+                    return _field(value, page_number, text, match.start(group), match.end(group))
+    return None
+
+
+def _dates(pages):
+    dates = {"due": None, "issue": None}
+    for page_number, text in pages:
+        for match in DATE.finditer(text):
+            value = _normalize_date(match)
+            label = _date_label(text, match.start())
+            if value and label in dates and dates[label] is None:
+                dates[label] = _field(value, page_number, text, match.start(), match.end())
+    return dates["issue"], dates["due"]
+
+
+def _identifiers(pages, pattern, normalize):
+    found = {}
+    for page_number, text in pages:
+        for match in pattern.finditer(text):
+            value = normalize(match)
+            if value and value not in found:
+                found[value] = {"value": value, "page": page_number, "text": _clean(match.group(0))}
+                if len(found) >= MAX_IDENTIFIERS:
+                    return list(found.values())
+    return list(found.values())
+
+
+def rfp_status(due_date, today=None):
+    # "Open" until the end of the due date, "Closed" after it
+    try:
+        due = datetime.date.fromisoformat(due_date)
+    except (TypeError, ValueError):
+        return None
+    return "Open" if due >= (today or datetime.date.today()) else "Closed"
+
+
+def extract_rfp_fields(pages):
+    """Resolve what the rules can of the /api/rfp-info fields, plus every identifier.
+
+    `pages` is the per-page text of one RFP. Each resolved field is
+    {"value", "page", "evidence"}; fields the rules could not find are left
+    out, for the LLM to fill in. Identifiers are lists of {"value", "page",
+    "text"} per kind, deduplicated by normalized value. Dates are ISO, amounts
+    "$1,234.50". Pure Python, so it runs in the extraction process pool.
+    """
+    numbered = list(enumerate(pages, start=1))
+    first_pages = numbered[:RFP_FIELD_PAGES]
+
+    issue_date, due_date = _dates(first_pages)
+    fields = {
+        "title": _first_match(first_pages, (TITLE_LABEL, TITLE_AFTER_HEADING), "title"),
+        "agency": _first_match(first_pages, (AGENCY_LABEL, AGENCY_INVITES), "agency"),
+        "issueDate": issue_date,
+        "dueDate": due_date,
+        "contractValue": _labelled_match(numbered, VALUE_LABEL, AMOUNT, VALUE_WINDOW, _normalize_amount),
+        "duration": _labelled_match(numbered, DURATION_LABEL, DURATION, DURATION_WINDOW, _normalize_duration)
+    }
+
+    identifiers = {
+        "dates": _identifiers(numbered, DATE, _normalize_date),
+        "amounts": _identifiers(numbered, AMOUNT, _normalize_amount),
+        "durations": _identifiers(numbered, DURATION, _normalize_duration),
+        "naics": _identifiers(numbered, NAICS, lambda match: match.group("code")),
+        "licenses": _identifiers(numbered, LICENSE, lambda match: match.group("number").upper()),
+        "forms": _identifiers(
+            numbered, FORM, lambda match: re.sub(r"\s+", "", (match.group("form") or match.group("standard")).upper())
+        ),
+        "page_references": _identifiers(numbered, PAGE_REFERENCE, lambda match: int(match.group("page")))
+    }
+    return {
+        "version": RFP_FIELDS_VERSION,
+        "fields": {name: field for name, field in fields.items() if field},
+        "identifiers": identifiers
+    }
@@ -1,4 +1,6 @@
 import os
+import signal
+import threading
 from PyPDF2 import PdfReader
 import docx
 
@@ -11,9 +13,70 @@ def extract_text_from_file(file_path):
     return ""
 
 def extract_text_from_pdf(file_path):
+    return "\n".join(extract_pages_from_pdf(file_path))
+
+def extract_pages_from_pdf(file_path):
     reader = PdfReader(file_path)
-    return "\n".join([page.extract_text() or "" for page in reader.pages])
+    return [page.extract_text() or "" for page in reader.pages]
 
 def extract_text_from_docx(file_path):
     doc = docx.Document(file_path)
-    return "\n".join([para.text for para in doc.paragraphs])
+    lines = [para.text for para in doc.paragraphs]
+    # Tables (e.g. a "Field | Data" company sheet) as one "cell: cell" line per row;
+    # merged cells repeat in python-docx, so consecutive duplicates are dropped
+    for table in doc.tables:
+        for row in table.rows:
+            cells = []
+            for cell in row.cells:
+                text = " ".join(cell.text.split())
+                if text and (not cells or cells[-1] != text):
+                    cells.append(text)
+            lines.append(": ".join(cells))
+    return "\n".join(lines)
+
+
+# BaseException so PyPDF2's own `except Exception` blocks can't swallow it
+class PageTimeout(BaseException):
+    pass
+
+
+def _raise_page_timeout(signum, frame):
+    raise PageTimeout()
+
+
+def _extract_page(page, timeout):
+    # SIGALRM can only interrupt the main thread of a process, which is where
+    # process pool workers run; elsewhere the page runs without a timeout
+    if not timeout or not hasattr(signal, "SIGALRM") or threading.current_thread() is not threading.main_thread():
+        return page.extract_text() or ""
+
+    previous = signal.signal(signal.SIGALRM, _raise_page_timeout)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return page.extract_text() or ""
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def count_pdf_pages(file_path):
+    return len(PdfReader(file_path).pages)
+
+
+def extract_page_range(file_path, start, stop, page_timeout=None):
+    """Extract pages [start, stop) of a PDF; meant to run in a worker process.
+
+    Returns (page_index, text, status) tuples where status is "ok", "timeout" or
+    "error"; failed pages come back as empty text so one bad page never sinks
+    the whole document.
+    """
+    reader = PdfReader(file_path)
+    results = []
+    for index in range(start, stop):
+        try:
+            results.append((index, _extract_page(reader.pages[index], page_timeout), "ok"))
+        except PageTimeout:
+            results.append((index, "", "timeout"))
+        except Exception:
+            results.append((index, "", "error"))
+    return results
@@ -0,0 +1,38 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+
+# Uploads are copied to disk this many bytes at a time, so memory per upload
+# stays bounded no matter how large the file is
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+
+
+async def save_upload(upload, directory, extension="", chunk_size=UPLOAD_CHUNK_SIZE):
+    """Stream an UploadFile into `directory`, hashing it on the way.
+
+    Returns (sha256 hex digest, size in bytes, path). The file is named after
+    its content hash, so uploads of different files under the same name never
+    replace each other; it is written under a unique temporary name and only
+    moved into place once complete.
+    """
+    sha256 = hashlib.sha256()
+    size = 0
+    fd, partial_path = tempfile.mkstemp(dir=directory, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                chunk = await upload.read(chunk_size)
+                if not chunk:
+                    break
+                sha256.update(chunk)
+                size += len(chunk)
+                await asyncio.to_thread(f.write, chunk)
+        digest = sha256.hexdigest()
+        path = os.path.join(directory, digest + extension)
+        os.replace(partial_path, path)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    return digest, size, path
@@ -1,5 +1,6 @@
 import { useEffect, useState } from "react"
 import axios from "axios"
+import { rfpParams } from "../lib/currentRfp"
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from "./ui/Card"
 import { Badge } from "./ui/Badge"
 import { FileText, Calendar, Building } from "lucide-react"
@@ -10,7 +11,7 @@ export function DocumentInfo() {
   useEffect(() => {
       const fetchInfo = async()=>{
         try {
-          const res = await axios.get("/api/rfp-info");
+          const res = await axios.get("/api/rfp-info", { params: rfpParams() });
           setRfpInfo(res.data);
         } catch (error) {
           console.error("Failed to fetch RFP info:", error)
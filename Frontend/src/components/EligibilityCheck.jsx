@@ -1,5 +1,6 @@
 import { useEffect, useState } from "react";
 import axios from "axios";
+import { rfpParams } from "../lib/currentRfp";
 import {
   Card, CardContent, CardDescription, CardHeader, CardTitle
 } from "./ui/Card";
@@ -18,7 +19,7 @@ export function EligibilityChecker() {
   useEffect(() => {
     const fetchEligibility = async () => {
       try {
-        const response = await axios.get("/api/eligibility"); // adjust ID if needed
+        const response = await axios.get("/api/eligibility", { params: rfpParams() });
         setCriteria(response.data.criteria);
         // console.log(response)
       } catch (error) {
@@ -17,6 +17,7 @@ import { Badge } from "./ui/Badge";
 import { Button } from "./ui/Button";
 import { ScrollArea } from "./ui/ScrollArea";
 import axios from "axios";
+import { rfpParams } from "../lib/currentRfp";
 
 export function RequirementsExtractor() {
   const [requirements, setRequirements] = useState([]);
@@ -24,7 +25,7 @@ export function RequirementsExtractor() {
 
   useEffect(() => {
     axios
-      .get("/api/requirements")
+      .get("/api/requirements", { params: rfpParams() })
       .then((res) => {
         setRequirements(res.data.requirements);
         // console.log("Requirement data = ", res.data);
@@ -4,6 +4,7 @@ import { Button } from "./ui/Button";
 import { Tabs, TabsContent, TabsList, TabsTrigger } from "./ui/Tabs";
 import { useState, useEffect } from "react";
 import axios from "axios";
+import { rfpParams } from "../lib/currentRfp";
 
 export function RiskAnalyzer() {
   const [risks, setRisks] = useState([]);
@@ -11,7 +12,7 @@ export function RiskAnalyzer() {
   useEffect(() => {
     async function fetchRisks() {
       try {
-        const res = await axios.get("/api/contract-risks");
+        const res = await axios.get("/api/contract-risks", { params: rfpParams() });
         setRisks(res.data.risks || []);
         // console.log("Risk data = ", res.data.risks);
       } catch (err) {
@@ -10,6 +10,7 @@ import { CheckCircle, Circle, FileCheck } from "lucide-react"
 import { Button } from "./ui/Button"
 import { Progress } from "./ui/Progress"
 import axios from "axios"
+import { rfpParams } from "../lib/currentRfp"
 
 export function SubmissionChecklist() {
   const [checklist, setChecklist] = useState([])
@@ -17,7 +18,7 @@ export function SubmissionChecklist() {
   useEffect(() => {
     const fetchChecklist = async () => {
       try {
-        const res = await axios.get("/api/submission-checklist")
+        const res = await axios.get("/api/submission-checklist", { params: rfpParams() })
         if (Array.isArray(res.data.checklist)) {
           setChecklist(res.data.checklist)
           console.log(res.data.checklist)
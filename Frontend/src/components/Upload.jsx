@@ -9,6 +9,7 @@ import { Button } from "./ui/Button";
 import { Progress } from "./ui/Progress";
 import { useToast } from "../hooks/UseToast";
 import axios from 'axios';
+import { setCurrentRfp } from '../lib/currentRfp';
 
 export function RFPUploader() {
   const [file, setFile] = useState(null);
@@ -63,6 +64,15 @@ export function RFPUploader() {
     }, 100);
   };
 
+  const waitForJob = async (jobId) => {
+    while (true) {
+      const { data } = await axios.get(`/api/jobs/${jobId}`);
+      if (data.status === "done") return data;
+      if (data.status === "failed") throw new Error(data.error || "Indexing failed");
+      await new Promise((resolve) => setTimeout(resolve, 1000));
+    }
+  };
+
   const handleRFPUpload = async () => {
     if (!file) return;
 
@@ -73,17 +83,20 @@ export function RFPUploader() {
     const interval = simulateProgress(setProgressRFP);
 
     try {
-      await axios.delete("/api/clear-index");
-
       const formData = new FormData();
       formData.append("file", file);
 
-      await axios.post("/api/upload", formData, {
+      const { data } = await axios.post("/api/upload", formData, {
         headers: {
           "Content-Type": "multipart/form-data",
         },
       });
 
+      if (data.job_id) {
+        await waitForJob(data.job_id);
+      }
+      setCurrentRfp(data.doc_id);
+
       setProgressRFP(100);
       setUploadSuccessRFP(true);
 
@@ -0,0 +1,12 @@
+// The RFP the dashboard shows: doc_id returned by /api/upload, kept across reloads.
+// Without one the backend falls back to the most recently uploaded RFP.
+const STORAGE_KEY = "currentRfpDocId";
+
+export function setCurrentRfp(docId) {
+  if (docId) localStorage.setItem(STORAGE_KEY, docId);
+}
+
+export function rfpParams() {
+  const docId = localStorage.getItem(STORAGE_KEY);
+  return docId ? { doc_id: docId } : {};
+}